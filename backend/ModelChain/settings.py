@@ -186,6 +186,14 @@ os.makedirs(README_DIR, exist_ok=True)
 # 允许的文档格式
 ALLOWED_DOC_EXTENSIONS = ['.txt', '.md', '.pdf', '.doc', '.docx']
 
+# 常驻评测服务配置（model_evaluate_demo/service.py）
+EVAL_SERVICE_URL = os.environ.get('EVAL_SERVICE_URL', 'http://127.0.0.1:8765')
+EVAL_SERVICE_TIMEOUT = 10  # 请求评测服务的超时时间（秒）
+EVAL_SERVICE_POLL_INTERVAL = 2  # Celery评测任务轮询评测服务进度的间隔（秒）
+EVAL_PROGRESS_STREAM_INTERVAL = 1  # SSE进度推送的间隔（秒）
+EVAL_PROGRESS_STREAM_MAX_SECONDS = 30  # 每个SSE连接的最长推送时间（秒），到时关闭，客户端自动重连
+EVAL_PROGRESS_STREAM_RETRY = 1  # 客户端重连SSE的等待时间（秒）
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'  # 使用 Redis 作为消息代理
 CELERY_RESULT_BACKEND = 'django-db'  # 使用 Django 数据库作为结果后端
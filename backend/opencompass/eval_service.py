@@ -0,0 +1,60 @@
+import json
+import urllib.request
+import urllib.error
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EvalServiceError(Exception):
+    """评测服务调用失败"""
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+
+
+def _service_url(path):
+    base_url = getattr(settings, 'EVAL_SERVICE_URL', 'http://127.0.0.1:8765')
+    return base_url.rstrip('/') + path
+
+
+def _request(method, path, payload=None):
+    """向常驻评测服务发送请求并返回data字段"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(
+        _service_url(path),
+        data=data,
+        method=method,
+        headers={'Content-Type': 'application/json'}
+    )
+    timeout = getattr(settings, 'EVAL_SERVICE_TIMEOUT', 10)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read().decode('utf-8')).get('message', str(e))
+        except ValueError:
+            message = str(e)
+        raise EvalServiceError(message, status=e.code)
+    except (urllib.error.URLError, OSError) as e:
+        logger.error(f"无法连接评测服务: {str(e)}")
+        raise EvalServiceError(f'无法连接评测服务: {str(e)}')
+    return body.get('data')
+
+
+def submit_job(model_path, datasets, max_samples=None, device=None, debug=False):
+    """提交评测任务，立即返回任务信息"""
+    return _request('POST', '/jobs', {
+        'model_path': model_path,
+        'datasets': list(datasets),
+        'max_samples': max_samples,
+        'device': device,
+        'debug': debug
+    })
+
+
+def get_job(job_id):
+    """查询评测任务状态"""
+    return _request('GET', f'/jobs/{job_id}')
@@ -1,10 +1,12 @@
 from .celery import app
 from celery_progress.backend import ProgressRecorder
 import os
+import time
 import shutil
 import zipfile
 from django.conf import settings
 import logging
+from . import eval_service
 
 logger = logging.getLogger(__name__)
 
@@ -96,3 +98,52 @@ def process_model_files(self, model_path, readme_path, address, model_id):
         }
 
 
+# 评测耗时通常超过全局任务时限，单独放宽为6小时
+@app.task(bind=True, time_limit=6 * 60 * 60)
+def run_model_evaluation(self, model_path, datasets, max_samples=None, debug=False):
+    """运行模型性能测试的异步任务，评测由常驻评测服务执行，本任务转发逐批次进度"""
+    try:
+        progress_recorder = ProgressRecorder(self)
+        progress_recorder.set_progress(0, 1, {'status': 'pending', 'message': '提交评测任务'})
+
+        job = eval_service.submit_job(model_path, datasets, max_samples=max_samples, debug=debug)
+        poll_interval = getattr(settings, 'EVAL_SERVICE_POLL_INTERVAL', 2)
+        last_progress = None
+
+        while job['status'] in ('pending', 'running'):
+            time.sleep(poll_interval)
+            job = eval_service.get_job(job['id'])
+            progress = job.get('progress')
+            if progress and progress != last_progress:
+                last_progress = progress
+                progress_recorder.set_progress(progress['done'], progress['total'], {
+                    'status': job['status'],
+                    'message': f"评测数据集 {progress['dataset_name']} "
+                               f"({progress['dataset_index'] + 1}/{progress['dataset_count']})",
+                    'dataset': progress['dataset_name'],
+                    'dataset_index': progress['dataset_index'],
+                    'dataset_count': progress['dataset_count'],
+                    'accuracy': progress['accuracy'],
+                    'throughput': progress['throughput']
+                })
+
+        if job['status'] != 'completed':
+            raise RuntimeError(job.get('error', '评测失败'))
+
+        return {
+            'status': 'success',
+            'job_id': job['id'],
+            'model_path': model_path,
+            'datasets': list(datasets),
+            'result': job['result'],
+            'message': '评测完成'
+        }
+
+    except Exception as e:
+        logger.error(f"模型性能测试失败 (model_path: {model_path}): {str(e)}")
+        return {
+            'status': 'error',
+            'model_path': model_path,
+            'datasets': list(datasets),
+            'message': str(e)
+        }
@@ -21,6 +21,12 @@ urlpatterns = [
     # 添加新的测试创建路由
     path('models/createtest/', views.create_test, name='create_test'),
     
+    # 测试进度查询接口（轮询）
+    path('models/test-progress/<str:task_id>/', views.get_test_progress, name='get_test_progress'),
+    
+    # 测试进度推送接口（SSE）
+    path('models/test-progress/<str:task_id>/stream/', views.stream_test_progress, name='stream_test_progress'),
+    
     # 注册模型接口
     # path('models/register/', views.register_model, name='register_model'),
     
@@ -1,9 +1,11 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import json
 from .models import AIModel,ce_type
+from .tasks import run_model_evaluation
 import os
+import time
 from django.conf import settings
 import logging
 
@@ -80,82 +82,30 @@ def create_test(request):
 
         # 从数据库获取数据集名称
         try:
-            datasets = ce_type.objects.filter(id__in=dataset_ids).values_list('name', flat=True)
+            datasets = list(ce_type.objects.filter(id__in=dataset_ids).values_list('name', flat=True))
             if not datasets:
                 return JsonResponse({
                     'success': False,
                     'message': '未找到指定的数据集'
                 })
-            datasets_str = ' '.join(datasets)
         except Exception as e:
             return JsonResponse({
                 'success': False,
                 'message': f'获取数据集信息失败: {str(e)}'
             })
 
-        # 构建测试命令
-        test_command = (
-            f"python model_evaluate_demo/comprehensive_evaluation.py "
-            f"--model-path={model_path} "
-            f"--datasets {datasets_str} "
-            f"--max-samples=5 "
-            f"--debug"
-        )
+        # 提交Celery异步任务，立即返回任务ID，不占用请求线程
+        task = run_model_evaluation.delay(model_path, datasets, max_samples=5, debug=True)
+        logger.info(f"评测任务已提交: {task.id}")
         
-        # 设置工作目录
-        work_dir = "E:/yun_test"
-        if not os.path.exists(work_dir):
-            os.makedirs(work_dir)
-            
-        # 执行命令并获取输出结果
-        import subprocess
-        try:
-            process = subprocess.Popen(
-                test_command,
-                shell=True,
-                cwd=work_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True  # 使用文本模式而不是字节模式
-            )
-            
-            # 获取输出和错误信息
-            stdout, stderr = process.communicate()
-            
-            # 等待进程完成并获取返回码
-            return_code = process.wait()
-            
-            # 准备输出结果
-            execution_result = {
-                'return_code': return_code,
-                'stdout': stdout,
-                'stderr': stderr,
-                'success': return_code == 0
+        return JsonResponse({
+            'success': True,
+            'data': {
+                'task_id': task.id,
+                'model_path': model_path,
+                'datasets': datasets
             }
-            
-            # 记录输出到日志
-            if return_code == 0:
-                logger.info(f"命令执行成功:\n{stdout}")
-            else:
-                logger.error(f"命令执行失败:\n{stderr}")
-            
-            return JsonResponse({
-                'success': True,
-                'data': {
-                    'command': test_command,
-                    'working_directory': work_dir,
-                    'model_path': model_path,
-                    'datasets': list(datasets),
-                    'execution_result': execution_result
-                }
-            })
-            
-        except Exception as e:
-            logger.error(f"执行测试命令失败: {str(e)}")
-            return JsonResponse({
-                'success': False,
-                'message': f'执行测试命令失败: {str(e)}'
-            })
+        })
         
     except json.JSONDecodeError:
         return JsonResponse({
@@ -168,3 +118,107 @@ def create_test(request):
             'success': False,
             'message': str(e)
         }, status=500)
+
+
+def _test_progress(task_id):
+    """读取评测任务的进度信息"""
+    task = run_model_evaluation.AsyncResult(task_id)
+    if task.state == 'PENDING':
+        return {
+            'state': 'pending',
+            'current': 0,
+            'total': 0,
+            'percent': 0,
+            'status': '等待处理...'
+        }
+    elif task.state == 'PROGRESS':
+        info = task.info or {}
+        description = info.get('description') or {}
+        return {
+            'state': 'progress',
+            'current': info.get('current', 0),
+            'total': info.get('total', 0),
+            'percent': info.get('percent', 0),
+            'status': description.get('message', ''),
+            'dataset': description.get('dataset'),
+            'dataset_index': description.get('dataset_index'),
+            'dataset_count': description.get('dataset_count'),
+            'accuracy': description.get('accuracy'),
+            'throughput': description.get('throughput')
+        }
+    elif task.state == 'SUCCESS':
+        result = task.result or {}
+        return {
+            'state': 'success' if result.get('status') == 'success' else 'error',
+            'current': 100,
+            'total': 100,
+            'percent': 100,
+            'status': result.get('message', ''),
+            'result': result
+        }
+    else:
+        return {
+            'state': 'error' if task.state == 'FAILURE' else task.state.lower(),
+            'current': 0,
+            'total': 0,
+            'percent': 0,
+            'status': str(task.info)  # 这里是错误信息
+        }
+
+
+@require_http_methods(["GET"])
+def get_test_progress(request, task_id):
+    """获取模型性能测试进度"""
+    try:
+        return JsonResponse({
+            'success': True,
+            'data': _test_progress(task_id)
+        })
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def stream_test_progress(request, task_id):
+    """
+    以服务器推送事件(SSE)的形式推送模型性能测试进度，包括实时准确率和吞吐量
+
+    项目以WSGI部署，每个连接在推送期间占用一个工作线程，因此每次连接最多推送
+    EVAL_PROGRESS_STREAM_MAX_SECONDS 秒后关闭，并通过 retry 字段让 EventSource
+    自动重连。重连后的第一条事件是当前进度，客户端收到结束状态后应关闭连接。
+    """
+    poll_interval = getattr(settings, 'EVAL_PROGRESS_STREAM_INTERVAL', 1)
+    max_seconds = getattr(settings, 'EVAL_PROGRESS_STREAM_MAX_SECONDS', 30)
+    retry_ms = int(getattr(settings, 'EVAL_PROGRESS_STREAM_RETRY', poll_interval) * 1000)
+
+    def event_stream():
+        deadline = time.monotonic() + max_seconds
+        last_event = None
+        yield f"retry: {retry_ms}\n\n"
+        while True:
+            try:
+                progress = _test_progress(task_id)
+            except Exception as e:
+                progress = {'state': 'error', 'status': str(e)}
+            event = json.dumps(progress, ensure_ascii=False)
+            if event != last_event:
+                last_event = event
+                yield f"data: {event}\n\n"
+            else:
+                # 心跳注释行，防止连接被代理超时断开
+                yield ": keep-alive\n\n"
+            if progress['state'] not in ('pending', 'progress', 'started'):
+                break
+            if time.monotonic() + poll_interval > deadline:
+                # 释放工作线程，EventSource 在 retry 间隔后重连并从当前进度继续
+                break
+            time.sleep(poll_interval)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -10,6 +10,9 @@ from model_evaluate_demo.utils.registry import MODELS, DATASETS, METRICS
 # 导入所有模型
 from model_evaluate_demo.models import *
 
+# 导入模型后端
+from model_evaluate_demo.backends import *
+
 # 导入所有数据集
 from model_evaluate_demo.datasets import *
 
@@ -11,7 +11,7 @@ import time
 import json
 import logging
 import datetime
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable
 
 # 设置HuggingFace镜像站点
 os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
@@ -25,8 +25,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # 使用相对导入
-from model_evaluate_demo.tasks import TaskRunner
+from model_evaluate_demo.tasks import TaskRunner, ModelPool
 from model_evaluate_demo.utils.registry import MODELS, DATASETS, METRICS
+from model_evaluate_demo.metrics.details import json_default
 
 def get_available_datasets() -> List[str]:
     """
@@ -89,6 +90,10 @@ def evaluate_model(
     local_files_only: bool = False,
     trust_remote_code: bool = False,
     device: Optional[str] = None,
+    resume: bool = False,
+    model_pool: Optional[ModelPool] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    generation_params: Optional[Dict[str, Any]] = None,
     **kwargs
 ) -> Dict[str, Any]:
     """
@@ -113,6 +118,13 @@ def evaluate_model(
         local_files_only: 是否只使用本地文件
         trust_remote_code: 是否信任远程代码
         device: 设备类型，如"cuda"或"cpu"
+        resume: 是否从检查点恢复，跳过上次中断前已完成的样本
+        model_pool: 模型池，多次调用传入同一个模型池时模型只加载一次，
+            使用完毕后由调用方调用 model_pool.release_all() 释放
+        progress_callback: 进度回调，每完成一个批次调用一次，参数为包含
+            done、total、throughput、accuracy 等字段的字典
+        generation_params: 生成参数，如 temperature、max_tokens、num_beams，
+            与 temperature、max_tokens 合并后作为评测的生成参数，同名时以此为准
         **kwargs: 其他参数
         
     Returns:
@@ -144,7 +156,7 @@ def evaluate_model(
     }
     
     # 添加HuggingFace特定参数
-    if model_type == "huggingface":
+    if model_type in ("huggingface", "huggingface_cpu"):
         model_config.update({
             "offline": offline,
             "local_files_only": local_files_only,
@@ -168,11 +180,21 @@ def evaluate_model(
     if max_samples is not None:
         dataset_config["max_samples"] = max_samples
     
+    # 准备生成参数，评测器只把 generation_kwargs 传给模型，生成缓存也按其判断是否为确定性生成
+    generation_kwargs = {
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if system_message:
+        generation_kwargs["system_message"] = system_message
+    generation_kwargs.update(generation_params or {})
+    
     # 准备评测配置
     eval_config = {
         "batch_size": batch_size,
         "temperature": temperature,
-        "max_tokens": max_tokens
+        "max_tokens": max_tokens,
+        "generation_kwargs": generation_kwargs
     }
     
     # 添加可选配置
@@ -214,8 +236,9 @@ def evaluate_model(
     
     # 创建TaskRunner并执行评测
     logger.info("开始运行评测...")
-    runner = TaskRunner(output_dir=output_dir, debug=debug)
-    results = runner.run_from_dict(config)
+    runner = TaskRunner(output_dir=output_dir, debug=debug, model_pool=model_pool,
+                        progress_callback=progress_callback)
+    results = runner.run_from_dict(config, resume=resume)
     
     # 处理结果
     task_result = results['tasks'][0] if results.get('tasks') else {}
@@ -224,7 +247,7 @@ def evaluate_model(
     os.makedirs(output_dir, exist_ok=True)
     result_file = os.path.join(output_dir, f"{timestamp}_api_result_{task_name}.json")
     with open(result_file, 'w', encoding='utf-8') as f:
-        json.dump(task_result, f, ensure_ascii=False, indent=2)
+        json.dump(task_result, f, ensure_ascii=False, indent=2, default=json_default)
     logger.info(f"API评测结果已保存到: {result_file}")
     
     return task_result
@@ -240,7 +263,7 @@ def save_results(results, output_dir):
     
     # 保存为JSON文件
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+        json.dump(results, f, ensure_ascii=False, indent=2, default=json_default)
         
     logger.info(f"API评测结果已保存到: {filepath}")
     
@@ -0,0 +1,10 @@
+"""
+模型后端相关模块
+"""
+
+from model_evaluate_demo.backends.openai_async import OpenAIAsyncModel
+from model_evaluate_demo.backends.huggingface_cpu import HuggingFaceCPUModel
+from model_evaluate_demo.backends.continuous import ContinuousBatchingEngine
+from model_evaluate_demo.backends.kv_cache import PrefixCache
+
+__all__ = ['OpenAIAsyncModel', 'HuggingFaceCPUModel', 'ContinuousBatchingEngine', 'PrefixCache']
\ No newline at end of file
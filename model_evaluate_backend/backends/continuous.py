@@ -0,0 +1,265 @@
+"""
+连续批处理生成引擎实现
+"""
+import time
+from model_evaluate_demo.backends.kv_cache import cache_layers, build_cache, build_prefixed_inputs
+
+
+class _Sequence:
+    """一个正在生成的序列"""
+    __slots__ = ('index', 'tokens', 'position', 'stopped')
+
+    def __init__(self, index, position):
+        self.index = index
+        self.tokens = []
+        self.position = position
+        self.stopped = False
+
+
+class ContinuousBatchingEngine:
+    """
+    连续批处理生成引擎
+
+    按解码步调度（iteration-level scheduling）：最多 max_batch_size 个序列共享一个批次
+    的KV缓存逐步解码，某个序列结束后立即从批次中移除，空出的槽位在下一步之前由新的提示
+    预填充后补入，批次不必等待其中最长的生成结束。不同长度的序列在KV缓存中左对齐填充，
+    通过注意力掩码和逐行的位置编号区分。适用于HuggingFace的因果语言模型，张量位于模型
+    所在的设备上，CPU和GPU均可使用。提供 prefix_cache 时，新加入的提示共享的前缀
+    复用缓存的KV，只预填充前缀之后的部分。
+    """
+    def __init__(self, model, tokenizer, max_batch_size=16, prefix_cache=None):
+        """
+        Args:
+            model: HuggingFace因果语言模型
+            tokenizer: 分词器，需要设置 pad_token
+            max_batch_size: 同时解码的最大序列数（槽位数）
+            prefix_cache: 共享前缀KV缓存（PrefixCache），默认不使用
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self.reset_stats()
+
+    def generate_stream(self, prompts, max_new_tokens=256, do_sample=False, temperature=1.0,
+                        top_p=None, top_k=None, stop_sequences=(), answer_stop=None, add_special_tokens=True):
+        """
+        连续批处理生成，每个序列结束时立即产出
+
+        Args:
+            prompts: 提示的可迭代对象，按需读取，不需要预先全部渲染
+            max_new_tokens: 每个序列的最大生成token数
+            do_sample: 是否采样，否则贪心解码
+            temperature / top_p / top_k: 采样参数
+            stop_sequences: 停止序列，生成文本中出现任一停止序列时结束该序列并在该处截断
+            answer_stop: 答案检测器（AnswerStopDetector），判定已给出完整的最终答案时结束该序列
+            add_special_tokens: 分词时是否添加特殊token
+
+        Yields:
+            tuple: (提示在输入中的序号, 生成的文本)，按完成顺序产出
+        """
+        import torch
+        import transformers
+
+        prompts = iter(prompts)
+        exhausted = False
+        next_index = 0
+        stop_sequences = [stop for stop in stop_sequences if stop]
+        window = max((len(stop) for stop in stop_sequences), default=0) + 8
+        eos_token_id = self.tokenizer.eos_token_id
+
+        active = []
+        layers = None
+        attention_mask = None
+        next_tokens = None
+
+        while True:
+            # 补充空闲槽位
+            free = self.max_batch_size - len(active)
+            admitted = []
+            while free > 0 and not exhausted:
+                try:
+                    prompt = next(prompts)
+                except StopIteration:
+                    exhausted = True
+                    break
+                admitted.append((next_index, prompt))
+                next_index += 1
+                free -= 1
+
+            if admitted:
+                start_time = time.time()
+                with torch.inference_mode():
+                    new_sequences, new_layers, new_mask, new_tokens = self._prefill(
+                        torch, transformers, admitted, do_sample, temperature, top_p, top_k, add_special_tokens
+                    )
+                    if active:
+                        layers, attention_mask = self._merge(torch, layers, attention_mask, new_layers, new_mask)
+                        next_tokens = torch.cat([next_tokens, new_tokens])
+                    else:
+                        layers, attention_mask, next_tokens = new_layers, new_mask, new_tokens
+                active.extend(new_sequences)
+                self._stats['prefill_seconds'] += time.time() - start_time
+                self._stats['prompts'] += len(admitted)
+
+            if not active:
+                return
+
+            # 记录上一步得到的token并检查结束条件
+            finished = []
+            for row, (sequence, token) in enumerate(zip(active, next_tokens.tolist())):
+                if token == eos_token_id:
+                    sequence.stopped = True
+                else:
+                    sequence.tokens.append(token)
+                    if len(sequence.tokens) >= max_new_tokens:
+                        sequence.stopped = True
+                    elif stop_sequences or answer_stop is not None:
+                        tail = self.tokenizer.decode(sequence.tokens[-window:], skip_special_tokens=True)
+                        sequence.stopped = any(stop in tail for stop in stop_sequences)
+                        if not sequence.stopped and answer_stop is not None and answer_stop.triggered(tail) and \
+                                answer_stop.detect(self.tokenizer.decode(sequence.tokens, skip_special_tokens=True)):
+                            sequence.stopped = True
+                            self._stats['answer_stops'] += 1
+                if sequence.stopped:
+                    finished.append(row)
+
+            if finished:
+                finished_rows = set(finished)
+                keep = [row for row in range(len(active)) if row not in finished_rows]
+                done = [active[row] for row in finished]
+                active = [active[row] for row in keep]
+                if active:
+                    with torch.inference_mode():
+                        layers, attention_mask, next_tokens = self._select(
+                            torch, layers, attention_mask, next_tokens, keep
+                        )
+                self._stats['generated_tokens'] += sum(len(sequence.tokens) for sequence in done)
+                for sequence in done:
+                    yield sequence.index, self._decode(sequence.tokens, stop_sequences)
+                if not active:
+                    continue
+
+            # 所有活跃序列一起解码一步
+            start_time = time.time()
+            with torch.inference_mode():
+                attention_mask = torch.cat([attention_mask, attention_mask.new_ones((len(active), 1))], dim=1)
+                position_ids = torch.tensor([[sequence.position] for sequence in active], device=self.model.device)
+                outputs = self.model(
+                    input_ids=next_tokens.unsqueeze(1),
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    past_key_values=build_cache(transformers, layers),
+                    use_cache=True
+                )
+                layers = cache_layers(outputs.past_key_values)
+                next_tokens = self._sample(torch, outputs.logits[:, -1, :], do_sample, temperature, top_p, top_k)
+            for sequence in active:
+                sequence.position += 1
+            self._stats['decode_seconds'] += time.time() - start_time
+            self._stats['steps'] += 1
+            self._stats['slot_steps'] += len(active)
+
+    def _prefill(self, torch, transformers, admitted, do_sample, temperature, top_p, top_k, add_special_tokens):
+        """对新加入的提示左填充后一起预填充，返回序列、KV缓存、注意力掩码和第一个token"""
+        prompts = [prompt for _, prompt in admitted]
+        prefix_length, past_key_values = 0, None
+        if self.prefix_cache is None:
+            inputs = self.tokenizer(prompts, return_tensors='pt', padding=True,
+                                    add_special_tokens=add_special_tokens).to(self.model.device)
+            input_ids, attention_mask = inputs['input_ids'], inputs['attention_mask']
+        else:
+            rows = self.tokenizer(prompts, add_special_tokens=add_special_tokens)['input_ids']
+            prefix_length, prefix_layers = self.prefix_cache.match(torch, rows)
+            input_ids, attention_mask = build_prefixed_inputs(
+                torch, rows, prefix_length, self.tokenizer.pad_token_id, self.model.device
+            )
+            if prefix_layers is not None:
+                input_ids = input_ids[:, prefix_length:]
+                past_key_values = build_cache(transformers, [
+                    (key.expand(len(rows), -1, -1, -1), value.expand(len(rows), -1, -1, -1))
+                    for key, value in prefix_layers
+                ])
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)[:, prefix_length:]
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                             past_key_values=past_key_values, use_cache=True)
+        sequences = [_Sequence(index, int(length)) for (index, _), length in zip(admitted, attention_mask.sum(-1))]
+        tokens = self._sample(torch, outputs.logits[:, -1, :], do_sample, temperature, top_p, top_k)
+        return sequences, cache_layers(outputs.past_key_values), attention_mask, tokens
+
+    @staticmethod
+    def _merge(torch, layers, attention_mask, new_layers, new_mask):
+        """将新序列的KV缓存拼接到批次中，较短的一方在序列维度左侧填充"""
+        length, new_length = attention_mask.shape[1], new_mask.shape[1]
+        target = max(length, new_length)
+
+        def pad(tensor, size, dim):
+            if size == 0:
+                return tensor
+            shape = list(tensor.shape)
+            shape[dim] = size
+            return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+        merged = [
+            (torch.cat([pad(key, target - length, 2), pad(new_key, target - new_length, 2)]),
+             torch.cat([pad(value, target - length, 2), pad(new_value, target - new_length, 2)]))
+            for (key, value), (new_key, new_value) in zip(layers, new_layers)
+        ]
+        mask = torch.cat([pad(attention_mask, target - length, 1), pad(new_mask, target - new_length, 1)])
+        return merged, mask
+
+    @staticmethod
+    def _select(torch, layers, attention_mask, next_tokens, keep):
+        """保留指定的行，并去掉所有行都是填充的前导列"""
+        index = torch.tensor(keep, device=attention_mask.device)
+        attention_mask = attention_mask.index_select(0, index)
+        # 移除最长序列结束后留下的、所有行都是填充的前导列
+        start = int(attention_mask.any(dim=0).int().argmax())
+        attention_mask = attention_mask[:, start:]
+        layers = [(key.index_select(0, index)[:, :, start:], value.index_select(0, index)[:, :, start:])
+                  for key, value in layers]
+        return layers, attention_mask, next_tokens.index_select(0, index)
+
+    @staticmethod
+    def _sample(torch, logits, do_sample, temperature, top_p, top_k):
+        """由最后一个位置的logits选出下一个token"""
+        if not do_sample:
+            return logits.argmax(dim=-1)
+        logits = logits.float() / max(temperature or 1.0, 1e-5)
+        if top_k:
+            threshold = torch.topk(logits, min(top_k, logits.shape[-1])).values[:, -1:]
+            logits = logits.masked_fill(logits < threshold, float('-inf'))
+        if top_p is not None and top_p < 1.0:
+            sorted_logits, sorted_indices = torch.sort(logits, descending=True)
+            cumulative = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+            # 保留累计概率首次达到 top_p 的token及之前的token
+            remove = cumulative - sorted_logits.softmax(dim=-1) >= top_p
+            logits = logits.masked_fill(torch.zeros_like(remove).scatter(1, sorted_indices, remove), float('-inf'))
+        return torch.multinomial(logits.softmax(dim=-1), 1).squeeze(1)
+
+    def _decode(self, tokens, stop_sequences):
+        text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+        for stop in stop_sequences:
+            pos = text.find(stop)
+            if pos != -1:
+                text = text[:pos]
+        return text
+
+    def stats(self):
+        """
+        返回生成统计
+
+        Returns:
+            dict: prompts、generated_tokens、steps（解码步数）、预填充和解码耗时、
+                  answer_stops（检测到答案提前结束的序列数），以及 slot_utilization
+                  （解码步中被占用的槽位比例）
+        """
+        stats = dict(self._stats)
+        capacity = stats['steps'] * self.max_batch_size
+        stats['slot_utilization'] = stats['slot_steps'] / capacity if capacity else 0.0
+        return stats
+
+    def reset_stats(self):
+        """清空生成统计"""
+        self._stats = {'prompts': 0, 'generated_tokens': 0, 'steps': 0, 'slot_steps': 0,
+                       'answer_stops': 0, 'prefill_seconds': 0.0, 'decode_seconds': 0.0}
@@ -0,0 +1,393 @@
+"""
+面向CPU推理的HuggingFace模型实现
+"""
+import gc
+import os
+import time
+from model_evaluate_demo.utils.registry import MODELS
+from model_evaluate_demo.backends.continuous import ContinuousBatchingEngine
+from model_evaluate_demo.backends.kv_cache import PrefixCache, build_cache, build_prefixed_inputs
+from model_evaluate_demo.metrics.answer_stop import AnswerStopDetector
+
+
+def _import_torch():
+    try:
+        import torch
+        import transformers
+    except ImportError:
+        raise ImportError("huggingface_cpu 模型需要安装torch和transformers")
+    return torch, transformers
+
+
+def _make_stopping_criteria(torch, transformers, tokenizer, stop_sequences, prompt_length, answer_stop=None):
+    """
+    创建按行判断停止序列和答案检测的停止条件
+
+    每行生成的文本中出现任一停止序列，或答案检测器（answer_stop）判定已给出完整的
+    最终答案时，将该行标记为已完成，已完成的行不再检查；所有行都完成时整批提前结束。
+    停止序列只解码每行末尾的少量token，检查开销与生成长度无关；答案检测只在末尾出现
+    结束标记时才解码整行。transformers 4.39及以上返回逐行的布尔张量，已完成的行之后
+    只填充pad；更早的版本只支持整批停止，在全部行完成时返回True。
+    """
+    per_row = tuple(int(part) for part in transformers.__version__.split('.')[:2]) >= (4, 39)
+    # 每个token至少对应一个字符，解码窗口取最长停止序列的长度加余量即可覆盖停止序列
+    window = max((len(stop) for stop in stop_sequences), default=0) + 8
+
+    class StopSequenceCriteria(transformers.StoppingCriteria):
+        def __init__(self):
+            self.done = None
+            self.answer_stops = 0
+
+        def __call__(self, input_ids, scores, **kwargs):
+            if self.done is None:
+                self.done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+            generated = input_ids[:, prompt_length:]
+            for row in torch.nonzero(~self.done).flatten().tolist():
+                tail = tokenizer.decode(generated[row, -window:], skip_special_tokens=True)
+                if any(stop in tail for stop in stop_sequences):
+                    self.done[row] = True
+                elif answer_stop is not None and answer_stop.triggered(tail) and \
+                        answer_stop.detect(tokenizer.decode(generated[row], skip_special_tokens=True)):
+                    self.done[row] = True
+                    self.answer_stops += 1
+            return self.done.clone() if per_row else bool(self.done.all())
+
+    return StopSequenceCriteria()
+
+
+@MODELS.register('huggingface_cpu')
+class HuggingFaceCPUModel:
+    """
+    面向CPU推理的HuggingFace模型
+
+    为只有CPU的评测节点优化吞吐量：整批左填充后一次调用 generate，使用静态KV缓存
+    避免逐步重新分配缓存，在 torch.inference_mode 下推理，可以控制PyTorch线程数，
+    并可选对线性层做动态int8量化。生成参数中给出 stop 时，每行遇到停止序列即结束，
+    整批全部结束时提前停止生成。启用 prefix_cache 时，提示共享的模板前缀只预填充一次，
+    其KV缓存在后续批次和后续评测中复用。每个批次的生成速度（tokens/秒）记录在
+    generation_stats() 中。
+    """
+    # 支持生成参数 stop_on_answer，评测器据此决定是否启用 early_stop
+    supports_answer_stop = True
+
+    def __init__(self, model_name_or_path, **kwargs):
+        """
+        Args:
+            model_name_or_path: 本地模型目录或模型名称
+            **kwargs:
+                - num_threads: PyTorch计算线程数，默认使用全部CPU
+                - num_interop_threads: PyTorch算子间并行线程数，默认不修改
+                - quantization: 'int8' 对线性层做动态int8量化，默认不量化
+                - torch_dtype: 权重数据类型，默认 float32；量化时必须为 float32
+                - cache_implementation: KV缓存实现，默认 'static'，模型不支持时回退为动态缓存
+                - use_chat_template: 是否使用分词器的对话模板，默认在分词器提供模板时使用
+                - trust_remote_code: 是否信任模型目录中的自定义代码
+                - local_files_only: 是否只使用本地文件
+                - log_throughput: 是否打印每个批次的生成速度，默认True
+                - prefix_cache: 是否缓存提示共享前缀的KV，默认False；
+                  命中前缀的批次使用动态KV缓存
+                - prefix_cache_size: 最多缓存的前缀数，默认4
+                - prefix_cache_min_tokens: 缓存前缀的最少token数，默认16
+        """
+        self.model_name = model_name_or_path
+        self.num_threads = kwargs.get('num_threads', None) or os.cpu_count() or 1
+        self.num_interop_threads = kwargs.get('num_interop_threads', None)
+        self.quantization = kwargs.get('quantization', 'int8' if kwargs.get('load_8bit') else None)
+        self.torch_dtype = kwargs.get('torch_dtype', 'float32')
+        self.cache_implementation = kwargs.get('cache_implementation', 'static')
+        self.use_chat_template = kwargs.get('use_chat_template', None)
+        self.trust_remote_code = kwargs.get('trust_remote_code', False)
+        self.local_files_only = kwargs.get('local_files_only', False)
+        self.log_throughput = kwargs.get('log_throughput', True)
+        self.prefix_cache = kwargs.get('prefix_cache', False)
+        self.prefix_cache_size = kwargs.get('prefix_cache_size', 4)
+        self.prefix_cache_min_tokens = kwargs.get('prefix_cache_min_tokens', 16)
+
+        self._model = None
+        self.tokenizer = None
+        self._prefix_cache = None
+        self.reset_stats()
+
+    def load(self):
+        """加载分词器和模型"""
+        if self._model is not None:
+            return self
+        torch, transformers = _import_torch()
+
+        torch.set_num_threads(self.num_threads)
+        if self.num_interop_threads:
+            try:
+                torch.set_num_interop_threads(self.num_interop_threads)
+            except RuntimeError:
+                # 算子间线程数只能在首次并行计算之前设置
+                print("PyTorch算子间线程数已初始化，忽略 num_interop_threads")
+
+        tokenizer = transformers.AutoTokenizer.from_pretrained(
+            self.model_name, trust_remote_code=self.trust_remote_code,
+            local_files_only=self.local_files_only
+        )
+        # 批量生成时左填充，使每行的最后一个位置都是提示的结尾
+        tokenizer.padding_side = 'left'
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        dtype = getattr(torch, self.torch_dtype) if isinstance(self.torch_dtype, str) else self.torch_dtype
+        if self.quantization == 'int8' and dtype != torch.float32:
+            raise ValueError("动态int8量化要求 torch_dtype 为 float32")
+        model = transformers.AutoModelForCausalLM.from_pretrained(
+            self.model_name, torch_dtype=dtype, trust_remote_code=self.trust_remote_code,
+            local_files_only=self.local_files_only
+        )
+        model.eval()
+
+        if self.quantization == 'int8':
+            from torch.ao.quantization import quantize_dynamic
+            model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif self.quantization:
+            raise ValueError(f"不支持的量化方式: {self.quantization}，可选 'int8'")
+
+        if self.use_chat_template is None:
+            self.use_chat_template = bool(getattr(tokenizer, 'chat_template', None))
+
+        self.tokenizer = tokenizer
+        self._model = model
+        if self.prefix_cache:
+            self._prefix_cache = PrefixCache(model, max_entries=self.prefix_cache_size,
+                                             min_tokens=self.prefix_cache_min_tokens)
+        print(f"在CPU上加载模型: {self.model_name}，线程数: {self.num_threads}，"
+              f"量化: {self.quantization or '无'}，KV缓存: {self.cache_implementation or 'dynamic'}")
+        return self
+
+    def unload(self):
+        """释放模型"""
+        self._model = None
+        self.tokenizer = None
+        self._prefix_cache = None
+        gc.collect()
+
+    def generate(self, prompts, **kwargs):
+        """
+        批量生成回复
+
+        Args:
+            prompts: 提示列表
+            **kwargs: 生成参数
+                - max_new_tokens / max_tokens: 最大生成token数，默认256
+                - temperature: 为0或未设置 do_sample 时贪心解码
+                - do_sample / top_p / top_k: 采样参数
+                - stop: 停止序列字符串或列表，生成文本在第一个停止序列处截断
+                - stop_on_answer: 答案检测配置，True或 AnswerStopDetector 的构造参数字典，
+                  某行给出完整的最终答案后结束该行
+                - system_message: 使用对话模板时的系统消息
+
+        Returns:
+            list: 生成的文本列表
+        """
+        if self._model is None:
+            self.load()
+        if not prompts:
+            return []
+        torch, transformers = _import_torch()
+
+        texts = [self._format_prompt(prompt, kwargs.get('system_message')) for prompt in prompts]
+        prefix_length, prefix_layers = 0, None
+        if self._prefix_cache is not None:
+            rows = self.tokenizer(texts, add_special_tokens=not self.use_chat_template)['input_ids']
+            with torch.inference_mode():
+                prefix_length, prefix_layers = self._prefix_cache.match(torch, rows)
+        if prefix_layers is None:
+            inputs = self.tokenizer(texts, return_tensors='pt', padding=True,
+                                    add_special_tokens=not self.use_chat_template)
+        else:
+            input_ids, attention_mask = build_prefixed_inputs(
+                torch, rows, prefix_length, self.tokenizer.pad_token_id, self._model.device
+            )
+            inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        prompt_length = inputs['input_ids'].shape[1]
+
+        stop = kwargs.get('stop')
+        stop_sequences = [stop] if isinstance(stop, str) else [s for s in (stop or []) if s]
+
+        answer_stop = AnswerStopDetector.from_config(kwargs.get('stop_on_answer'))
+
+        generate_kwargs = self._generate_kwargs(kwargs)
+        criteria = None
+        if stop_sequences or answer_stop is not None:
+            criteria = _make_stopping_criteria(torch, transformers, self.tokenizer, stop_sequences,
+                                               prompt_length, answer_stop)
+            generate_kwargs['stopping_criteria'] = transformers.StoppingCriteriaList([criteria])
+
+        start_time = time.time()
+        with torch.inference_mode():
+            if prefix_layers is None:
+                outputs = self._generate_with_cache(inputs, generate_kwargs)
+            else:
+                # 前缀之后的部分由 generate 预填充，已缓存的前缀不再计算
+                past_key_values = build_cache(transformers, [
+                    (key.expand(len(texts), -1, -1, -1), value.expand(len(texts), -1, -1, -1))
+                    for key, value in prefix_layers
+                ])
+                outputs = self._model.generate(**inputs, past_key_values=past_key_values, **generate_kwargs)
+        elapsed = time.time() - start_time
+
+        generated = outputs[:, prompt_length:]
+        # 填充和结束符之后的位置不计入生成token数
+        pad_token_id = self.tokenizer.pad_token_id
+        eos_token_id = self.tokenizer.eos_token_id
+        valid = generated != pad_token_id
+        if eos_token_id is not None and eos_token_id != pad_token_id:
+            valid &= torch.cumsum(generated == eos_token_id, dim=1) == 0
+        generated_tokens = int(valid.sum())
+        self._record_batch(len(prompts), int(inputs['attention_mask'].sum()), generated_tokens, elapsed,
+                           generate_kwargs['max_new_tokens'],
+                           answer_stops=criteria.answer_stops if criteria is not None else 0)
+
+        predictions = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        if stop_sequences:
+            predictions = [self._truncate(text, stop_sequences) for text in predictions]
+        return predictions
+
+    def generate_stream(self, prompts, max_batch_size=None, **kwargs):
+        """
+        连续批处理生成，每个提示完成时立即产出
+
+        与 generate 不同，批次中的序列结束后空出的槽位立即由后续提示补入，
+        短回复不必等待同批次中最长的生成结束。使用动态KV缓存。
+
+        Args:
+            prompts: 提示的可迭代对象，按需读取
+            max_batch_size: 同时解码的最大序列数，默认16
+            **kwargs: 生成参数，同 generate
+
+        Yields:
+            tuple: (提示在输入中的序号, 生成的文本)，按完成顺序产出
+        """
+        if self._model is None:
+            self.load()
+        system_message = kwargs.get('system_message')
+        generate_kwargs = self._generate_kwargs(kwargs)
+        stop = kwargs.get('stop')
+        stop_sequences = [stop] if isinstance(stop, str) else [s for s in (stop or []) if s]
+
+        engine = ContinuousBatchingEngine(self._model, self.tokenizer, max_batch_size=max_batch_size or 16,
+                                          prefix_cache=self._prefix_cache)
+        stream = engine.generate_stream(
+            (self._format_prompt(prompt, system_message) for prompt in prompts),
+            max_new_tokens=generate_kwargs['max_new_tokens'],
+            do_sample=generate_kwargs['do_sample'],
+            temperature=generate_kwargs.get('temperature', 1.0),
+            top_p=generate_kwargs.get('top_p'),
+            top_k=generate_kwargs.get('top_k'),
+            stop_sequences=stop_sequences,
+            answer_stop=AnswerStopDetector.from_config(kwargs.get('stop_on_answer')),
+            add_special_tokens=not self.use_chat_template
+        )
+        start_time = time.time()
+        try:
+            yield from stream
+        finally:
+            stats = engine.stats()
+            self._record_batch(stats['prompts'], None, stats['generated_tokens'], time.time() - start_time,
+                               generate_kwargs['max_new_tokens'], slot_utilization=stats['slot_utilization'], answer_stops=stats['answer_stops'])
+
+    def _format_prompt(self, prompt, system_message=None):
+        if not self.use_chat_template:
+            return prompt
+        messages = []
+        if system_message:
+            messages.append({'role': 'system', 'content': system_message})
+        messages.append({'role': 'user', 'content': prompt})
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def _generate_kwargs(self, kwargs):
+        """将评测的生成参数转换为 generate 参数"""
+        max_new_tokens = kwargs.get('max_new_tokens', kwargs.get('max_tokens', 256))
+        temperature = kwargs.get('temperature')
+        do_sample = kwargs.get('do_sample', temperature is not None and float(temperature) > 0)
+
+        generate_kwargs = {
+            'max_new_tokens': max_new_tokens,
+            'do_sample': do_sample,
+            'pad_token_id': self.tokenizer.pad_token_id
+        }
+        if do_sample:
+            if temperature is not None:
+                generate_kwargs['temperature'] = temperature
+            for key in ('top_p', 'top_k'):
+                if kwargs.get(key) is not None:
+                    generate_kwargs[key] = kwargs[key]
+        return generate_kwargs
+
+    def _generate_with_cache(self, inputs, generate_kwargs):
+        """使用配置的KV缓存实现生成，模型不支持静态缓存时回退为动态缓存并记住该结果"""
+        if self.cache_implementation:
+            try:
+                return self._model.generate(**inputs, cache_implementation=self.cache_implementation,
+                                            **generate_kwargs)
+            except (TypeError, ValueError, NotImplementedError) as e:
+                print(f"模型不支持 {self.cache_implementation} KV缓存，回退为动态缓存: {str(e)}")
+                self.cache_implementation = None
+        return self._model.generate(**inputs, **generate_kwargs)
+
+    @staticmethod
+    def _truncate(text, stop_sequences):
+        """在第一个停止序列处截断文本"""
+        end = len(text)
+        for stop in stop_sequences:
+            pos = text.find(stop)
+            if pos != -1:
+                end = min(end, pos)
+        return text[:end]
+
+    def _record_batch(self, batch_size, prompt_tokens, generated_tokens, elapsed, max_new_tokens,
+                      slot_utilization=None, answer_stops=0):
+        tokens_per_second = generated_tokens / elapsed if elapsed > 0 else 0.0
+        batch = {
+            'batch_size': batch_size,
+            'prompt_tokens': prompt_tokens,
+            'generated_tokens': generated_tokens,
+            'seconds': elapsed,
+            'tokens_per_second': tokens_per_second,
+            'max_new_tokens': max_new_tokens,
+            'answer_stops': answer_stops
+        }
+        if slot_utilization is not None:
+            batch['slot_utilization'] = slot_utilization
+        self._batches.append(batch)
+        if self.log_throughput:
+            utilization = f"，槽位利用率 {slot_utilization:.0%}" if slot_utilization is not None else ""
+            print(f"批次 {len(self._batches)}: {batch_size} 条，生成 {generated_tokens} tokens，"
+                  f"耗时 {elapsed:.2f}秒，{tokens_per_second:.1f} tokens/秒{utilization}")
+
+    def generation_stats(self):
+        """
+        返回生成统计
+
+        Returns:
+            dict: batches 为每个批次的样本数、提示token数、生成token数、耗时、tokens_per_second、
+                  生成token上限和因检测到答案提前结束的行数，以及全部批次合计的 generated_tokens、
+                  seconds、tokens_per_second、answer_stops、每个样本的平均生成token数和
+                  批次中最大的生成token上限 max_new_tokens；
+                  启用前缀缓存时 prefix_cache 为其命中统计
+        """
+        generated_tokens = sum(batch['generated_tokens'] for batch in self._batches)
+        seconds = sum(batch['seconds'] for batch in self._batches)
+        samples = sum(batch['batch_size'] for batch in self._batches)
+        stats = {
+            'generated_tokens': generated_tokens,
+            'seconds': seconds,
+            'tokens_per_second': generated_tokens / seconds if seconds > 0 else 0.0,
+            'tokens_per_sample': generated_tokens / samples if samples else 0.0,
+            'answer_stops': sum(batch['answer_stops'] for batch in self._batches),
+            'max_new_tokens': max((batch['max_new_tokens'] for batch in self._batches), default=None),
+            'batches': list(self._batches)
+        }
+        if self._prefix_cache is not None:
+            stats['prefix_cache'] = self._prefix_cache.stats()
+        return stats
+
+    def reset_stats(self):
+        """清空生成统计，缓存的前缀保留"""
+        self._batches = []
+        if self._prefix_cache is not None:
+            self._prefix_cache.reset_stats()
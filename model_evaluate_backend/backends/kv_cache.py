@@ -0,0 +1,165 @@
+"""
+KV缓存工具与共享前缀缓存实现
+"""
+from collections import OrderedDict
+
+
+def cache_layers(cache):
+    """
+    取出KV缓存中每层的 (key, value) 张量，形状为 [batch, heads, seq, dim]
+
+    兼容 transformers 不同版本的缓存格式：按层保存的 Cache.layers、
+    key_cache/value_cache 列表以及旧版的元组格式。
+    """
+    if hasattr(cache, 'layers'):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, 'key_cache'):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(layer[0], layer[1]) for layer in cache]
+
+
+def build_cache(transformers, layers):
+    """由每层的 (key, value) 张量构造动态KV缓存"""
+    cache = transformers.DynamicCache()
+    for layer_idx, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+def common_prefix_length(rows, limit):
+    """返回多个token序列的最长公共前缀长度，不超过 limit"""
+    length = 0
+    first = rows[0]
+    while length < limit and all(row[length] == first[length] for row in rows[1:]):
+        length += 1
+    return length
+
+
+def build_prefixed_inputs(torch, rows, prefix_length, pad_token_id, device):
+    """
+    构造共享前缀之后的批次输入
+
+    每行为 [前缀][填充][后缀]：前缀已在KV缓存中，各行的后缀在前缀之后左填充对齐，
+    使每行的最后一个位置都是提示的结尾。注意力掩码在填充处为0，位置编号由掩码的累加和得到。
+
+    Returns:
+        tuple: (input_ids, attention_mask)，均包含前缀部分，形状为 [batch, 前缀长度 + 最长后缀长度]
+    """
+    suffix_length = max(len(row) for row in rows) - prefix_length
+    input_ids = []
+    attention_mask = []
+    for row in rows:
+        padding = suffix_length - (len(row) - prefix_length)
+        input_ids.append(row[:prefix_length] + [pad_token_id] * padding + row[prefix_length:])
+        attention_mask.append([1] * prefix_length + [0] * padding + [1] * (len(row) - prefix_length))
+    return (torch.tensor(input_ids, device=device),
+            torch.tensor(attention_mask, device=device))
+
+
+class PrefixCache:
+    """
+    共享前缀KV缓存
+
+    评测提示通常以相同的模板、少样本示例或系统消息开头。对一批提示的token序列，
+    查找已缓存的、为所有行共有的最长前缀，命中时只需预填充前缀之后的部分。未命中时
+    以本批提示和上一批的第一个提示的公共前缀作为新前缀（单条提示的批次也能与上一批
+    共享），与已有前缀的公共部分足够长时直接截取已有的KV，否则计算一次前缀的KV。
+    截取使缓存收敛到模板中真正固定的部分，而不是偶然相同的题目开头。
+
+    前缀的KV只依赖前缀本身，缓存保存在模型实例上，同一个常驻模型的后续批次和
+    后续评测都可以复用，最多保留 max_entries 个前缀，按LRU淘汰。
+    """
+    def __init__(self, model, max_entries=4, min_tokens=16):
+        """
+        Args:
+            model: HuggingFace因果语言模型
+            max_entries: 最多缓存的前缀数
+            min_tokens: 前缀的最少token数，更短的公共前缀不缓存
+        """
+        self.model = model
+        self.max_entries = max_entries
+        self.min_tokens = min_tokens
+        self._entries = OrderedDict()
+        self._last = None
+        self.reset_stats()
+
+    def match(self, torch, rows):
+        """
+        为一批提示查找或创建共享前缀
+
+        Args:
+            torch: torch模块
+            rows: 每个提示的token id列表
+
+        Returns:
+            tuple: (前缀长度, 每层 (key, value) 张量，batch维为1)，没有可用前缀时为 (0, None)
+        """
+        # 每行至少保留一个前缀之后的token，用于得到下一个token的logits
+        limit = min(len(row) for row in rows) - 1
+        candidates = rows if self._last is None else rows + [self._last]
+        self._last = rows[0]
+
+        best = None
+        for prefix in self._entries:
+            length = len(prefix)
+            if length <= limit and (best is None or length > len(best)) and \
+                    all(tuple(row[:length]) == prefix for row in rows):
+                best = prefix
+        if best is not None:
+            self._entries.move_to_end(best)
+            self._record_hit(len(best), len(rows))
+            return len(best), self._entries[best]
+
+        if len(candidates) < 2:
+            return 0, None
+        length = common_prefix_length(candidates, limit)
+        if length < self.min_tokens:
+            return 0, None
+        common = tuple(rows[0][:length])
+
+        for prefix, layers in list(self._entries.items()):
+            shared = common_prefix_length([prefix, common], min(len(prefix), length))
+            if shared >= self.min_tokens:
+                layers = [(key[:, :, :shared].clone(), value[:, :, :shared].clone()) for key, value in layers]
+                self._store(common[:shared], layers)
+                self._record_hit(shared, len(rows))
+                return shared, layers
+
+        outputs = self.model(input_ids=torch.tensor([common], device=self.model.device), use_cache=True)
+        layers = cache_layers(outputs.past_key_values)
+        self._store(common, layers)
+        self._stats['misses'] += 1
+        self._stats['computed_tokens'] += length
+        self._stats['reused_tokens'] += length * (len(rows) - 1)
+        return length, layers
+
+    def _store(self, prefix, layers):
+        self._entries[prefix] = layers
+        self._entries.move_to_end(prefix)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _record_hit(self, length, batch_size):
+        self._stats['hits'] += 1
+        self._stats['reused_tokens'] += length * batch_size
+
+    def stats(self):
+        """
+        返回缓存统计
+
+        Returns:
+            dict: hits/misses 为命中和新建前缀的批次数，reused_tokens 为免于重复预填充的token数，
+                  computed_tokens 为计算前缀KV的token数，entries 为当前缓存的前缀长度
+        """
+        stats = dict(self._stats)
+        stats['entries'] = [len(prefix) for prefix in self._entries]
+        return stats
+
+    def reset_stats(self):
+        """清空缓存统计"""
+        self._stats = {'hits': 0, 'misses': 0, 'reused_tokens': 0, 'computed_tokens': 0}
+
+    def clear(self):
+        """清空缓存的前缀"""
+        self._entries.clear()
+        self._last = None
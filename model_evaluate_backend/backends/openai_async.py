@@ -0,0 +1,363 @@
+"""
+异步并发的OpenAI兼容模型实现
+"""
+import os
+import time
+import json
+import random
+import asyncio
+import threading
+from model_evaluate_demo.utils.registry import MODELS
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+# 可重试的HTTP状态码：超时、冲突、限流和服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+# 透传给接口的生成参数
+PASSTHROUGH_KEYS = ('top_p', 'stop', 'seed', 'presence_penalty', 'frequency_penalty', 'logit_bias', 'user')
+
+
+class APIRequestError(RuntimeError):
+    """接口请求失败"""
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+
+    令牌以 rate 个/秒的速度补充，最多积累 capacity 个，每个请求消耗一个令牌，
+    没有令牌时等待。允许短时间内突发 capacity 个请求，长期速率不超过 rate。
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量，默认为 max(1, rate)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = None
+
+    async def acquire(self):
+        """取得一个令牌，必要时等待"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 加锁保证等待中的请求按到达顺序取得令牌
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+
+class LatencyHistogram:
+    """
+    请求延迟直方图
+
+    按固定的桶上界计数，同时记录总和与最大值，分位数由桶上界估计。
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """记录一次请求的延迟"""
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """估计分位数，返回第一个累计计数达到 q 的桶上界（最后一个桶返回最大值）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """
+        返回直方图摘要
+
+        Returns:
+            dict: count、mean、max、p50、p90、p99（秒）以及各桶计数，桶名为上界
+        """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': {('inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+@MODELS.register('openai_async')
+class OpenAIAsyncModel:
+    """
+    异步并发的OpenAI兼容模型
+
+    调用 /chat/completions 接口，适用于OpenAI以及vLLM等兼容服务。一个批次内的提示
+    同时发出，由信号量限制同时在途的请求数，令牌桶限制请求速率；失败的请求按带抖动的
+    指数退避重试。HTTP连接池在后台线程的事件循环中常驻，批次之间复用keep-alive连接。
+    每个请求的延迟记录在直方图中，通过 request_stats() 获取。
+    """
+    def __init__(self, model_name_or_path, **kwargs):
+        """
+        Args:
+            model_name_or_path: 接口中的模型名称，如 gpt-3.5-turbo
+            **kwargs:
+                - api_key: API密钥，默认读取环境变量 OPENAI_API_KEY
+                - base_url: 接口地址，默认读取环境变量 OPENAI_BASE_URL，
+                  否则为 https://api.openai.com/v1
+                - max_concurrency: 同时在途的最大请求数，默认256
+                - max_connections: 连接池大小，默认与 max_concurrency 相同
+                - requests_per_minute: 每分钟最大请求数，None表示不限流
+                - burst: 令牌桶容量，即允许的突发请求数，默认为每秒请求数
+                - retry_count: 失败请求的最大重试次数，默认2
+                - retry_base_delay: 首次重试的退避上限（秒），默认0.5，之后每次翻倍
+                - retry_max_delay: 退避上限（秒），默认30
+                - timeout: 单个请求的超时时间（秒），默认60
+                - keepalive_timeout: 空闲连接保持时间（秒），默认30
+                - system_message: 默认系统消息
+                - ignore_errors: 为True时重试耗尽的请求返回空字符串，否则抛出异常
+        """
+        self.model_name = model_name_or_path
+        self.api_key = kwargs.get('api_key') or os.environ.get('OPENAI_API_KEY', '')
+        self.base_url = (kwargs.get('base_url') or os.environ.get('OPENAI_BASE_URL')
+                         or 'https://api.openai.com/v1').rstrip('/')
+        self.max_concurrency = kwargs.get('max_concurrency', 256)
+        self.max_connections = kwargs.get('max_connections', None) or self.max_concurrency
+        self.requests_per_minute = kwargs.get('requests_per_minute', None)
+        self.burst = kwargs.get('burst', None)
+        self.retry_count = kwargs.get('retry_count', 2)
+        self.retry_base_delay = kwargs.get('retry_base_delay', 0.5)
+        self.retry_max_delay = kwargs.get('retry_max_delay', 30.0)
+        self.timeout = kwargs.get('timeout', 60.0)
+        self.keepalive_timeout = kwargs.get('keepalive_timeout', 30.0)
+        self.system_message = kwargs.get('system_message', None)
+        self.ignore_errors = kwargs.get('ignore_errors', False)
+        # 同名模型在不同服务上的生成结果不同，生成缓存以接口地址区分
+        self.weights_fingerprint = self.base_url
+
+        self._model = None
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._bucket = None
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def load(self):
+        """启动后台事件循环并创建连接池"""
+        if self._model is not None:
+            return self
+        if aiohttp is None:
+            raise ImportError("openai_async 模型需要安装aiohttp: pip install aiohttp")
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name=f"openai-async-{self.model_name}", daemon=True)
+        self._thread.start()
+        self._model = asyncio.run_coroutine_threadsafe(self._create_session(), self._loop).result()
+        print(f"OpenAI兼容接口: {self.base_url}，模型: {self.model_name}，最大并发: {self.max_concurrency}")
+        return self
+
+    async def _create_session(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.requests_per_minute:
+            self._bucket = TokenBucket(self.requests_per_minute / 60.0, self.burst)
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections,
+                                         keepalive_timeout=self.keepalive_timeout)
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        return aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def unload(self):
+        """关闭连接池并停止后台事件循环"""
+        if self._loop is None:
+            return
+        if self._model is not None:
+            asyncio.run_coroutine_threadsafe(self._model.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._model = self._loop = self._thread = None
+
+    def generate(self, prompts, **kwargs):
+        """
+        批量生成回复
+
+        批次内的提示并发请求，返回顺序与提示顺序一致。
+
+        Args:
+            prompts: 提示列表
+            **kwargs: 生成参数，支持 temperature、max_tokens、system_message 以及
+                top_p、stop、seed 等接口参数
+
+        Returns:
+            list: 生成的文本列表
+        """
+        if self._model is None:
+            self.load()
+        return asyncio.run_coroutine_threadsafe(self._generate_batch(prompts, kwargs), self._loop).result()
+
+    async def _generate_batch(self, prompts, kwargs):
+        tasks = [asyncio.ensure_future(self._generate_one(prompt, kwargs)) for prompt in prompts]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # 一个请求最终失败时取消同批次其余请求
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _generate_one(self, prompt, kwargs):
+        """请求单个提示，失败时按带抖动的指数退避重试"""
+        payload = self._build_payload(prompt, kwargs)
+        attempt = 0
+        while True:
+            try:
+                return await self._request(payload)
+            except APIRequestError as e:
+                error = e
+            except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+                # 超时和连接错误
+                error = APIRequestError(f"{type(e).__name__}: {e}")
+
+            if not error.retryable or attempt >= self.retry_count:
+                self._count('failures')
+                if self.ignore_errors:
+                    print(f"请求失败，返回空回复: {error}")
+                    return ""
+                raise error
+
+            # 完全抖动：在 [0, 退避上限] 中随机等待，服务端给出 Retry-After 时至少等待该时长
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            if error.retry_after is not None:
+                delay = max(delay, error.retry_after)
+            attempt += 1
+            self._count('retries')
+            if error.status == 429:
+                self._count('rate_limited')
+            await asyncio.sleep(delay)
+
+    async def _request(self, payload):
+        """发送一次请求，返回回复文本"""
+        if self._bucket is not None:
+            await self._bucket.acquire()
+        async with self._semaphore:
+            with self._stats_lock:
+                self._in_flight += 1
+                self._stats['peak_in_flight'] = max(self._stats['peak_in_flight'], self._in_flight)
+            start_time = time.monotonic()
+            try:
+                async with self._model.post(f"{self.base_url}/chat/completions", data=payload) as response:
+                    body = await response.read()
+                    if response.status != 200:
+                        raise APIRequestError(
+                            f"HTTP {response.status}: {body[:200].decode('utf-8', 'replace')}",
+                            status=response.status,
+                            retry_after=self._parse_retry_after(response.headers.get('Retry-After'))
+                        )
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+                    self._stats['requests'] += 1
+                    self._latency.record(time.monotonic() - start_time)
+
+        try:
+            data = json.loads(body)
+            content = data['choices'][0]['message'].get('content')
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise APIRequestError(f"无法解析接口返回: {body[:200].decode('utf-8', 'replace')}", status=0)
+        return content or ""
+
+    def _build_payload(self, prompt, kwargs):
+        """构造请求体，序列化一次后在重试间复用"""
+        messages = []
+        system_message = kwargs.get('system_message', self.system_message)
+        if system_message:
+            messages.append({'role': 'system', 'content': system_message})
+        messages.append({'role': 'user', 'content': prompt})
+
+        payload = {
+            'model': self.model_name,
+            'messages': messages,
+            'temperature': kwargs.get('temperature', 0.7),
+            'max_tokens': kwargs.get('max_tokens', kwargs.get('max_new_tokens', 256))
+        }
+        for key in PASSTHROUGH_KEYS:
+            if kwargs.get(key) is not None:
+                payload[key] = kwargs[key]
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _parse_retry_after(value):
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def request_stats(self):
+        """
+        返回请求统计
+
+        Returns:
+            dict: requests（含重试的请求次数）、retries、rate_limited、failures、
+                  peak_in_flight、throttle_wait（限流等待的总秒数）和 latency 直方图摘要
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['throttle_wait'] = self._bucket.waited if self._bucket is not None else 0.0
+            stats['latency'] = self._latency.summary()
+        return stats
+
+    def reset_stats(self):
+        """清空请求统计"""
+        with self._stats_lock:
+            self._stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0, 'peak_in_flight': 0}
+            self._in_flight = 0
+            self._latency = LatencyHistogram()
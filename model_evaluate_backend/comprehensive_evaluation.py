@@ -23,9 +23,13 @@ os.environ["HF_DATASETS_OFFLINE"] = "1"
 os.environ["HF_HUB_OFFLINE"] = "1"
 
 from model_evaluate_demo.api import evaluate_model, list_datasets, list_metrics
+from model_evaluate_demo.tasks import ModelPool
+from model_evaluate_demo.metrics.details import json_default
 
 def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=None, 
-                               max_samples=None, device=None, debug=False):
+                               max_samples=None, device=None, debug=False, model_pool=None,
+                               progress_callback=None, model_type="huggingface", batch_size=1,
+                               early_stop=False, generation_cache=None, rescore_only=False):
     """
     运行全面评测流程
     
@@ -36,6 +40,18 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
         max_samples: 每个数据集使用的最大样本数量
         device: 使用的设备(cuda/cpu)
         debug: 是否开启调试模式
+        model_pool: 模型池。传入时复用其中已加载的模型，评测结束后不释放，
+            由调用方管理模型生命周期（常驻评测服务使用）；为None时本次评测
+            创建独立的模型池并在结束时释放
+        progress_callback: 进度回调，每完成一个批次调用一次，参数字典中额外包含
+            当前数据集序号 dataset_index 和数据集总数 dataset_count
+        model_type: 模型类型，只有CPU的节点可以使用 huggingface_cpu
+        batch_size: 推理批次大小
+        early_stop: 是否在检测到完整的最终答案后提前结束生成，检测规则使用各数据集的
+            answer_stop 配置，目前由 huggingface_cpu 模型支持
+        generation_cache: 生成结果缓存，True使用输出目录下的默认目录，字符串为缓存目录；
+            各数据集的生成参数为贪心解码，重复运行时直接读取缓存
+        rescore_only: 仅重新评分，所有预测从生成缓存读取，不调用模型
     """
     
     # 检查模型路径
@@ -93,13 +109,13 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
     print(f"设备: {device}")
     print(f"将评测以下数据集: {', '.join(datasets)}")
     
-    # 配置每个数据集的评测参数
+    # 配置每个数据集的评测参数，贪心解码使结果可复现并可以使用生成缓存
     dataset_configs = {
         "gsm8k": {
             "max_samples": 100 if max_samples is None else max_samples,
             "metrics": ["accuracy"],
             "generation": {
-                "temperature": 0.1,
+                "temperature": 0,
                 "max_tokens": 512,
                 "num_beams": 1
             },
@@ -109,7 +125,7 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
             "max_samples": 50 if max_samples is None else max_samples,
             "metrics": ["accuracy"],
             "generation": {
-                "temperature": 0.1,
+                "temperature": 0,
                 "max_tokens": 1024,
                 "num_beams": 1
             },
@@ -120,12 +136,17 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
     # 运行每个数据集的评测
     total_start_time = time.time()
     
-    for dataset in datasets:
+    # 所有数据集共享同一个模型实例，模型只加载一次
+    owns_model_pool = model_pool is None
+    if owns_model_pool:
+        model_pool = ModelPool()
+    
+    for dataset_index, dataset in enumerate(datasets):
         # 获取数据集配置，如果没有则使用默认值
         config = dataset_configs.get(dataset, {
             "max_samples": 50 if max_samples is None else max_samples,
             "metrics": ["accuracy"],
-            "generation": {"temperature": 0.1, "max_tokens": 512}
+            "generation": {"temperature": 0, "max_tokens": 512}
         })
         
         print(f"\n=============== 评测数据集: {dataset} ===============")
@@ -136,11 +157,17 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
             config["max_samples"] = max_samples[dataset]
             print(f"使用自定义样本数: {config['max_samples']}")
             
+        dataset_progress = None
+        if progress_callback is not None:
+            def dataset_progress(progress, dataset_index=dataset_index):
+                progress_callback(dict(progress, dataset_index=dataset_index,
+                                       dataset_count=len(datasets)))
+        
         start_time = time.time()
         try:
             results = evaluate_model(
                 model_path=model_path,
-                model_type="huggingface",
+                model_type=model_type,
                 dataset_name=dataset,
                 metrics=config["metrics"],
                 max_samples=config["max_samples"],
@@ -148,9 +175,15 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
                 trust_remote_code=True,
                 local_files_only=True,
                 device=device,
+                batch_size=batch_size,
                 debug=debug,
                 prompt_template=config.get("prompt_template"),
-                generation_params=config.get("generation", {})
+                generation_params=config.get("generation", {}),
+                model_pool=model_pool,
+                progress_callback=dataset_progress,
+                eval_early_stop=early_stop,
+                eval_generation_cache=generation_cache,
+                eval_rescore_only=rescore_only
             )
             
             eval_time = time.time() - start_time
@@ -159,9 +192,19 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
             eval_info["results"][dataset] = {
                 "metrics": results["metrics"],
                 "elapsed_time": f"{eval_time:.2f}秒",
-                "sample_count": config["max_samples"]
+                "sample_count": config["max_samples"],
+                "generation_kwargs": results.get("generation_kwargs", {})
             }
             
+            # 记录生成统计，early_stop 时 answer_stops 为提前结束的样本数
+            generation = results.get("generation")
+            if generation:
+                eval_info["results"][dataset]["generation"] = {
+                    key: generation[key] for key in ("max_new_tokens", "tokens_per_sample", "answer_stops",
+                                                     "generated_tokens", "tokens_per_second")
+                    if key in generation
+                }
+            
             # 保存每个样本的详细信息
             eval_info["results"][dataset]["samples"] = []
             for i, sample in enumerate(results["samples"]):
@@ -180,6 +223,9 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
             print(f"准确率: {results['metrics']['accuracy']['score']:.4f}")
             print(f"正确: {results['metrics']['accuracy']['correct']}/{results['metrics']['accuracy']['total']}")
             print(f"耗时: {eval_time:.2f}秒")
+            if generation and generation.get("max_new_tokens"):
+                print(f"平均生成token数: {generation['tokens_per_sample']:.1f}/{generation['max_new_tokens']}，"
+                      f"提前结束: {generation['answer_stops']}")
             
         except Exception as e:
             print(f"评测失败 - {dataset}: {str(e)}")
@@ -190,13 +236,17 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
                 "traceback": traceback.format_exc()
             }
     
+    # 评测结束，释放模型
+    if owns_model_pool:
+        model_pool.release_all()
+    
     total_eval_time = time.time() - total_start_time
     eval_info["total_elapsed_time"] = f"{total_eval_time:.2f}秒"
     
     # 保存评测结果
     results_file = os.path.join(output_dir, f"{eval_id}_results.json")
     with open(results_file, 'w', encoding='utf-8') as f:
-        json.dump(eval_info, f, ensure_ascii=False, indent=2)
+        json.dump(eval_info, f, ensure_ascii=False, indent=2, default=json_default)
     
     # 同时创建一个summary文件
     summary_file = os.path.join(output_dir, f"{eval_id}_summary.json")
@@ -246,6 +296,8 @@ def run_comprehensive_evaluation(model_path, output_dir="./outputs", datasets=No
             avg_score = sum(scores) / len(scores)
             print(f"{metric_name}: {avg_score:.4f}")
     
+    eval_info["results_file"] = results_file
+    eval_info["summary_file"] = summary_file
     return eval_info
 
 def main():
@@ -262,6 +314,16 @@ def main():
                       help="使用的设备")
     parser.add_argument("--debug", action="store_true",
                       help="开启调试模式")
+    parser.add_argument("--model-type", type=str, default="huggingface",
+                      help="模型类型，只有CPU的节点可以使用huggingface_cpu")
+    parser.add_argument("--batch-size", type=int, default=1,
+                      help="推理批次大小")
+    parser.add_argument("--early-stop", action="store_true",
+                      help="检测到完整的最终答案后提前结束生成")
+    parser.add_argument("--generation-cache", nargs="?", const=True, default=None,
+                      help="启用生成结果缓存，可以指定缓存目录")
+    parser.add_argument("--rescore-only", action="store_true",
+                      help="仅重新评分，所有预测从生成缓存读取")
     
     args = parser.parse_args()
     run_comprehensive_evaluation(
@@ -270,7 +332,12 @@ def main():
         args.datasets, 
         args.max_samples,
         args.device,
-        args.debug
+        args.debug,
+        model_type=args.model_type,
+        batch_size=args.batch_size,
+        early_stop=args.early_stop,
+        generation_cache=args.generation_cache,
+        rescore_only=args.rescore_only
     )
 
 if __name__ == "__main__":
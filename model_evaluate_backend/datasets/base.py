@@ -3,21 +3,55 @@
 """
 from abc import ABC, abstractmethod
 import os
-import json
-import re
+from model_evaluate_demo.datasets.cache import write_records, open_records, source_signature
+from model_evaluate_demo.datasets.template import compile_template
 
 
 class BaseDataset(ABC):
     """
     数据集基类
     """
+    # 样本字段名，用于在渲染前校验提示模板
+    schema = None
+    # 不影响样本选择和顺序的构造参数，不计入 selection_identity
+    non_selection_options = ('cache_path', 'cache_validation', 'answer_stop', 'template')
+    # 解析后决定样本选择和顺序的属性，子类可以扩展
+    selection_attrs = ('split', 'data_path', 'max_samples')
+    
     def __init__(self, name, **kwargs):
         self.name = name
+        self.options = dict(kwargs)
         self.data_path = kwargs.get('data_path', None)
         self.cache_path = kwargs.get('cache_path', '.cache')
         self.split = kwargs.get('split', 'test')
+        # 缓存校验方式：'mtime' 比较数据源的大小和修改时间，'hash' 比较数据源内容哈希
+        self.cache_validation = kwargs.get('cache_validation', 'mtime')
+        # 生成时检测答案提前结束的配置（AnswerStopDetector 的构造参数），None表示使用默认配置
+        self.answer_stop = kwargs.get('answer_stop', None)
+        # 当前数据来源的本地文件或目录及其签名，数据源变化时缓存失效
+        self.cache_sources = None
+        self.source_signature = ''
         self.data = None
         
+    def selection_identity(self):
+        """
+        返回决定样本选择和顺序的数据集配置
+        
+        由全部构造参数（不含 non_selection_options）和 selection_attrs 中解析后的属性组成，
+        子类新增的筛选参数无需登记即可计入。检查点日志以此区分数据集，两次运行的
+        样本子集不同时不会共用同一个检查点。
+        
+        Returns:
+            dict: 可JSON序列化的配置
+        """
+        identity = {key: value for key, value in self.options.items() if key not in self.non_selection_options}
+        for attr in self.selection_attrs:
+            value = getattr(self, attr, None)
+            if value is not None:
+                identity[attr] = value
+        identity['name'] = self.name
+        return identity
+    
     @abstractmethod
     def load(self):
         """加载数据集"""
@@ -35,31 +69,45 @@ class BaseDataset(ABC):
     
     def get_prompt(self, idx, template=None):
         """根据模板获取提示"""
-        item = self.get_item(idx)
+        return self.render_prompts([self.get_item(idx)], template)[0]
+    
+    def get_prompts(self, indices, template=None):
+        """根据模板批量获取提示"""
+        return self.render_prompts([self.get_item(idx) for idx in indices], template)
+    
+    def render_prompts(self, items, template=None):
+        """
+        使用编译后的模板批量渲染样本
         
+        Args:
+            items: 样本列表
+            template: 提示模板，None表示直接使用问题
+            
+        Returns:
+            list: 提示列表
+        """
         if template is None:
             # 默认使用直接返回问题
-            return item.get('question', '')
-        
-        # 首先检查是否使用了双花括号格式 {{variable}}
-        double_brace_matches = re.findall(r"\{\{(\w+)\}\}", template)
-        
-        if double_brace_matches:
-            # 使用双花括号格式的情况
-            prompt = template
-            for key in double_brace_matches:
-                if key in item:
-                    # 替换 {{key}} 为实际值
-                    prompt = prompt.replace(f"{{{{{key}}}}}", str(item[key]))
-                else:
-                    raise KeyError(f"模板中包含数据集中不存在的键: {key}")
-            return prompt
-        else:
-            # 使用传统的format格式化方法
-            try:
-                return template.format(**item)
-            except KeyError as e:
-                raise KeyError(f"模板中包含数据集中不存在的键: {e}")
+            return [item.get('question', '') for item in items]
+        return compile_template(template).render_batch(items)
+    
+    def fields(self):
+        """样本字段名，未声明schema时使用第一个样本的字段"""
+        if self.schema is not None:
+            return self.schema
+        if self.data:
+            return tuple(self.data[0].keys())
+        return ()
+    
+    def validate_template(self, template):
+        """
+        在渲染前检查模板变量是否都是数据集字段
+        
+        Raises:
+            KeyError: 模板中包含数据集中不存在的键
+        """
+        if template is not None:
+            compile_template(template).validate(self.fields())
             
     def __len__(self):
         return len(self.data) if self.data is not None else 0
@@ -67,28 +115,92 @@ class BaseDataset(ABC):
     def __getitem__(self, idx):
         return self.get_item(idx)
     
+    def cache_params(self):
+        """影响缓存内容的加载参数，参数变化时缓存失效"""
+        return {}
+    
+    def set_cache_sources(self, sources):
+        """设置数据来源并计算其签名，在加载缓存之前调用"""
+        self.cache_sources = sources
+        self.source_signature = source_signature(sources, self.cache_validation)
+    
+    def _cache_meta(self):
+        return {
+            'source': self.source_signature,
+            'params': self.cache_params()
+        }
+    
     def save_to_cache(self, filename, data):
-        """保存数据到缓存"""
+        """
+        保存数据到缓存
+        
+        缓存为带偏移索引的二进制文件，同时记录数据源签名和加载参数用于失效判断。
+        """
         os.makedirs(self.cache_path, exist_ok=True)
-        cache_file = os.path.join(self.cache_path, f"{filename}.json")
+        cache_file = os.path.join(self.cache_path, f"{filename}.bin")
         
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        write_records(cache_file, data, self._cache_meta())
         
         print(f"数据已缓存到 {cache_file}")
         
     def load_from_cache(self, filename):
-        """从缓存加载数据"""
-        cache_file = os.path.join(self.cache_path, f"{filename}.json")
+        """
+        从缓存加载数据
         
-        if not os.path.exists(cache_file):
-            return None
+        返回内存映射的记录序列，样本在访问时才解析。数据源或加载参数变化时返回None。
+        """
+        cache_file = os.path.join(self.cache_path, f"{filename}.bin")
         
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"从缓存 {cache_file} 加载数据")
-            return data
+            data = open_records(cache_file, self._cache_meta())
         except Exception as e:
             print(f"加载缓存失败: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+        
+        if data is not None:
+            print(f"从缓存 {cache_file} 加载数据")
+        return data
+    
+    def precompute_answers(self, name, func, field='answer'):
+        """
+        对全部样本的参考答案预先计算 func，结果与数据集缓存保存在同一目录
+        
+        结果按原答案保存为 原答案 -> 结果 的映射，与样本的选取和顺序无关。缓存记录数据源
+        签名、加载参数和 name，任一变化时重新计算；func 的实现变化时应同时修改 name。
+        
+        Args:
+            name: 结果名称，例如 'normalize_answer_v1'
+            func: 处理单个参考答案的函数
+            field: 参考答案字段
+            
+        Returns:
+            dict: 原答案 -> func(原答案)
+        """
+        if self.data is None:
+            raise RuntimeError("数据集尚未加载，请先调用load()")
+        
+        os.makedirs(self.cache_path, exist_ok=True)
+        cache_file = os.path.join(self.cache_path, f"{self.name}_{self.split}_{name}.bin")
+        meta = dict(self._cache_meta(), answers=name, field=field)
+        
+        try:
+            records = open_records(cache_file, meta)
+        except Exception:
+            records = None
+        if records is not None:
+            try:
+                table = {answer: value for answer, value in records}
+            finally:
+                records.close()
+            # 数据源有签名时缓存与当前数据一致；没有签名（示例数据或下载的数据）时，
+            # 缓存可能缺少当前数据的答案，需要检查
+            if self.source_signature or all(item.get(field, '') in table for item in self.data):
+                return table
+        
+        table = {}
+        for item in self.data:
+            answer = item.get(field, '')
+            if answer not in table:
+                table[answer] = func(answer)
+        write_records(cache_file, list(table.items()), meta)
+        return table
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+数据集二进制缓存实现
+"""
+import os
+import io
+import mmap
+import json
+import struct
+import hashlib
+from collections.abc import Sequence
+
+
+# 文件格式:
+#   头部   MAGIC | 元数据长度(uint32) | 元数据JSON
+#   记录区 每条记录一段紧凑JSON(UTF-8)
+#   偏移表 (记录数 + 1) 个 uint64，第i条记录位于 [offsets[i], offsets[i+1])
+#   尾部   偏移表位置(uint64) | 记录数(uint64) | MAGIC
+MAGIC = b'MEDCACH1'
+HEADER = struct.Struct('<8sI')
+OFFSET = struct.Struct('<Q')
+FOOTER = struct.Struct('<QQ8s')
+
+
+def source_signature(sources, validation='mtime'):
+    """
+    计算数据源签名
+
+    Args:
+        sources: 数据源文件或目录路径列表
+        validation: 'mtime' 使用文件大小和修改时间，'hash' 使用文件内容哈希
+
+    Returns:
+        str: 签名，数据源为空时返回空字符串
+    """
+    if not sources:
+        return ''
+
+    digest = hashlib.sha1()
+    for source in sorted(sources):
+        if os.path.isdir(source):
+            files = _walk_files(source)
+        elif os.path.exists(source):
+            files = [(os.path.basename(source), source)]
+        else:
+            continue
+
+        for relative_path, file_path in files:
+            digest.update(relative_path.encode('utf-8'))
+            if validation == 'hash':
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            else:
+                stat = os.stat(file_path)
+                digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _walk_files(root):
+    """按确定顺序列出目录下的所有文件（跳过隐藏目录），返回 (相对路径, 路径) 列表"""
+    files = []
+    pending = [('', root)]
+    while pending:
+        prefix, directory = pending.pop()
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.name.startswith('.'):
+                    pending.append((f"{prefix}{entry.name}/", entry.path))
+            else:
+                files.append((f"{prefix}{entry.name}", entry.path))
+    return files
+
+
+def write_records(path, records, meta=None):
+    """
+    将记录写入二进制缓存文件
+
+    先写入临时文件再替换，写入过程中断不会留下损坏的缓存。
+
+    Args:
+        path: 缓存文件路径
+        records: 可JSON序列化的记录列表
+        meta: 元数据字典，用于缓存校验
+    """
+    meta_bytes = json.dumps(meta or {}, ensure_ascii=False).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(meta_bytes)))
+        f.write(meta_bytes)
+
+        offsets = [f.tell()]
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            offsets.append(f.tell())
+
+        offsets_pos = f.tell()
+        buffer = io.BytesIO()
+        for offset in offsets:
+            buffer.write(OFFSET.pack(offset))
+        f.write(buffer.getvalue())
+        f.write(FOOTER.pack(offsets_pos, len(offsets) - 1, MAGIC))
+    os.replace(tmp_path, path)
+
+
+class CachedRecords(Sequence):
+    """
+    内存映射的缓存记录序列
+
+    打开文件时只读取头部和尾部，记录在访问时才从映射区解析，
+    加载时间与数据集大小无关。
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, meta_length = HEADER.unpack_from(self._mmap, 0)
+            offsets_pos, count, footer_magic = FOOTER.unpack_from(
+                self._mmap, len(self._mmap) - FOOTER.size
+            )
+            if magic != MAGIC or footer_magic != MAGIC:
+                raise ValueError(f"无效的缓存文件: {path}")
+        except Exception:
+            self.close()
+            raise
+
+        self.meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length].decode('utf-8'))
+        self._offsets_pos = offsets_pos
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._count))]
+        if idx < 0:
+            idx += self._count
+        if idx < 0 or idx >= self._count:
+            raise IndexError(f"索引{idx}超出缓存范围(0~{self._count - 1})")
+
+        start, = OFFSET.unpack_from(self._mmap, self._offsets_pos + idx * OFFSET.size)
+        end, = OFFSET.unpack_from(self._mmap, self._offsets_pos + (idx + 1) * OFFSET.size)
+        return json.loads(self._mmap[start:end].decode('utf-8'))
+
+    def close(self):
+        """关闭内存映射和文件"""
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def open_records(path, meta=None):
+    """
+    打开缓存文件并校验元数据
+
+    Args:
+        path: 缓存文件路径
+        meta: 期望的元数据，与文件中记录的不一致时视为缓存失效
+
+    Returns:
+        CachedRecords: 缓存记录序列，文件不存在、损坏或失效时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        records = CachedRecords(path)
+    except (ValueError, OSError, struct.error):
+        return None
+    if meta is not None and records.meta != meta:
+        records.close()
+        return None
+    return records
@@ -0,0 +1,167 @@
+"""
+带倒排索引的数据语料实现
+"""
+import re
+import threading
+from collections import OrderedDict
+from model_evaluate_demo.datasets.jsonl import RecordView
+
+
+INDEX_FIELDS = ('subject', 'difficulty', 'answer_type')
+
+
+def normalize_subject(subject):
+    """统一学科名称，'Counting & Probability' 与目录名 'counting_and_probability' 视为同一学科"""
+    if subject is None:
+        return None
+    subject = str(subject).strip().lower().replace('&', 'and')
+    return re.sub(r'[\s\-]+', '_', subject)
+
+
+def normalize_difficulty(difficulty):
+    """统一难度级别，'Level 3'、'level3'、'3' 和 3 均为 '3'，无法识别时返回None"""
+    if difficulty is None:
+        return None
+    match = re.search(r'\d+', str(difficulty))
+    return match.group(0) if match else None
+
+
+def answer_type(answer):
+    """
+    判断答案类型
+
+    Returns:
+        str: integer、decimal、fraction、multiple、expression 或 unknown
+    """
+    if answer is None:
+        return 'unknown'
+    answer = str(answer).strip().strip('$')
+    if not answer or answer == 'Unknown':
+        return 'unknown'
+    if re.fullmatch(r'[-+]?\d+', answer.replace(',', '')) and not re.search(r',\s', answer):
+        return 'integer'
+    if re.fullmatch(r'[-+]?\d*\.\d+', answer):
+        return 'decimal'
+    if re.fullmatch(r'[-+]?\d+\s*/\s*\d+', answer) or re.fullmatch(r'[-+]?\\d?frac\{\d+\}\{\d+\}', answer):
+        return 'fraction'
+    if ',' in answer:
+        return 'multiple'
+    return 'expression'
+
+
+def index_keys(record):
+    """计算记录在各索引中的键"""
+    return {
+        'subject': normalize_subject(record.get('subject')),
+        'difficulty': normalize_difficulty(record.get('difficulty')),
+        'answer_type': answer_type(record.get('answer'))
+    }
+
+
+def build_indexes(records):
+    """
+    建立倒排索引
+
+    Returns:
+        dict: 字段名 -> {键: 记录索引列表}
+    """
+    indexes = {field: {} for field in INDEX_FIELDS}
+    for i, record in enumerate(records):
+        for field, key in index_keys(record).items():
+            if key is not None:
+                indexes[field].setdefault(key, []).append(i)
+    return indexes
+
+
+class Corpus:
+    """
+    带倒排索引的语料
+
+    持有一份完整的记录序列以及 学科 -> 记录、难度 -> 记录、答案类型 -> 记录 的倒排索引，
+    按条件筛选得到的视图共享底层记录，不复制数据。索引未预先提供时在第一次筛选时建立。
+    """
+    def __init__(self, records, indexes=None, ordered=True, complete=True):
+        """
+        Args:
+            records: 记录序列
+            indexes: 预先计算的倒排索引，None表示按需建立
+            ordered: 记录顺序是否有意义；为False时按样本数截取改为固定种子的随机抽样
+            complete: 是否包含数据源的全部记录，只读取了开头部分记录时为False
+        """
+        self.records = records
+        self.ordered = ordered
+        self.complete = complete
+        self._indexes = indexes
+        self._lock = threading.Lock()
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            with self._lock:
+                if self._indexes is None:
+                    self._indexes = build_indexes(self.records)
+        return self._indexes
+
+    def __len__(self):
+        return len(self.records)
+
+    def ids(self, subject=None, difficulty=None, answer_type=None):
+        """
+        按条件筛选记录索引，条件之间取交集
+
+        Returns:
+            list: 按语料顺序排列的记录索引
+        """
+        conditions = {
+            'subject': normalize_subject(subject),
+            'difficulty': normalize_difficulty(difficulty),
+            'answer_type': answer_type
+        }
+        selected = None
+        for field, key in conditions.items():
+            if key is None:
+                continue
+            ids = self.indexes[field].get(key, [])
+            selected = ids if selected is None else sorted(set(selected).intersection(ids))
+        return list(range(len(self.records))) if selected is None else list(selected)
+
+    def view(self, subject=None, difficulty=None, answer_type=None):
+        """返回按条件筛选的记录视图"""
+        return RecordView(self.records, self.ids(subject, difficulty, answer_type))
+
+    def counts(self, field):
+        """返回某个索引字段下各键的记录数"""
+        return {key: len(ids) for key, ids in sorted(self.indexes[field].items())}
+
+
+# 进程内的语料缓存，同一数据源的不同筛选条件共享一次加载
+_CORPORA = OrderedDict()
+_CORPORA_LOCK = threading.Lock()
+MAX_CACHED_CORPORA = 8
+
+
+def get_corpus(key, loader):
+    """
+    获取缓存的语料，不存在时调用loader加载
+
+    Args:
+        key: 缓存键，应包含数据源路径和签名，数据源变化时键随之变化
+        loader: 无参数的加载函数，返回Corpus
+    """
+    with _CORPORA_LOCK:
+        if key in _CORPORA:
+            _CORPORA.move_to_end(key)
+            return _CORPORA[key]
+
+    corpus = loader()
+    with _CORPORA_LOCK:
+        _CORPORA[key] = corpus
+        while len(_CORPORA) > MAX_CACHED_CORPORA:
+            _CORPORA.popitem(last=False)
+    return corpus
+
+
+def clear_corpus_cache():
+    """清空进程内的语料缓存"""
+    with _CORPORA_LOCK:
+        _CORPORA.clear()
@@ -6,6 +6,7 @@ import json
 import requests
 from model_evaluate_demo.utils.registry import DATASETS
 from model_evaluate_demo.datasets.base import BaseDataset
+from model_evaluate_demo.datasets.jsonl import IndexedJsonl
 
 
 @DATASETS.register('gsm8k')
@@ -15,6 +16,9 @@ class GSM8KDataset(BaseDataset):
     
     GSM8K是一个由8.5K个高质量Grade School数学问题组成的数据集，这些问题需要2到8个步骤来解决。
     """
+    schema = ('question', 'full_answer', 'answer')
+    selection_attrs = BaseDataset.selection_attrs + ('subset',)
+    
     def __init__(self, **kwargs):
         super().__init__('gsm8k', **kwargs)
         self.subset = kwargs.get('subset', 'main')
@@ -25,6 +29,10 @@ class GSM8KDataset(BaseDataset):
             "问题: {{question}}\n\n请一步步思考，最后给出答案。"
         )
         
+        # 答案均为数值，提前结束生成时要求答案包含数字
+        if self.answer_stop is None:
+            self.answer_stop = {'require_digit': True, 'max_answer_chars': 32}
+        
         # 定义URLs
         self.urls = {
             'train': 'https://raw.githubusercontent.com/openai/grade-school-math/master/grade_school_math/data/train.jsonl',
@@ -53,9 +61,23 @@ class GSM8KDataset(BaseDataset):
                     
         print(f"GSM8K数据集路径: {self.data_path if self.data_path else '未设置'}")
         
+    def cache_params(self):
+        return {'subset': self.subset, 'max_samples': self.max_samples}
+    
+    def _local_sources(self):
+        """返回本地数据源文件，本地数据不存在时返回空列表"""
+        if not self.data_path or not os.path.exists(self.data_path):
+            return []
+        for filename in ("test.jsonl", f"{self.split}.jsonl"):
+            file_path = os.path.join(self.data_path, filename)
+            if os.path.exists(file_path):
+                return [file_path]
+        return [self.data_path]
+    
     def load(self):
         """加载GSM8K数据集"""
         cache_key = f"gsm8k_{self.subset}_{self.split}"
+        self.set_cache_sources(self._local_sources())
         
         # 尝试从缓存加载
         cached_data = self.load_from_cache(cache_key)
@@ -83,45 +105,22 @@ class GSM8KDataset(BaseDataset):
         return self._load_from_url()
     
     def _load_local_jsonl(self, file_path):
-        """从本地JSONL文件加载数据"""
+        """
+        从本地JSONL文件加载数据
+        
+        使用带偏移索引的读取器，文件只扫描一遍且索引保存在文件旁，样本在访问时才解析。
+        """
         try:
-            data = []
-            line_count = 0
-            
-            # 首先计算总行数
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for _ in f:
-                    line_count += 1
+            data = IndexedJsonl(file_path, transform=self._process_item, limit=self.max_samples)
+            print(f"JSONL文件将处理前{len(data)}行")
             
-            # 如果max_samples已设置且小于总行数，只处理max_samples的数据
-            process_count = min(line_count, self.max_samples) if self.max_samples else line_count
-            print(f"JSONL文件共有{line_count}行，将处理前{process_count}行")
-            
-            # 加载数据
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for i, line in enumerate(f):
-                    if self.max_samples and i >= self.max_samples:
-                        break
-                        
-                    if line.strip():
-                        try:
-                            item = json.loads(line.strip())
-                            processed_item = self._process_item(item)
-                            data.append(processed_item)
-                        except json.JSONDecodeError:
-                            print(f"跳过无效的JSON行: {line[:50]}...")
-                    
             self.data = data
             
-            # 保存到缓存
-            cache_key = f"gsm8k_{self.subset}_{self.split}"
-            self.save_to_cache(cache_key, data)
-            
             print(f"从本地加载了 {len(data)} 个GSM8K样本")
             return self
             
         except Exception as e:
-            print(f"从本地加载GSM8K数据集失败: {str(e)}")
+            print(f"从本地加载GSM8K数据失败: {str(e)}")
             # 回退到创建测试数据
             self.data = self._create_test_data()
             return self
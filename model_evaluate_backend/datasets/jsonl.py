@@ -0,0 +1,206 @@
+"""
+带偏移索引的JSONL读取实现
+"""
+import os
+import mmap
+import json
+import struct
+import hashlib
+from collections.abc import Sequence
+
+
+# 索引文件格式:
+#   头部 MAGIC | 源文件大小(uint64) | 源文件修改时间(uint64, ns) | 必需字段摘要(8字节) | 记录数(uint64)
+#   条目 每条记录一个 (起始偏移, 结束偏移) uint64 对
+# 版本2起建立索引时完整解析每一行，版本1的索引可能包含无法解析的行，需要重建
+INDEX_MAGIC = b'MEJSIDX2'
+INDEX_HEADER = struct.Struct('<8sQQ8sQ')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+
+class IndexedJsonl(Sequence):
+    """
+    带偏移索引的JSONL文件
+
+    只读一遍文件建立每条记录的字节偏移索引，并将索引保存在源文件旁的 .idx 文件中，
+    之后打开同一文件时直接映射索引，不再扫描。记录在访问时才解析，支持按样本索引
+    随机访问和切片。
+
+    建立索引时完整解析每一行，不是JSON对象或缺少必需字段的行被跳过，不占用样本索引，
+    因此访问时不会遇到无法解析的记录。解析只在建立索引的那一次扫描中进行，之后
+    直接使用保存的索引。
+    """
+    def __init__(self, path, transform=None, required_keys=(), limit=None, persist_index=True):
+        """
+        Args:
+            path: JSONL文件路径
+            transform: 记录解析后的处理函数，返回值作为样本
+            required_keys: 必需字段，缺少这些字段的记录被跳过
+            limit: 只使用前limit条记录；索引不存在时只扫描到第limit条为止
+            persist_index: 是否将完整索引保存到 .idx 文件
+        """
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.transform = transform
+        self.required_keys = tuple(required_keys)
+        self.persist_index = persist_index
+        self.skipped = 0
+
+        stat = os.stat(path)
+        self._source_size = stat.st_size
+        self._source_mtime = stat.st_mtime_ns
+        self._keys_digest = hashlib.sha1(
+            json.dumps(sorted(self.required_keys)).encode('utf-8')
+        ).digest()[:8]
+
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._source_size else b''
+        self._index_file = None
+        self._index = None
+        self._spans = None
+
+        count = self._open_index()
+        if count is None:
+            count = self._build_index(limit)
+        self.total = count
+        self._count = min(count, limit) if limit else count
+
+    def _open_index(self):
+        """映射已有的索引文件，索引不存在或与源文件不一致时返回None"""
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            index_file = open(self.index_path, 'rb')
+        except OSError:
+            return None
+        try:
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, size, mtime, keys_digest, count = INDEX_HEADER.unpack_from(index, 0)
+            valid = (magic == INDEX_MAGIC and size == self._source_size and mtime == self._source_mtime
+                     and keys_digest == self._keys_digest
+                     and len(index) == INDEX_HEADER.size + count * INDEX_ENTRY.size)
+        except (ValueError, OSError, struct.error):
+            index_file.close()
+            return None
+        if not valid:
+            index.close()
+            index_file.close()
+            return None
+
+        self._index_file = index_file
+        self._index = index
+        return count
+
+    def _build_index(self, limit=None):
+        """扫描源文件建立索引，扫描到文件末尾时保存索引文件"""
+        keys = [f'"{key}"'.encode('utf-8') for key in self.required_keys]
+        spans = []
+        complete = True
+        position = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                start = position
+                position += len(line)
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                # 先用字面量廉价地排除明显不合格的行，再完整解析
+                if stripped[:1] != b'{' or stripped[-1:] != b'}' or not all(key in stripped for key in keys):
+                    self.skipped += 1
+                    continue
+                try:
+                    record = json.loads(stripped.decode('utf-8'))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    self.skipped += 1
+                    continue
+                if not isinstance(record, dict) or not all(key in record for key in self.required_keys):
+                    self.skipped += 1
+                    continue
+                spans.append((start, position))
+                if limit and len(spans) >= limit:
+                    complete = f.readline() == b''
+                    break
+
+        if self.skipped:
+            print(f"跳过 {self.skipped} 行无效的JSON记录: {self.path}")
+
+        self._spans = spans
+        if complete and self.persist_index:
+            self._save_index(spans)
+        return len(spans)
+
+    def _save_index(self, spans):
+        """保存索引文件，源文件目录不可写时只在内存中使用索引"""
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, self._source_size, self._source_mtime,
+                                          self._keys_digest, len(spans)))
+                f.write(b''.join(INDEX_ENTRY.pack(start, end) for start, end in spans))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"无法保存JSONL索引 {self.index_path}: {str(e)}")
+
+    def span(self, idx):
+        """返回第idx条记录的 (起始偏移, 结束偏移)"""
+        if self._spans is not None:
+            return self._spans[idx]
+        return INDEX_ENTRY.unpack_from(self._index, INDEX_HEADER.size + idx * INDEX_ENTRY.size)
+
+    def raw(self, idx):
+        """返回第idx条记录的原始字节"""
+        start, end = self.span(self._check_index(idx))
+        return self._data[start:end]
+
+    def _check_index(self, idx):
+        if idx < 0:
+            idx += self._count
+        if idx < 0 or idx >= self._count:
+            raise IndexError(f"索引{idx}超出数据范围(0~{self._count - 1})")
+        return idx
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._count))]
+        item = json.loads(self.raw(idx).decode('utf-8'))
+        return self.transform(item) if self.transform is not None else item
+
+    def head(self, n):
+        """返回前n条记录"""
+        return self[:n]
+
+    def close(self):
+        """关闭文件映射"""
+        for name in ('_index', '_index_file', '_data', '_file'):
+            handle = getattr(self, name, None)
+            if handle is not None and hasattr(handle, 'close'):
+                handle.close()
+            setattr(self, name, None)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class RecordView(Sequence):
+    """
+    记录视图
+
+    按索引列表引用底层记录序列中的部分记录，不复制数据。
+    """
+    def __init__(self, records, indices):
+        self.records = records
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return RecordView(self.records, self.indices[idx])
+        return self.records[self.indices[idx]]
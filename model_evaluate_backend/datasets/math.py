@@ -2,10 +2,15 @@
 Math数据集实现
 """
 import os
+import copy
 import json
+import random
 import requests
 from model_evaluate_demo.utils.registry import DATASETS
 from model_evaluate_demo.datasets.base import BaseDataset
+from model_evaluate_demo.datasets.jsonl import IndexedJsonl, RecordView
+from model_evaluate_demo.datasets.math_loader import MathPack, collect_math_files, load_math_files
+from model_evaluate_demo.datasets.corpus import Corpus, get_corpus
 
 
 @DATASETS.register('math')
@@ -15,11 +20,22 @@ class MathDataset(BaseDataset):
     
     MATH数据集包含数学竞赛级别的问题，涵盖代数、几何、微积分、统计等多个领域。
     """
+    schema = ('problem', 'solution', 'subject', 'difficulty', 'answer')
+    non_selection_options = BaseDataset.non_selection_options + ('num_workers', 'parse_processes', 'pack')
+    selection_attrs = BaseDataset.selection_attrs + ('subject', 'difficulty', 'answer_type', 'seed')
+    
     def __init__(self, **kwargs):
         super().__init__('math', **kwargs)
         self.subject = kwargs.get('subject', None)  # 可以是 'algebra', 'geometry' 等
         self.difficulty = kwargs.get('difficulty', None)  # 1-5的难度级别
+        self.answer_type = kwargs.get('answer_type', None)  # 'integer', 'fraction', 'expression' 等
         self.max_samples = kwargs.get('max_samples', None)
+        self.seed = kwargs.get('seed', 0)  # 目录数据按最大样本数随机采样时使用的种子
+        self.corpus = None
+        # 目录数据的并行读取线程数、解析进程数（0表示在读取线程中解析），以及是否打包目录数据
+        self.num_workers = kwargs.get('num_workers', 16)
+        self.parse_processes = kwargs.get('parse_processes', 0)
+        self.pack = kwargs.get('pack', True)
         
         # 定义默认提示模板，使用双花括号语法确保与get_prompt方法兼容
         self.default_template = kwargs.get('template', 
@@ -51,154 +67,175 @@ class MathDataset(BaseDataset):
                     
         print(f"MATH数据集路径: {self.data_path if self.data_path else '未设置'}")
         
+    def _local_sources(self):
+        """返回本地数据源文件或目录，本地数据不存在时返回空列表"""
+        if not self.data_path or not os.path.exists(self.data_path):
+            return []
+        for filename in ("samples.jsonl", "demo.jsonl", "dataset.jsonl"):
+            file_path = os.path.join(self.data_path, filename)
+            if os.path.exists(file_path):
+                return [file_path]
+        return [self.data_path]
+    
     def load(self):
         """加载Math数据集"""
-        cache_key = f"math_{self.subject or 'all'}_{self.difficulty or 'all'}_{self.split}"
+        self.set_cache_sources(self._local_sources())
+        self.corpus = self._load_corpus()
+        self.data = self._select(self.corpus)
         
-        # 尝试从缓存加载
-        cached_data = self.load_from_cache(cache_key)
-        if cached_data is not None:
-            self.data = cached_data
-            print(f"从缓存加载了 {len(cached_data)} 个MATH样本")
-            return self
-            
-        # 首先检查是否有samples.jsonl文件
-        if self.data_path:
-            samples_file = os.path.join(self.data_path, "samples.jsonl")
-            if os.path.exists(samples_file):
-                print(f"从本地文件加载MATH样本数据: {samples_file}")
-                return self._load_local_jsonl(samples_file)
+        if not self.data:
+            print(f"没有符合筛选条件的MATH样本: 学科={self.subject}, 难度={self.difficulty}, 答案类型={self.answer_type}")
+        print(f"从 {len(self.corpus)} 个MATH样本中选取了 {len(self.data)} 个")
+        return self
+    
+    def _load_corpus(self, full=False):
+        """
+        加载MATH语料
         
-        # 其次检查是否有demo.jsonl文件
-        local_demo_file = None
-        if self.data_path:
-            local_demo_file = os.path.join(self.data_path, "demo.jsonl")
+        同一数据源在进程内只加载一次，不同学科、难度和答案类型的筛选共享同一份语料。
+        加载失败时使用测试数据。
+        
+        Args:
+            full: 为False且不筛选时，JSONL数据源只读取前max_samples条记录
             
-        # 如果有本地demo.jsonl文件，优先使用
-        if local_demo_file and os.path.exists(local_demo_file):
-            print(f"从本地文件加载MATH示例数据: {local_demo_file}")
-            return self._load_local_jsonl(local_demo_file)
+        Returns:
+            Corpus: 语料
+        """
+        if not self.cache_sources:
+            print("找不到本地MATH数据，尝试从网络下载示例数据...")
+            corpus = self._load_demo_data()
+        else:
+            source = self.cache_sources[0]
+            if os.path.isfile(source):
+                print(f"从本地文件加载MATH数据: {source}")
+                if not full and self.max_samples and not any((self.subject, self.difficulty, self.answer_type)):
+                    # 不筛选时只需扫描前max_samples条记录
+                    corpus = self._load_local_jsonl(source, limit=self.max_samples)
+                else:
+                    corpus = get_corpus((os.path.abspath(source), self.source_signature),
+                                        lambda: self._load_local_jsonl(source))
+            else:
+                print(f"从本地目录加载MATH数据: {source}")
+                corpus = get_corpus((os.path.abspath(source), self.source_signature, self.pack),
+                                    self._load_from_local)
         
-        # 如果指定了本地数据路径且该路径存在
-        if self.data_path and os.path.exists(self.data_path):
-            # 检查dataset.jsonl
-            dataset_file = os.path.join(self.data_path, "dataset.jsonl")
-            if os.path.exists(dataset_file):
-                print(f"从本地文件加载MATH数据集: {dataset_file}")
-                return self._load_local_jsonl(dataset_file)
-                
-            print(f"从本地目录加载MATH数据: {self.data_path}")
-            return self._load_from_local()
+        if corpus is None:
+            print("创建测试数据作为备用...")
+            corpus = Corpus(self._create_test_data())
+        return corpus
+    
+    def _select(self, corpus):
+        """
+        按学科、难度和答案类型从语料中筛选样本并处理最大样本数限制
         
-        # 否则尝试下载示例数据
-        print("找不到本地MATH数据，尝试从网络下载示例数据...")
-        return self._load_demo_data()
+        Returns:
+            RecordView: 共享语料记录的视图
+        """
+        ids = corpus.ids(self.subject, self.difficulty, self.answer_type)
+        if self.max_samples and len(ids) > self.max_samples:
+            if corpus.ordered:
+                ids = ids[:self.max_samples]
+            else:
+                # 目录数据的顺序没有意义，使用固定种子随机采样，保证结果可复现
+                ids = sorted(random.Random(self.seed).sample(ids, self.max_samples))
+        return RecordView(corpus.records, ids)
     
-    def _load_local_jsonl(self, file_path):
-        """从本地JSONL文件加载数据"""
-        try:
-            data = []
-            line_count = 0
-            
-            # 首先计算总行数
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for _ in f:
-                    line_count += 1
-            
-            # 如果max_samples已设置且小于总行数，只处理max_samples的数据
-            process_count = min(line_count, self.max_samples) if self.max_samples else line_count
-            print(f"JSONL文件共有{line_count}行，将处理前{process_count}行")
-            
-            # 加载数据
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for i, line in enumerate(f):
-                    if self.max_samples and i >= self.max_samples:
-                        break
-                        
-                    if line.strip():
-                        try:
-                            item = json.loads(line.strip())
-                            # 处理不同格式的数据
-                            if 'problem' in item:
-                                subject = item.get('type', item.get('subject', 'unknown'))
-                                difficulty = item.get('level', item.get('difficulty', 1))
-                                processed_item = self._process_item(item, subject, difficulty)
-                                
-                                # 如果item中已经有answer字段，直接使用
-                                if 'answer' in item and not processed_item.get('answer'):
-                                    processed_item['answer'] = item['answer']
-                                
-                                data.append(processed_item)
-                        except json.JSONDecodeError:
-                            print(f"跳过无效的JSON行: {line[:50]}...")
+    def view(self, **filters):
+        """
+        返回按条件筛选的数据集副本
+        
+        副本与原数据集共享同一份语料，不重新加载数据。未指定的条件沿用原数据集的设置。
+        
+        Args:
+            filters: subject、difficulty、answer_type
             
-            self.data = data
+        Returns:
+            MathDataset: 筛选后的数据集
+        """
+        if self.corpus is None:
+            self.load()
+        if not self.corpus.complete:
+            # 只读取了开头部分记录的语料不能用于筛选，加载完整语料
+            self.corpus = self._load_corpus(full=True)
+        dataset = copy.copy(self)
+        for name, value in filters.items():
+            if name not in ('subject', 'difficulty', 'answer_type'):
+                raise ValueError(f"不支持的筛选条件: {name}")
+            setattr(dataset, name, value)
+        dataset.data = dataset._select(self.corpus)
+        return dataset
+    
+    def strata(self, field='subject'):
+        """
+        按索引字段分层，用于分层评测
+        
+        Args:
+            field: subject、difficulty 或 answer_type
             
-            # 保存到缓存
-            cache_key = f"math_local_{os.path.basename(file_path)}_{self.split}"
-            self.save_to_cache(cache_key, data)
+        Returns:
+            dict: 键 -> 该层的数据集视图
+        """
+        if self.corpus is None or not self.corpus.complete:
+            self.view()
+        return {key: self.view(**{field: key}) for key in self.corpus.counts(field)}
+    
+    def _load_local_jsonl(self, file_path, limit=None):
+        """
+        从本地JSONL文件加载语料
+        
+        使用带偏移索引的读取器，文件只扫描一遍且索引保存在文件旁，样本在访问时才解析。
+        不包含problem字段的行在建立索引时跳过。
+        
+        Args:
+            file_path: JSONL文件路径
+            limit: 只使用前limit条记录
             
+        Returns:
+            Corpus: 语料，加载失败时返回None
+        """
+        try:
+            data = IndexedJsonl(file_path, transform=self._process_jsonl_item,
+                                required_keys=('problem',), limit=limit)
             print(f"从本地JSONL文件加载了 {len(data)} 个MATH样本")
-            return self
+            return Corpus(data, complete=limit is None or data.total < limit)
             
         except Exception as e:
             print(f"从本地JSONL文件加载MATH数据失败: {str(e)}")
-            # 回退到创建测试数据
-            print("创建测试数据作为备用...")
-            self.data = self._create_test_data()
-            return self
+            return None
+    
+    def _process_jsonl_item(self, item):
+        """处理JSONL文件中的数据项，兼容不同格式的主题和难度字段"""
+        subject = item.get('type', item.get('subject', 'unknown'))
+        difficulty = item.get('level', item.get('difficulty', 1))
+        processed_item = self._process_item(item, subject, difficulty)
+        
+        # 如果item中已经有answer字段，直接使用
+        if 'answer' in item and not processed_item.get('answer'):
+            processed_item['answer'] = item['answer']
+        
+        return processed_item
     
     def _load_from_local(self):
-        """从本地目录加载数据"""
+        """
+        从本地目录加载完整语料
+        
+        Returns:
+            Corpus: 语料，目录中没有有效数据时返回None
+        """
         try:
-            data = []
+            # 优先使用打包文件，不存在或已过期时并行读取目录并打包
+            corpus = self._load_from_pack() if self.pack else None
+            if corpus is not None:
+                return corpus
             
-            # 如果指定了学科，则只加载该学科的数据
-            if self.subject:
-                subject_dir = os.path.join(self.data_path, self.subject)
-                if not os.path.exists(subject_dir):
-                    raise FileNotFoundError(f"找不到学科目录: {subject_dir}")
-                subject_dirs = [subject_dir]
-            else:
-                # 加载所有学科
-                subject_dirs = []
-                for item in os.listdir(self.data_path):
-                    item_path = os.path.join(self.data_path, item)
-                    if os.path.isdir(item_path) and not item.startswith('.'):
-                        subject_dirs.append(item_path)
-            
-            # 从每个学科目录加载数据
-            for subject_dir in subject_dirs:
-                subject_name = os.path.basename(subject_dir)
-                
-                # 处理难度过滤
-                if self.difficulty:
-                    difficulty_dirs = [os.path.join(subject_dir, f"level{self.difficulty}")]
-                else:
-                    difficulty_dirs = []
-                    for i in range(1, 6):  # 难度级别1-5
-                        difficulty_dir = os.path.join(subject_dir, f"level{i}")
-                        if os.path.exists(difficulty_dir):
-                            difficulty_dirs.append(difficulty_dir)
-                
-                # 从每个难度级别加载数据
-                for difficulty_dir in difficulty_dirs:
-                    if not os.path.exists(difficulty_dir):
-                        continue
-                        
-                    difficulty_level = int(os.path.basename(difficulty_dir).replace('level', ''))
-                    
-                    # 查找所有JSON文件
-                    for filename in os.listdir(difficulty_dir):
-                        if filename.endswith('.json'):
-                            file_path = os.path.join(difficulty_dir, filename)
-                            try:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    item = json.load(f)
-                                    processed_item = self._process_item(item, subject_name, difficulty_level)
-                                    data.append(processed_item)
-                            except json.JSONDecodeError:
-                                print(f"跳过无效的JSON文件: {file_path}")
+            files = collect_math_files(self.data_path)
+            items = load_math_files(files, self.num_workers, self.parse_processes)
+            data = []
+            for (file_path, subject_name, difficulty_level), item in zip(files, items):
+                if item is None:
+                    print(f"跳过无效的JSON文件: {file_path}")
+                    continue
+                data.append(self._process_item(item, subject_name, difficulty_level))
             
             # 如果没有找到任何数据，尝试直接查找并加载JSON和JSONL文件
             if not data:
@@ -235,36 +272,60 @@ class MathDataset(BaseDataset):
                         except Exception as e:
                             print(f"加载文件 {file_path} 时出错: {str(e)}")
             
-            # 仍然没有数据，则创建示例数据
             if not data:
-                print("在本地目录中找不到任何有效数据，创建测试数据...")
-                data = self._create_test_data()
-            
-            # 处理最大样本数限制
-            if self.max_samples and len(data) > self.max_samples:
-                # 随机采样
-                import random
-                random.shuffle(data)
-                data = data[:self.max_samples]
-                
-            self.data = data
-            
-            # 保存到缓存
-            cache_key = f"math_{self.subject or 'all'}_{self.difficulty or 'all'}_{self.split}"
-            self.save_to_cache(cache_key, data)
+                print("在本地目录中找不到任何有效数据")
+                return None
             
             print(f"从本地加载了 {len(data)} 个MATH样本")
-            return self
+            return Corpus(data, ordered=False)
             
         except Exception as e:
             print(f"从本地加载MATH数据集失败: {str(e)}")
-            # 创建测试数据作为备用
-            print("创建测试数据作为备用...")
-            self.data = self._create_test_data()
-            return self
+            return None
+    
+    def _load_from_pack(self):
+        """
+        从打包文件加载目录数据
+        
+        Returns:
+            Corpus: 使用打包时建立的索引的语料，目录中没有标准结构的数据时返回None
+        """
+        pack = MathPack(self.data_path, self.cache_path, self.cache_validation)
+        # 数据来源就是该目录时复用已计算的签名，避免重复遍历目录
+        signature = self.source_signature if self.cache_sources == [self.data_path] else None
+        meta = pack.load_meta(signature)
+        if meta is None:
+            print(f"并行读取MATH目录并打包: {self.data_path}")
+            meta = pack.build(self._process_item, self.num_workers, self.parse_processes)
+            if meta is None:
+                return None
+        else:
+            print(f"从打包文件加载MATH数据: {pack.records_path}")
+        return pack.open(meta)
+    
+    def pack_directory(self):
+        """
+        将本地目录结构的数据打包为单个带索引的文件，之后的加载直接读取打包文件
+        
+        Returns:
+            dict: 打包元数据
+        """
+        pack = MathPack(self.data_path, self.cache_path, self.cache_validation)
+        return pack.build(self._process_item, self.num_workers, self.parse_processes)
     
     def _load_demo_data(self):
-        """从URL加载示例数据"""
+        """
+        从URL加载示例数据
+        
+        Returns:
+            Corpus: 语料，下载失败时返回None
+        """
+        cache_key = f"math_demo_{self.split}"
+        cached_data = self.load_from_cache(cache_key)
+        if cached_data is not None:
+            print(f"从缓存加载了 {len(cached_data)} 个MATH示例样本")
+            return Corpus(cached_data)
+        
         try:
             print(f"从URL下载MATH示例数据: {self.demo_data_url}")
             
@@ -283,25 +344,15 @@ class MathDataset(BaseDataset):
                     )
                     data.append(processed_item)
             
-            if self.max_samples and len(data) > self.max_samples:
-                data = data[:self.max_samples]
-                
-            self.data = data
-            
-            # 保存到缓存
-            cache_key = f"math_demo_{self.split}"
+            # 保存完整数据到缓存，筛选和样本数限制在语料上进行
             self.save_to_cache(cache_key, data)
             
             print(f"从URL加载了 {len(data)} 个MATH示例样本")
-            return self
+            return Corpus(data)
             
         except Exception as e:
             print(f"加载MATH示例数据失败: {str(e)}")
-            
-            # 如果无法加载在线数据，创建一些测试数据
-            print("创建测试数据作为备用...")
-            self.data = self._create_test_data()
-            return self
+            return None
     
     def _process_item(self, item, subject, difficulty):
         """处理原始数据项"""
@@ -0,0 +1,182 @@
+"""
+MATH目录数据的并行加载与打包
+"""
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from model_evaluate_demo.datasets.cache import source_signature
+from model_evaluate_demo.datasets.jsonl import IndexedJsonl
+from model_evaluate_demo.datasets.corpus import Corpus, index_keys, INDEX_FIELDS
+
+
+PACK_VERSION = 2
+LEVELS = range(1, 6)  # 难度级别1-5
+
+
+def collect_math_files(data_path, subject=None, difficulty=None):
+    """
+    收集 学科/levelN/*.json 目录结构中的数据文件
+
+    结果按 (学科, 难度, 文件名) 排序，保证加载顺序确定。
+
+    Returns:
+        list: (文件路径, 学科, 难度) 列表
+    """
+    if subject:
+        subjects = [subject]
+    else:
+        subjects = sorted(
+            item for item in os.listdir(data_path)
+            if os.path.isdir(os.path.join(data_path, item)) and not item.startswith('.')
+        )
+
+    files = []
+    for subject_name in subjects:
+        subject_dir = os.path.join(data_path, subject_name)
+        levels = [int(difficulty)] if difficulty else LEVELS
+        for level in levels:
+            level_dir = os.path.join(subject_dir, f"level{level}")
+            if not os.path.isdir(level_dir):
+                continue
+            for filename in sorted(os.listdir(level_dir)):
+                if filename.endswith('.json'):
+                    files.append((os.path.join(level_dir, filename), subject_name, level))
+    return files
+
+
+def _read_bytes(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def _parse_json(raw):
+    """解析JSON文件内容，无效内容返回None"""
+    try:
+        return json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _read_json(file_path):
+    return _parse_json(_read_bytes(file_path))
+
+
+def load_math_files(files, num_workers=16, parse_processes=0):
+    """
+    并行读取数据文件
+
+    文件读取使用线程池；parse_processes 大于0时读取的内容交给进程池解析，
+    否则在读取线程中直接解析。结果顺序与输入文件顺序一致。
+
+    Args:
+        files: collect_math_files 返回的文件列表
+        num_workers: 读取线程数
+        parse_processes: 解析进程数，0表示不使用进程池
+
+    Returns:
+        list: 与文件一一对应的原始数据项，无效文件对应None
+    """
+    paths = [file_path for file_path, _, _ in files]
+    if not paths:
+        return []
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        if not parse_processes:
+            return list(executor.map(_read_json, paths))
+        contents = list(executor.map(_read_bytes, paths))
+
+    with ProcessPoolExecutor(max_workers=parse_processes) as executor:
+        chunksize = max(1, len(contents) // (parse_processes * 4))
+        return list(executor.map(_parse_json, contents, chunksize=chunksize))
+
+
+class MathPack:
+    """
+    MATH目录数据打包文件
+
+    将 学科/levelN/*.json 目录树合并为单个带偏移索引的JSONL文件，记录按
+    (学科, 难度, 文件名) 排序。打包时同时建立学科、难度和答案类型的倒排索引并保存在
+    元数据中，按条件筛选时无需解析记录。源目录的签名变化时打包文件失效。
+    """
+    def __init__(self, data_path, pack_dir, validation='mtime'):
+        self.data_path = data_path
+        self.validation = validation
+        key = hashlib.sha1(os.path.abspath(data_path).encode('utf-8')).hexdigest()[:12]
+        self.pack_dir = os.path.join(pack_dir, f"math_pack_{key}")
+        self.records_path = os.path.join(self.pack_dir, 'records.jsonl')
+        self.meta_path = os.path.join(self.pack_dir, 'meta.json')
+
+    def signature(self):
+        return source_signature([self.data_path], self.validation)
+
+    def load_meta(self, signature=None):
+        """
+        读取元数据，打包文件不存在或已过期时返回None
+
+        Args:
+            signature: 已计算的源目录签名，为None时重新计算
+        """
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.records_path):
+            return None
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if signature is None:
+            signature = self.signature()
+        if meta.get('version') != PACK_VERSION or meta.get('signature') != signature:
+            return None
+        return meta
+
+    def build(self, process_item, num_workers=16, parse_processes=0):
+        """
+        并行读取整个目录树并写入打包文件
+
+        Args:
+            process_item: 处理函数 (原始数据项, 学科, 难度) -> 样本
+            num_workers: 读取线程数
+            parse_processes: 解析进程数
+
+        Returns:
+            dict: 元数据，目录中没有数据文件时返回None
+        """
+        signature = self.signature()
+        files = collect_math_files(self.data_path)
+        if not files:
+            return None
+        items = load_math_files(files, num_workers, parse_processes)
+
+        os.makedirs(self.pack_dir, exist_ok=True)
+        indexes = {field: {} for field in INDEX_FIELDS}
+        count = 0
+        tmp_path = f"{self.records_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for (file_path, subject, level), item in zip(files, items):
+                if item is None:
+                    print(f"跳过无效的JSON文件: {file_path}")
+                    continue
+                record = process_item(item, subject, level)
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                for field, key in index_keys(record).items():
+                    if key is not None:
+                        indexes[field].setdefault(key, []).append(count)
+                count += 1
+        os.replace(tmp_path, self.records_path)
+
+        meta = {
+            'version': PACK_VERSION,
+            'data_path': os.path.abspath(self.data_path),
+            'signature': signature,
+            'count': count,
+            'indexes': indexes
+        }
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        print(f"已将 {count} 个MATH样本打包到 {self.records_path}")
+        return meta
+
+    def open(self, meta):
+        """打开打包的记录文件，返回使用预先计算索引的语料"""
+        return Corpus(IndexedJsonl(self.records_path), indexes=meta['indexes'], ordered=False)
@@ -0,0 +1,79 @@
+"""
+提示模板编译实现
+"""
+import re
+import string
+import functools
+
+
+DOUBLE_BRACE = re.compile(r"\{\{(\w+)\}\}")
+
+
+class PromptTemplate:
+    """
+    编译后的提示模板
+
+    模板只解析一次：双花括号模板 {{variable}} 中的字面文本被转义后，与变量一起编译为
+    一个 str.format 格式串；不含双花括号变量的模板按传统format格式处理。渲染时对每个
+    样本只调用一次 format_map，不再逐个变量查找替换。
+    """
+    def __init__(self, template):
+        self.template = template
+        keys = DOUBLE_BRACE.findall(template)
+        if keys:
+            self.style = 'double_brace'
+            parts = DOUBLE_BRACE.split(template)
+            # split结果中偶数位置为字面文本，奇数位置为变量名
+            self._format = ''.join(
+                part.replace('{', '{{').replace('}', '}}') if i % 2 == 0 else f"{{{part}}}"
+                for i, part in enumerate(parts)
+            )
+            self.fields = tuple(dict.fromkeys(keys))
+        else:
+            self.style = 'format'
+            self._format = template
+            self.fields = tuple(dict.fromkeys(
+                re.match(r"[^.\[]*", field_name).group(0)
+                for _, field_name, _, _ in string.Formatter().parse(template)
+                if field_name is not None
+            ))
+
+    def validate(self, fields):
+        """
+        检查模板变量是否都是数据集中的字段
+
+        Args:
+            fields: 数据集样本的字段名集合
+
+        Raises:
+            KeyError: 模板中包含数据集中不存在的键
+        """
+        missing = [field for field in self.fields if field not in fields]
+        if missing:
+            raise KeyError(f"模板中包含数据集中不存在的键: {', '.join(missing)}")
+
+    def render(self, item):
+        """渲染单个样本"""
+        return self.render_batch([item])[0]
+
+    def render_batch(self, items):
+        """
+        渲染一批样本
+
+        Args:
+            items: 样本字典列表
+
+        Returns:
+            list: 与样本一一对应的提示
+        """
+        render = self._format.format_map
+        try:
+            return [render(item) for item in items]
+        except KeyError as e:
+            raise KeyError(f"模板中包含数据集中不存在的键: {e.args[0]}") from None
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(template):
+    """编译提示模板，相同的模板只编译一次"""
+    return PromptTemplate(template)
@@ -2,9 +2,18 @@
 准确率评估指标实现
 """
 import re
-import string
+import numpy as np
 from model_evaluate_demo.utils.registry import METRICS
 from model_evaluate_demo.metrics.base import BaseMetric
+from model_evaluate_demo.metrics.extraction import (
+    AnswerExtractor, NORMALIZE_MEMO, NORMALIZE_VERSION, normalize_answer, normalize_answer_cached
+)
+from model_evaluate_demo.metrics.details import DetailsTable
+from model_evaluate_demo.metrics.numeric import parse_number, parse_numbers, numeric_matches
+
+
+ITEM_SEPARATOR = re.compile(r'[,;\s]+')
+WORD = re.compile(r'\b\w+\b')
 
 
 @METRICS.register('accuracy')
@@ -14,8 +23,10 @@ class AccuracyMetric(BaseMetric):
     
     从生成文本中提取数值答案，并与参考答案比较。
     """
-    def __init__(self):
-        super().__init__('accuracy')
+    def __init__(self, **kwargs):
+        super().__init__('accuracy', **kwargs)
+        # 预编译的答案提取引擎，记录各规则的命中次数
+        self.extractor = AnswerExtractor()
         
     def compute(self, predictions, references, **kwargs):
         """
@@ -32,6 +43,37 @@ class AccuracyMetric(BaseMetric):
         Returns:
             dict: 包含准确率和详细信息的字典
         """
+        debug = kwargs.get('debug', False)
+        
+        if debug:
+            print("开始准确率计算...")
+        
+        state = self.init_state()
+        details = self.update(state, predictions, references, **kwargs)
+        result = self.finalize(state)
+        result['details'] = details
+        
+        if debug:
+            print(f"准确率计算完成: {result['correct']}/{result['total']} = {result['score']}")
+        
+        return result
+    
+    def init_state(self):
+        return {'correct': 0, 'total': 0}
+    
+    def update(self, state, predictions, references, **kwargs):
+        """
+        将一批预测的判断结果累加到状态中
+        
+        Args:
+            state: init_state 创建的状态，原地更新
+            predictions: 该批的模型生成文本
+            references: 该批的参考答案
+            **kwargs: 同 compute
+            
+        Returns:
+            DetailsTable: 该批的逐样本详情，index 为批内索引
+        """
         if len(predictions) != len(references):
             raise ValueError(f"预测数量 ({len(predictions)}) 与参考答案数量 ({len(references)}) 不匹配")
         
@@ -39,9 +81,6 @@ class AccuracyMetric(BaseMetric):
         normalize = kwargs.get('normalize', True)
         debug = kwargs.get('debug', False)
         
-        if debug:
-            print("开始准确率计算...")
-        
         # 提取预测答案
         extracted_predictions = []
         for i, pred in enumerate(predictions):
@@ -68,41 +107,79 @@ class AccuracyMetric(BaseMetric):
                 
             normalized_references.append(norm_ref)
         
-        # 计算准确率
-        correct = 0
-        details = []
-        
-        for i, (pred, ref) in enumerate(zip(extracted_predictions, normalized_references)):
-            # 使用强化的答案匹配逻辑
-            is_correct = self._is_answer_correct(pred, ref)
-            
-            if is_correct:
-                correct += 1
-                
-            details.append({
-                'index': i,
-                'prediction': predictions[i],
-                'extracted': extracted_predictions[i],
-                'reference': references[i],
-                'normalized_reference': normalized_references[i],
-                'correct': is_correct
-            })
-            
-            if debug:
-                print(f"样本 {i} 判断: {'✓ 正确' if is_correct else '✗ 错误'}")
-        
-        accuracy = correct / len(predictions) if predictions else 0
-        
+        # 判断正误，使用强化的答案匹配逻辑
+        correct_flags = self._compare_batch(extracted_predictions, normalized_references)
         if debug:
-            print(f"准确率计算完成: {correct}/{len(predictions)} = {accuracy}")
+            for i, is_correct in enumerate(correct_flags):
+                print(f"样本 {i} 判断: {'✓ 正确' if is_correct else '✗ 错误'}")
         
+        state['correct'] += sum(correct_flags)
+        state['total'] += len(predictions)
+        
+        # 列式详情，预测文本和参考答案只引用传入的序列
+        return DetailsTable({
+            'index': range(len(predictions)),
+            'prediction': predictions,
+            'extracted': extracted_predictions,
+            'reference': references,
+            'normalized_reference': normalized_references,
+            'correct': correct_flags
+        }, referenced=('prediction', 'reference'))
+    
+    def merge(self, states):
+        """合并多个状态，也可以传入 finalize 返回的结果"""
         return {
-            'score': accuracy,
-            'correct': correct,
-            'total': len(predictions),
-            'details': details
+            'correct': sum(state['correct'] for state in states),
+            'total': sum(state['total'] for state in states)
         }
     
+    def finalize(self, state):
+        total = state['total']
+        return {
+            'score': state['correct'] / total if total else 0,
+            'correct': state['correct'],
+            'total': total
+        }
+    
+    def _compare_batch(self, predictions, references):
+        """
+        批量判断预测答案是否正确
+        
+        精确匹配和数值匹配对整批一次完成：数值匹配先将全部答案解析为数组，再按容差规则
+        向量化比较。只有剩余的行逐个进行集合匹配和包含关系检查，结果与逐个调用
+        _is_answer_correct 一致。
+        
+        Args:
+            predictions: 归一化后的预测答案列表
+            references: 归一化后的参考答案列表
+            
+        Returns:
+            list: 每个样本是否正确
+        """
+        if not predictions:
+            return []
+        
+        # 1. 精确匹配
+        results = [pred == ref for pred, ref in zip(predictions, references)]
+        pending = [i for i, is_correct in enumerate(results) if not is_correct]
+        if not pending:
+            return results
+        
+        # 2. 数值匹配（允许精度误差），只解析未精确匹配的行
+        numeric = numeric_matches(parse_numbers([predictions[i] for i in pending]),
+                                  parse_numbers([references[i] for i in pending]))
+        
+        # 3-4. 剩余的行中，只有两侧都含分隔符或都较长的才可能通过集合匹配或包含关系检查
+        pending = np.asarray(pending)
+        for i in pending[numeric].tolist():
+            results[i] = True
+        for i in pending[~numeric].tolist():
+            pred, ref = predictions[i], references[i]
+            if ((len(pred) > 10 and len(ref) > 10) or (',' in pred and ',' in ref)
+                    or (';' in pred and ';' in ref)):
+                results[i] = self._match_text(pred, ref)
+        return results
+    
     def _is_answer_correct(self, prediction, reference):
         """
         判断预测答案是否正确
@@ -119,33 +196,19 @@ class AccuracyMetric(BaseMetric):
             return True
             
         # 2. 数值匹配（允许精度误差）
-        try:
-            # 替换常见的数学符号
-            pred_processed = prediction.replace('π', 'pi').replace('pi', '3.14159')
-            ref_processed = reference.replace('π', 'pi').replace('pi', '3.14159')
-            
-            # 尝试转换为浮点数
-            pred_num = float(pred_processed)
-            ref_num = float(ref_processed)
-            
-            # 允许小误差，处理浮点精度问题
-            if abs(pred_num - ref_num) < 1e-5:
-                return True
-                
-            # 对于大数，考虑相对误差
-            if max(abs(pred_num), abs(ref_num)) > 1.0:
-                relative_error = abs(pred_num - ref_num) / max(abs(pred_num), abs(ref_num))
-                if relative_error < 0.001:  # 允许0.1%的相对误差
-                    return True
-        except (ValueError, TypeError):
-            pass  # 不是数值，继续下一步判断
+        if numeric_matches(np.array([parse_number(prediction)]), np.array([parse_number(reference)]))[0]:
+            return True
             
+        return self._match_text(prediction, reference)
+    
+    def _match_text(self, prediction, reference):
+        """数值匹配失败后，使用集合匹配和包含关系检查判断答案是否正确"""
         # 3. 集合匹配（顺序无关）
         # 如果答案包含逗号，可能是一组值
         if (',' in prediction and ',' in reference) or (';' in prediction and ';' in reference):
             # 提取数组元素
-            pred_items = re.split(r'[,;\s]+', prediction)
-            ref_items = re.split(r'[,;\s]+', reference)
+            pred_items = ITEM_SEPARATOR.split(prediction)
+            ref_items = ITEM_SEPARATOR.split(reference)
             
             # 移除空元素
             pred_items = [item.strip() for item in pred_items if item.strip()]
@@ -157,8 +220,8 @@ class AccuracyMetric(BaseMetric):
         # 4. 包含关系检查（适用于较长文本答案）
         if len(prediction) > 10 and len(reference) > 10:
             # 检查核心内容是否包含
-            pred_tokens = set(re.findall(r'\b\w+\b', prediction.lower()))
-            ref_tokens = set(re.findall(r'\b\w+\b', reference.lower()))
+            pred_tokens = set(WORD.findall(prediction.lower()))
+            ref_tokens = set(WORD.findall(reference.lower()))
             
             # 如果共同词占参考答案词的80%以上，认为基本正确
             if len(ref_tokens) > 0:
@@ -168,193 +231,30 @@ class AccuracyMetric(BaseMetric):
         
         return False
     
+    def prepare_references(self, dataset):
+        """将数据集全部参考答案的归一化结果固定在共享记忆表中，结果随数据集缓存保存"""
+        if hasattr(dataset, 'precompute_answers'):
+            NORMALIZE_MEMO.pin(dataset.precompute_answers(NORMALIZE_VERSION, normalize_answer))
+    
+    def worker_state(self):
+        return dict(self.extractor.hits)
+    
+    def merge_worker_state(self, state):
+        """合并子进程中的答案提取规则命中次数"""
+        self.extractor.hits.update(state)
+    
     def _extract_answer(self, text, pattern=None):
         """
         从文本中提取答案
         
-        参考了OpenCompass等主流评测框架的实现
+        参考了OpenCompass等主流评测框架的实现，规则见 extraction.DEFAULT_RULES
         """
-        if not text:
-            return ""
-            
-        # 如果提供了模式，使用该模式
-        if pattern:
-            matches = re.search(pattern, text)
-            if matches and matches.groups():
-                return matches.group(1).strip()
-        
-        # 尝试查找boxed答案 (常见于LaTeX格式)
-        boxed_pattern = r'\\boxed\{(.*?)\}'
-        boxed_matches = re.search(boxed_pattern, text)
-        if boxed_matches:
-            return boxed_matches.group(1).strip()
-        
-        # 1. 查找直接的答案标识词
-        direct_patterns = [
-            # 中文模式
-            r'答案是[:：]?\s*(.+?)(?:\.|。|$|\n)',
-            r'答案[:：]\s*(.+?)(?:\.|。|$|\n)',
-            r'答案为[:：]?\s*(.+?)(?:\.|。|$|\n)',
-            r'因此答案为:?\s*(.+?)(?:\.|。|$|\n)',
-            r'所以答案是:?\s*(.+?)(?:\.|。|$|\n)',
-            r'因此答案是:?\s*(.+?)(?:\.|。|$|\n)',
-            r'所以答案为:?\s*(.+?)(?:\.|。|$|\n)',
-            r'最终答案:?\s*(.+?)(?:\.|。|$|\n)',
-            r'最终答案为:?\s*(.+?)(?:\.|。|$|\n)',
-            r'最终答案是:?\s*(.+?)(?:\.|。|$|\n)',
-            r'计算得[\s\S]*答案[是为]?\s*[:：]?\s*(.+?)(?:\.|。|$|\n)',
-            
-            # 英文模式
-            r'the answer is:?\s*(.+?)(?:\.|$|\n)',
-            r'answer:?\s*(.+?)(?:\.|$|\n)',
-            r'the final answer is:?\s*(.+?)(?:\.|$|\n)',
-            r'therefore,? the answer is:?\s*(.+?)(?:\.|$|\n)',
-            r'thus,? the answer is:?\s*(.+?)(?:\.|$|\n)',
-            r'hence,? the answer is:?\s*(.+?)(?:\.|$|\n)',
-            r'so,? the answer is:?\s*(.+?)(?:\.|$|\n)'
-        ]
-        
-        for p in direct_patterns:
-            matches = re.search(p, text, re.IGNORECASE)
-            if matches:
-                return matches.group(1).strip()
-        
-        # 2. 检查Python代码输出
-        code_patterns = [
-            r'```(?:python|)\s*[\s\S]*?```\s*输出[:：]?\s*(.+?)(?:\n|$)',
-            r'```output\s*\n([\d\.\+\-]+)',
-            r'执行结果[:：]?\s*(.+?)(?:\n|$)'
-        ]
-        
-        for p in code_patterns:
-            matches = re.search(p, text)
-            if matches:
-                return matches.group(1).strip()
-        
-        # 3. 查找等式结果
-        equals_pattern = r'=\s*([\d\.\+\-πpi\/\*]+)(?:\s|$|\.|。|,|，)'
-        equals_matches = re.findall(equals_pattern, text)
-        if equals_matches:
-            # 返回最后一个等式结果
-            return equals_matches[-1].strip()
-        
-        # 4. 提取数值答案
-        number_patterns = [
-            r'得[到得][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)',
-            r'计算得[到得][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)',
-            r'结果[为是][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)',
-            r'(?:等于|=)[\s\S]{0,5}([\d\.]+)(?:\s|$|\.|。)'
-        ]
-        
-        for p in number_patterns:
-            matches = re.search(p, text)
-            if matches:
-                return matches.group(1).strip()
-        
-        # 5. 尝试从最后一段提取
-        paragraphs = text.split('\n\n')
-        last_paragraph = paragraphs[-1].strip() if paragraphs else ""
-        
-        # 如果最后一段比较短，可能是答案总结
-        if last_paragraph and len(last_paragraph) < 100:
-            # 尝试查找数字或结论性质的表述
-            conclusion_matches = re.search(r'(?:因此|所以|综上|总之)[\s\S]{0,20}([\d\.]+|[\u4e00-\u9fa5]{2,10})(?:\.|。|$)', last_paragraph)
-            if conclusion_matches:
-                return conclusion_matches.group(1).strip()
-                
-            # 如果是非常短的段落（可能就是答案本身）
-            if len(last_paragraph) < 30 and not re.search(r'(?:问题|题目|解|思路|分析)', last_paragraph):
-                return last_paragraph
-        
-        # 6. 从最后一行尝试提取答案
-        lines = text.strip().split('\n')
-        last_line = lines[-1].strip() if lines else ""
-        
-        # 如果最后一行有明确的"所以"、"因此"等结论性词语
-        conclusion_matches = re.search(r'(?:所以|因此|综上|总之)[\s\S]*?([\d\.]+|[\u4e00-\u9fa5]{2,10})(?:\.|。|$)', last_line)
-        if conclusion_matches:
-            return conclusion_matches.group(1).strip()
-        
-        # 如果最后一行是数字，可能是答案
-        last_line_numbers = re.findall(r'[-+]?[\d\.]+(?:π|pi)?', last_line)
-        if last_line_numbers:
-            return last_line_numbers[-1]
-            
-        # 7. 如果文本非常短，直接返回整个文本
-        if len(text) < 50 and not re.search(r'(?:问题|题目|请|我们)', text):
-            return text.strip()
-            
-        # 8. 实在找不到，返回最后一行
-        return last_line
+        return self.extractor.extract(text, pattern)
     
     def _normalize_answer(self, answer):
         """
         归一化答案
         
-        对答案进行标准化处理，移除无关字符，统一格式
+        对答案进行标准化处理，移除无关字符，统一格式。结果记忆在所有指标实例共享的LRU表中
         """
-        if not answer:
-            return ""
-            
-        # 移除引号、括号和其他干扰字符
-        answer = re.sub(r'[「」『』\(\)\[\]\{\}"\'""'']', '', answer)
-        
-        # 移除常见的单位和修饰词
-        answer = re.sub(r'(?:单位|个|米|千米|公里|厘米|毫米|平方米|立方米|千克|克|吨|升|毫升|小时|分钟|秒|度|弧度|美元|元|人民币|美金|欧元|英镑|日元)', '', answer)
-        
-        # 替换具有相同含义的中文词语
-        answer = (answer.replace('是', '')
-                       .replace('约', '')
-                       .replace('大约', '')
-                       .replace('大概', '')
-                       .replace('左右', '')
-                       .replace('接近', '')
-                       .replace('等于', '')
-                       .replace('等于', '')
-                       .replace('等于是', ''))
-        
-        # 转换为小写
-        answer = answer.lower()
-        
-        # 替换多个空格为单个空格
-        answer = re.sub(r'\s+', ' ', answer).strip()
-        
-        # 处理特殊数学表示
-        answer = (answer.replace('×', '*')
-                       .replace('÷', '/')
-                       .replace('（', '(')
-                       .replace('）', ')')
-                       .replace('，', ',')
-                       .replace('。', '.'))
-        
-        # 处理分数形式
-        fraction_match = re.search(r'(\d+)/(\d+)', answer)
-        if fraction_match:
-            try:
-                num = int(fraction_match.group(1))
-                denom = int(fraction_match.group(2))
-                decimal = num / denom
-                # 如果能整除，使用整数形式
-                if decimal.is_integer():
-                    answer = str(int(decimal))
-                else:
-                    # 否则保留原始分数形式
-                    pass
-            except:
-                pass
-        
-        # 如果完全是数值形式，尝试统一格式
-        if re.match(r'^[-+]?[\d\.]+$', answer):
-            try:
-                # 尝试转为浮点数再转回字符串，统一格式
-                num = float(answer)
-                if num.is_integer():
-                    # 如果是整数，移除小数点和零
-                    answer = str(int(num))
-                else:
-                    # 浮点数，保留5位小数
-                    answer = str(round(num, 5)).rstrip('0').rstrip('.')
-            except:
-                pass
-        
-        return answer 
\ No newline at end of file
+        return normalize_answer_cached(answer)
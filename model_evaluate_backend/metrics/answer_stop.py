@@ -0,0 +1,122 @@
+"""
+生成过程中的答案检测实现
+"""
+import re
+from model_evaluate_demo.metrics.extraction import DEFAULT_RULES, fold_case
+
+
+# 明确给出最终答案的规则，不包括"answer"、等式和数值等在推理过程中也会出现的宽松规则
+ANSWER_STOP_RULES = (
+    'boxed',
+    'zh_answer_is', 'zh_answer_colon', 'zh_answer_as', 'zh_therefore_answer_as', 'zh_so_answer_is',
+    'zh_therefore_answer_is', 'zh_so_answer_as', 'zh_final_answer', 'zh_final_answer_as', 'zh_final_answer_is',
+    'en_the_answer_is', 'en_final_answer', 'en_therefore_answer', 'en_thus_answer', 'en_hence_answer',
+    'en_so_answer'
+)
+
+# 答案之后的结束标记。单独的'.'可能是小数点，需要后面跟空白才算结束
+DEFAULT_TERMINATORS = ('\n', '。', '. ', '.\n')
+
+BOXED = '\\boxed{'
+DIGIT = re.compile(r'\d')
+
+
+class AnswerStopDetector:
+    """
+    生成过程中的答案检测
+
+    对部分生成的文本运行 AccuracyMetric 的答案提取规则，某条表示最终答案的规则匹配、
+    答案完整（\\boxed{...} 的括号闭合，其他规则的答案后出现结束标记）且通过置信检查时
+    判定已给出最终答案，生成可以提前结束。对匹配的规则而言，后续文本不会再改变它提取的
+    答案；但模型给出答案后推翻答案、或以优先级更高的格式重新给出答案的部分会被截断，
+    因此该检测是推测性的，默认关闭。
+    """
+    def __init__(self, rules=None, terminators=None, pattern=None, max_answer_chars=64,
+                 require_digit=False):
+        """
+        Args:
+            rules: 用于判定的提取规则名称，默认为 ANSWER_STOP_RULES
+            terminators: 答案之后的结束标记，默认为 DEFAULT_TERMINATORS
+            pattern: 自定义答案模式，第一个捕获组为答案，与 AccuracyMetric 的 answer_pattern 相同
+            max_answer_chars: 答案的最大字符数，更长的匹配通常是推理过程而不是答案
+            require_digit: 是否要求答案包含数字，适用于答案均为数值的数据集
+        """
+        names = set(rules if rules is not None else ANSWER_STOP_RULES)
+        self.rules = [rule for rule in DEFAULT_RULES if rule.name in names]
+        self.terminators = tuple(terminators if terminators is not None else DEFAULT_TERMINATORS)
+        self.pattern = re.compile(pattern) if pattern else None
+        self.max_answer_chars = max_answer_chars
+        self.require_digit = require_digit
+        # 新生成的文本中出现这些字符时才需要重新检测
+        self.triggers = tuple({terminator[0] for terminator in self.terminators} | {'}'})
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        由生成参数中的 stop_on_answer 创建检测器
+
+        Args:
+            config: True使用默认配置，字典为构造参数，其他假值返回None
+        """
+        if not config:
+            return None
+        if config is True:
+            return cls()
+        return cls(**config)
+
+    def triggered(self, tail):
+        """新生成的文本片段是否可能使答案完整，为False时不需要重新检测"""
+        return any(trigger in tail for trigger in self.triggers)
+
+    def detect(self, text):
+        """
+        判断文本中是否已经给出完整的最终答案
+
+        Args:
+            text: 到目前为止生成的文本
+
+        Returns:
+            bool: 是否可以结束生成
+        """
+        if self.pattern is not None:
+            match = self.pattern.search(text)
+            if match and match.groups() and self._confident(text, match.group(1), match.end(1)):
+                return True
+
+        folded = fold_case(text)
+        for rule in self.rules:
+            if rule.name == 'boxed':
+                if self._boxed(text):
+                    return True
+                continue
+            match = rule.search(text, folded)
+            if match and self._confident(text, match.group(1), match.end(1)):
+                return True
+        return False
+
+    def _confident(self, text, answer, end):
+        """答案之后已出现结束标记，且答案本身通过置信检查"""
+        if not text.startswith(self.terminators, end):
+            return False
+        return self._plausible(answer.strip())
+
+    def _plausible(self, answer):
+        if not answer or len(answer) > self.max_answer_chars:
+            return False
+        return not self.require_digit or bool(DIGIT.search(answer))
+
+    def _boxed(self, text):
+        """第一个 \\boxed{...} 的括号已经闭合且内容通过置信检查"""
+        start = text.find(BOXED)
+        if start == -1:
+            return False
+        depth = 1
+        for pos in range(start + len(BOXED), len(text)):
+            char = text[pos]
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return self._plausible(text[start + len(BOXED):pos].strip())
+        return False
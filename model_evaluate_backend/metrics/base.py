@@ -1,36 +1,224 @@
 """
 评估指标基类
 """
+import os
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from model_evaluate_demo.metrics.details import DetailsTable
+
+
+def _update_chunk(metric, predictions, references, kwargs):
+    """在子进程中累加一个分块，返回分块状态、逐样本详情以及子进程中指标副本的运行状态"""
+    state = metric.init_state()
+    details = metric.update(state, predictions, references, **kwargs)
+    if isinstance(details, DetailsTable):
+        # 预测文本和参考答案由主进程重新引用，不再传回
+        details = details.detach()
+    return state, details, metric.worker_state()
 
 
 class BaseMetric(ABC):
     """
     评估指标基类
+
+    除一次性计算的 compute 外，指标还提供累加接口：init_state 创建状态，update 将一批
+    预测累加到状态中，merge 合并多个状态（来自不同批次、进程或分片），finalize 由状态
+    得到最终结果。状态是只包含计数的可JSON序列化字典，不保留预测内容。基类基于 compute
+    提供通用实现，指标可以重写为逐样本累加的实现。
+
+    通过调用指标实例计算时，样本数达到 min_parallel_samples 且 num_workers 大于1，
+    预测和参考答案被切分为连续的分块，交给进程池分别累加，再按分块顺序合并状态和详情，
+    结果与单进程计算一致。
     """
-    def __init__(self, name):
+    def __init__(self, name, **kwargs):
+        """
+        Args:
+            name: 指标名称
+            **kwargs:
+                - num_workers: 并行计算的进程数，0或1表示不并行，-1表示使用全部CPU
+                - chunk_size: 每个分块的样本数，默认按进程数均分为每进程4块
+                - min_parallel_samples: 样本数少于该值时不并行，默认10000
+        """
         self.name = name
-        
+        self.num_workers = kwargs.get('num_workers', 0)
+        self.chunk_size = kwargs.get('chunk_size', None)
+        self.min_parallel_samples = kwargs.get('min_parallel_samples', 10000)
+
     @abstractmethod
     def compute(self, predictions, references, **kwargs):
         """
         计算指标
-        
+
         Args:
             predictions: 模型预测结果列表
             references: 参考答案列表
             **kwargs: 其他参数
-            
+
         Returns:
             dict: 包含指标结果的字典
         """
         pass
-    
+
     def __call__(self, predictions, references, **kwargs):
         """
-        调用计算函数
+        调用计算函数，样本数较多且设置了 num_workers 时使用进程池分块计算
+
+        Args:
+            predictions: 模型预测结果列表
+            references: 参考答案列表
+            **kwargs: 传给 compute 的参数；num_workers 可覆盖初始化时的设置
+        """
+        num_workers = kwargs.pop('num_workers', self.num_workers)
+        if num_workers == -1:
+            num_workers = os.cpu_count() or 1
+        if not num_workers or num_workers <= 1 or len(predictions) < self.min_parallel_samples:
+            return self.compute(predictions, references, **kwargs)
+        return self.parallel_compute(predictions, references, num_workers, **kwargs)
+
+    def init_state(self):
+        """
+        创建空的累加状态
+
+        Returns:
+            dict: 累加状态
+        """
+        return {'correct': 0, 'total': 0, 'score_sum': 0.0, 'has_correct': True}
+
+    def update(self, state, predictions, references, **kwargs):
         """
-        return self.compute(predictions, references, **kwargs)
-    
+        将一批预测累加到状态中
+
+        通用实现对该批调用 compute 并累加 correct、total 和按样本数加权的 score。
+
+        Args:
+            state: init_state 创建的状态，原地更新
+            predictions: 该批的模型预测结果
+            references: 该批的参考答案
+            **kwargs: 传给指标计算的参数
+
+        Returns:
+            list: 该批的逐样本详情，index 为批内索引
+        """
+        result = self.compute(predictions, references, **kwargs)
+        n = len(predictions)
+        state['total'] += n
+        state['score_sum'] += result.get('score', 0) * n
+        if 'correct' in result:
+            state['correct'] += result['correct']
+        else:
+            state['has_correct'] = False
+        return result.get('details', [])
+
+    def merge(self, states):
+        """
+        合并多个累加状态
+
+        Args:
+            states: 状态列表，也可以是 finalize 返回的结果
+
+        Returns:
+            dict: 合并后的新状态
+        """
+        merged = self.init_state()
+        for state in states:
+            total = state.get('total', 0)
+            merged['total'] += total
+            merged['score_sum'] += state.get('score_sum', state.get('score', 0) * total)
+            if 'correct' in state and state.get('has_correct', True):
+                merged['correct'] += state['correct']
+            else:
+                merged['has_correct'] = False
+        return merged
+
+    def finalize(self, state):
+        """
+        由累加状态得到指标结果
+
+        Returns:
+            dict: 包含 score 和 total 的结果，状态中有 correct 时一并给出
+        """
+        total = state['total']
+        if state['has_correct']:
+            return {
+                'score': state['correct'] / total if total else 0,
+                'correct': state['correct'],
+                'total': total
+            }
+        return {'score': state['score_sum'] / total if total else 0, 'total': total}
+
+    def parallel_compute(self, predictions, references, num_workers, **kwargs):
+        """
+        使用进程池分块计算指标
+
+        Args:
+            predictions: 模型预测结果列表
+            references: 参考答案列表
+            num_workers: 进程数
+            **kwargs: 传给 update 的参数
+
+        Returns:
+            dict: 与 compute 结构相同的指标结果
+        """
+        if len(predictions) != len(references):
+            raise ValueError(f"预测数量 ({len(predictions)}) 与参考答案数量 ({len(references)}) 不匹配")
+
+        total = len(predictions)
+        chunk_size = self.chunk_size or max(1, -(-total // (num_workers * 4)))
+        offsets = list(range(0, total, chunk_size))
+
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(_update_chunk, self, list(predictions[start:start + chunk_size]),
+                                list(references[start:start + chunk_size]), kwargs)
+                for start in offsets
+            ]
+            # 按分块顺序收集结果，合并结果与完成顺序无关
+            states = []
+            chunk_details = []
+            for future in futures:
+                state, details, worker_state = future.result()
+                self.merge_worker_state(worker_state)
+                states.append(state)
+                chunk_details.append(details)
+
+        result = self.finalize(self.merge(states))
+        result['details'] = self._concat_details(chunk_details, offsets, predictions, references)
+        return result
+
+    def _concat_details(self, chunk_details, offsets, predictions, references):
+        """按分块顺序拼接逐样本详情，并将 index 平移为全局样本索引"""
+        if chunk_details and all(isinstance(details, DetailsTable) for details in chunk_details):
+            return DetailsTable.concat(chunk_details, offsets,
+                                       sources={'prediction': predictions, 'reference': references})
+        merged = []
+        for details, offset in zip(chunk_details, offsets):
+            for detail in details:
+                if 'index' in detail:
+                    detail = dict(detail, index=detail['index'] + offset)
+                merged.append(detail)
+        return merged
+
+    def prepare_references(self, dataset):
+        """
+        在评测前对数据集的参考答案做预处理（例如预先归一化），默认不做处理
+
+        Args:
+            dataset: 已加载的数据集
+        """
+        pass
+
+    def worker_state(self):
+        """返回需要带回主进程的运行状态（例如统计计数），默认没有"""
+        return None
+
+    def merge_worker_state(self, state):
+        """
+        合并子进程中指标副本的运行状态，默认不做处理
+
+        Args:
+            state: 子进程中 worker_state 的返回值
+        """
+        pass
+
     def __repr__(self):
-        return f"{self.__class__.__name__}(name={self.name})" 
\ No newline at end of file
+        return f"{self.__class__.__name__}(name={self.name})"
@@ -0,0 +1,105 @@
+"""
+列式逐样本详情实现
+"""
+from collections.abc import Sequence
+
+
+class DetailsTable(Sequence):
+    """
+    列式逐样本详情
+
+    每个字段保存为一列，取代逐样本的字典列表。预测文本、参考答案等已在评测结果
+    samples 中保存的字段作为引用列，只按样本索引引用原始序列，不复制、不序列化。
+    按索引访问或迭代时才将一行组装为字典，字段顺序与列顺序一致。
+    """
+    def __init__(self, columns, referenced=(), fields=None):
+        """
+        Args:
+            columns: 有序的 字段名 -> 列 字典，各列长度相同
+            referenced: 引用列的字段名，序列化时省略
+            fields: 字段顺序，默认为列的顺序；可以包含尚未附加原始序列的引用列
+        """
+        self.columns = columns
+        self.referenced = tuple(referenced)
+        self.fields = list(fields if fields is not None else columns)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return {name: self.columns[name][idx] for name in self.fields if name in self.columns}
+
+    def column(self, name):
+        """返回某个字段的整列"""
+        return self.columns[name]
+
+    def detach(self):
+        """返回去掉引用列的副本，用于跨进程传递时不再传回原始文本"""
+        return DetailsTable({name: column for name, column in self.columns.items()
+                             if name not in self.referenced},
+                            referenced=self.referenced, fields=self.fields)
+
+    @classmethod
+    def concat(cls, tables, offsets, sources=None):
+        """
+        按分块顺序拼接多个详情表
+
+        Args:
+            tables: 详情表列表
+            offsets: 每个分块第一个样本的全局索引，用于平移 index 列
+            sources: 引用列的完整原始序列，字段名 -> 序列
+
+        Returns:
+            DetailsTable: 拼接后的详情表
+        """
+        sources = sources or {}
+        fields = tables[0].fields if tables else list(sources)
+        columns = {}
+        for name in fields:
+            if name in sources:
+                columns[name] = sources[name]
+            elif not all(name in table.columns for table in tables):
+                continue
+            elif name == 'index':
+                columns[name] = [i + offset for table, offset in zip(tables, offsets) for i in table.columns[name]]
+            else:
+                columns[name] = [value for table in tables for value in table.columns[name]]
+        return cls(columns, referenced=tuple(name for name in fields if name in sources), fields=fields)
+
+    def to_json(self):
+        """
+        紧凑的JSON表示
+
+        Returns:
+            dict: count 为样本数，columns 为除引用列外的各列，referenced 为省略的引用列名
+        """
+        return {
+            'count': len(self),
+            'columns': {name: list(self.columns[name]) for name in self.fields
+                        if name in self.columns and name not in self.referenced},
+            'referenced': list(self.referenced)
+        }
+
+    @classmethod
+    def from_json(cls, data, sources=None):
+        """
+        从 to_json 的结果恢复详情表
+
+        Args:
+            data: to_json 的结果
+            sources: 引用列的原始序列，字段名 -> 序列，例如从结果 samples 中取出的预测文本
+        """
+        columns = dict(data['columns'])
+        columns.update(sources or {})
+        return cls(columns, referenced=data.get('referenced', ()))
+
+
+def json_default(obj):
+    """json.dump 的 default 参数，序列化详情表等带 to_json 方法的对象"""
+    if hasattr(obj, 'to_json'):
+        return obj.to_json()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
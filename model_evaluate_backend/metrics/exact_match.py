@@ -4,6 +4,38 @@
 import re
 from model_evaluate_demo.utils.registry import METRICS
 from model_evaluate_demo.metrics.base import BaseMetric
+from model_evaluate_demo.metrics.details import DetailsTable
+from model_evaluate_demo.metrics.memo import shared_memo
+
+
+WHITESPACE = re.compile(r'\s+')
+PUNCTUATION = ('.', ',', ';', ':', '?', '!')
+# 预先归一化的参考答案缓存名称，修改 normalize_text 的规则时需要更新版本
+NORMALIZE_TEXT_VERSION = 'normalize_text_v1'
+
+
+def normalize_text(text):
+    """
+    对文本进行归一化处理
+    """
+    if not text:
+        return ""
+    
+    # 替换多个空格为单个空格
+    text = WHITESPACE.sub(' ', text)
+    
+    # 删除前后空格
+    text = text.strip()
+    
+    # 删除标点符号
+    for char in PUNCTUATION:
+        text = text.replace(char, '')
+        
+    return text
+
+
+# 归一化结果按原文本记忆，在所有指标实例间共享
+NORMALIZE_TEXT_MEMO = shared_memo('normalize_text', normalize_text, maxsize=16384)
 
 
 @METRICS.register('exact_match')
@@ -13,8 +45,8 @@ class ExactMatchMetric(BaseMetric):
     
     检查预测结果是否与参考结果完全匹配。
     """
-    def __init__(self):
-        super().__init__('exact_match')
+    def __init__(self, **kwargs):
+        super().__init__('exact_match', **kwargs)
         
     def compute(self, predictions, references, **kwargs):
         """
@@ -30,6 +62,28 @@ class ExactMatchMetric(BaseMetric):
         Returns:
             dict: 包含精确匹配分数和详细信息的字典
         """
+        state = self.init_state()
+        details = self.update(state, predictions, references, **kwargs)
+        result = self.finalize(state)
+        result['details'] = details
+        return result
+    
+    def init_state(self):
+        return {'correct': 0, 'total': 0}
+    
+    def update(self, state, predictions, references, **kwargs):
+        """
+        将一批预测的匹配结果累加到状态中
+        
+        Args:
+            state: init_state 创建的状态，原地更新
+            predictions: 该批的模型生成文本
+            references: 该批的参考答案
+            **kwargs: 同 compute
+            
+        Returns:
+            DetailsTable: 该批的逐样本详情，index 为批内索引
+        """
         if len(predictions) != len(references):
             raise ValueError(f"预测数量 ({len(predictions)}) 与参考答案数量 ({len(references)}) 不匹配")
         
@@ -54,47 +108,43 @@ class ExactMatchMetric(BaseMetric):
             processed_references.append(ref)
         
         # 计算匹配
-        correct = 0
-        details = []
+        matches = [pred == ref for pred, ref in zip(processed_predictions, processed_references)]
         
-        for i, (pred, ref) in enumerate(zip(processed_predictions, processed_references)):
-            is_match = pred == ref
-            if is_match:
-                correct += 1
-                
-            details.append({
-                'index': i,
-                'prediction': predictions[i],
-                'processed_prediction': processed_predictions[i],
-                'reference': references[i],
-                'processed_reference': processed_references[i],
-                'match': is_match
-            })
-        
-        exact_match_score = correct / len(predictions) if predictions else 0
+        state['correct'] += sum(matches)
+        state['total'] += len(predictions)
         
+        # 列式详情，预测文本和参考答案只引用传入的序列
+        return DetailsTable({
+            'index': range(len(predictions)),
+            'prediction': predictions,
+            'processed_prediction': processed_predictions,
+            'reference': references,
+            'processed_reference': processed_references,
+            'match': matches
+        }, referenced=('prediction', 'reference'))
+    
+    def prepare_references(self, dataset):
+        """将数据集全部参考答案的归一化结果固定在共享记忆表中，结果随数据集缓存保存"""
+        if hasattr(dataset, 'precompute_answers'):
+            NORMALIZE_TEXT_MEMO.pin(dataset.precompute_answers(NORMALIZE_TEXT_VERSION, normalize_text))
+    
+    def merge(self, states):
+        """合并多个状态，也可以传入 finalize 返回的结果"""
         return {
-            'score': exact_match_score,
-            'correct': correct,
-            'total': len(predictions),
-            'details': details
+            'correct': sum(state['correct'] for state in states),
+            'total': sum(state['total'] for state in states)
+        }
+    
+    def finalize(self, state):
+        total = state['total']
+        return {
+            'score': state['correct'] / total if total else 0,
+            'correct': state['correct'],
+            'total': total
         }
     
     def _normalize_text(self, text):
         """
-        对文本进行归一化处理
+        对文本进行归一化处理，结果记忆在所有指标实例共享的LRU表中
         """
-        if not text:
-            return ""
-        
-        # 替换多个空格为单个空格
-        text = re.sub(r'\s+', ' ', text)
-        
-        # 删除前后空格
-        text = text.strip()
-        
-        # 删除标点符号
-        for char in ['.', ',', ';', ':', '?', '!']:
-            text = text.replace(char, '')
-            
-        return text 
\ No newline at end of file
+        return NORMALIZE_TEXT_MEMO(text) if text else ""
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""
+答案提取与归一化实现
+"""
+import re
+import hashlib
+from collections import Counter
+from model_evaluate_demo.metrics.memo import shared_memo
+
+
+def fold_case(text):
+    """
+    小写化文本用于关键词预筛选
+
+    正则忽略大小写时 's' 还能匹配 'ſ'，小写化后一并替换，保证预筛选不会漏掉能匹配的文本。
+    """
+    return text.lower().replace('ſ', 's')
+
+
+class ExtractionRule:
+    """
+    答案提取规则
+
+    正则表达式在创建规则时编译。keywords 是规则匹配时文本中必然出现的字面量，
+    文本中一个都不包含时直接跳过该规则，不运行正则。忽略大小写的规则在小写化的文本中
+    检查关键词。
+    """
+    def __init__(self, name, pattern, flags=0, keywords=(), last=False):
+        """
+        Args:
+            name: 规则名称，用于命中计数
+            pattern: 正则表达式，第一个捕获组为答案
+            flags: 正则标志
+            keywords: 预筛选字面量，为空表示不预筛选
+            last: 为True时取最后一个匹配，否则取第一个匹配
+        """
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.keywords = tuple(keyword.lower() if flags & re.IGNORECASE else keyword for keyword in keywords)
+        self.folded = bool(flags & re.IGNORECASE)
+        self.last = last
+
+    def extract(self, text, folded=None):
+        """
+        返回提取的答案，不匹配时返回None
+
+        Args:
+            text: 生成文本
+            folded: fold_case(text) 的结果，由调用方计算一次后在各规则间共享
+        """
+        if not self._candidate(text, folded):
+            return None
+        if self.last:
+            matches = self.regex.findall(text)
+            return matches[-1].strip() if matches else None
+        match = self.regex.search(text)
+        return match.group(1).strip() if match else None
+
+    def search(self, text, folded=None):
+        """返回第一个匹配对象，不匹配时返回None，参数同 extract"""
+        if not self._candidate(text, folded):
+            return None
+        return self.regex.search(text)
+
+    def _candidate(self, text, folded=None):
+        """关键词预筛选，文本中一个关键词都不包含时返回False"""
+        if not self.keywords:
+            return True
+        haystack = text
+        if self.folded:
+            haystack = folded if folded is not None else fold_case(text)
+        return any(keyword in haystack for keyword in self.keywords)
+
+
+def _direct_rule(name, pattern, keyword):
+    return ExtractionRule(name, pattern, re.IGNORECASE, keywords=(keyword,) if keyword else ())
+
+
+# 按优先级排列的规则，前面的规则匹配成功时不再尝试后面的规则
+DEFAULT_RULES = [
+    ExtractionRule('boxed', r'\\boxed\{(.*?)\}', keywords=('\\boxed{',)),
+
+    # 1. 直接的答案标识词（中文模式）
+    _direct_rule('zh_answer_is', r'答案是[:：]?\s*(.+?)(?:\.|。|$|\n)', '答案是'),
+    _direct_rule('zh_answer_colon', r'答案[:：]\s*(.+?)(?:\.|。|$|\n)', '答案'),
+    _direct_rule('zh_answer_as', r'答案为[:：]?\s*(.+?)(?:\.|。|$|\n)', '答案为'),
+    _direct_rule('zh_therefore_answer_as', r'因此答案为:?\s*(.+?)(?:\.|。|$|\n)', '因此答案为'),
+    _direct_rule('zh_so_answer_is', r'所以答案是:?\s*(.+?)(?:\.|。|$|\n)', '所以答案是'),
+    _direct_rule('zh_therefore_answer_is', r'因此答案是:?\s*(.+?)(?:\.|。|$|\n)', '因此答案是'),
+    _direct_rule('zh_so_answer_as', r'所以答案为:?\s*(.+?)(?:\.|。|$|\n)', '所以答案为'),
+    _direct_rule('zh_final_answer', r'最终答案:?\s*(.+?)(?:\.|。|$|\n)', '最终答案'),
+    _direct_rule('zh_final_answer_as', r'最终答案为:?\s*(.+?)(?:\.|。|$|\n)', '最终答案为'),
+    _direct_rule('zh_final_answer_is', r'最终答案是:?\s*(.+?)(?:\.|。|$|\n)', '最终答案是'),
+    _direct_rule('zh_computed_answer', r'计算得[\s\S]*答案[是为]?\s*[:：]?\s*(.+?)(?:\.|。|$|\n)', '计算得'),
+
+    # 1. 直接的答案标识词（英文模式）
+    _direct_rule('en_the_answer_is', r'the answer is:?\s*(.+?)(?:\.|$|\n)', 'the answer is'),
+    _direct_rule('en_answer', r'answer:?\s*(.+?)(?:\.|$|\n)', 'answer'),
+    _direct_rule('en_final_answer', r'the final answer is:?\s*(.+?)(?:\.|$|\n)', 'the final answer is'),
+    _direct_rule('en_therefore_answer', r'therefore,? the answer is:?\s*(.+?)(?:\.|$|\n)', 'the answer is'),
+    _direct_rule('en_thus_answer', r'thus,? the answer is:?\s*(.+?)(?:\.|$|\n)', 'the answer is'),
+    _direct_rule('en_hence_answer', r'hence,? the answer is:?\s*(.+?)(?:\.|$|\n)', 'the answer is'),
+    _direct_rule('en_so_answer', r'so,? the answer is:?\s*(.+?)(?:\.|$|\n)', 'the answer is'),
+
+    # 2. Python代码输出
+    ExtractionRule('code_output', r'```(?:python|)\s*[\s\S]*?```\s*输出[:：]?\s*(.+?)(?:\n|$)', keywords=('输出',)),
+    ExtractionRule('code_output_block', r'```output\s*\n([\d\.\+\-]+)', keywords=('```output',)),
+    ExtractionRule('code_result', r'执行结果[:：]?\s*(.+?)(?:\n|$)', keywords=('执行结果',)),
+
+    # 3. 等式结果，取最后一个
+    ExtractionRule('equals', r'=\s*([\d\.\+\-πpi\/\*]+)(?:\s|$|\.|。|,|，)', keywords=('=',), last=True),
+
+    # 4. 数值答案
+    ExtractionRule('zh_obtained_number', r'得[到得][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)', keywords=('得到', '得得')),
+    ExtractionRule('zh_computed_number', r'计算得[到得][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)', keywords=('计算得',)),
+    ExtractionRule('zh_result_number', r'结果[为是][\s\S]{0,10}([\d\.]+)(?:\s|$|\.|。)', keywords=('结果为', '结果是')),
+    ExtractionRule('zh_equals_number', r'(?:等于|=)[\s\S]{0,5}([\d\.]+)(?:\s|$|\.|。)', keywords=('等于', '=')),
+]
+
+# 5-8. 从最后一段或最后一行提取
+PARAGRAPH_CONCLUSION = re.compile(r'(?:因此|所以|综上|总之)[\s\S]{0,20}([\d\.]+|[\u4e00-\u9fa5]{2,10})(?:\.|。|$)')
+PARAGRAPH_EXCLUDE = re.compile(r'(?:问题|题目|解|思路|分析)')
+LINE_CONCLUSION = re.compile(r'(?:所以|因此|综上|总之)[\s\S]*?([\d\.]+|[\u4e00-\u9fa5]{2,10})(?:\.|。|$)')
+LINE_NUMBERS = re.compile(r'[-+]?[\d\.]+(?:π|pi)?')
+SHORT_TEXT_EXCLUDE = re.compile(r'(?:问题|题目|请|我们)')
+CONCLUSION_WORDS = ('因此', '所以', '综上', '总之')
+
+FALLBACK_RULES = ('paragraph_conclusion', 'short_paragraph', 'line_conclusion',
+                  'line_number', 'short_text', 'last_line')
+
+
+class AnswerExtractor:
+    """
+    答案提取引擎
+
+    所有规则在创建时编译，按优先级依次尝试，第一个匹配的规则给出答案。每条规则先用
+    字面量预筛选，文本中不可能匹配的规则不运行正则。hits 记录每条规则的命中次数。
+    使用默认规则时，提取结果按文本摘要记忆在所有实例共享的LRU表中，重复的生成文本
+    只提取一次，命中时仍按原规则计数。
+    """
+    def __init__(self, rules=None, memoize=True):
+        """
+        Args:
+            rules: 提取规则列表，默认为 DEFAULT_RULES
+            memoize: 是否使用共享记忆表，自定义规则时不使用
+        """
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+        self.memoize = memoize and rules is None
+        self.hits = Counter()
+
+    def extract(self, text, pattern=None):
+        """
+        从文本中提取答案
+
+        Args:
+            text: 生成文本
+            pattern: 自定义答案模式，优先于内置规则，第一个捕获组为答案
+
+        Returns:
+            str: 提取的答案
+        """
+        if not text:
+            self.hits['empty'] += 1
+            return ""
+
+        if self.memoize:
+            key = (hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest(), pattern)
+            rule_name, answer = EXTRACTION_MEMO(key, text, pattern)
+        else:
+            rule_name, answer = self.match(text, pattern)
+        self.hits[rule_name] += 1
+        return answer
+
+    def match(self, text, pattern=None):
+        """
+        按规则提取答案，不记录命中次数
+
+        Returns:
+            tuple: (规则名称, 答案)
+        """
+        if pattern:
+            matches = re.search(pattern, text)
+            if matches and matches.groups():
+                return 'custom', matches.group(1).strip()
+
+        folded = fold_case(text)
+        for rule in self.rules:
+            answer = rule.extract(text, folded)
+            if answer is not None:
+                return rule.name, answer
+
+        return self._extract_fallback(text)
+
+    def __getstate__(self):
+        # 复制到其他进程的副本从零开始计数，由调用方合并回主进程
+        state = self.__dict__.copy()
+        state['hits'] = Counter()
+        return state
+
+    def _extract_fallback(self, text):
+        """没有规则匹配时，从最后一段或最后一行提取答案"""
+        paragraphs = text.split('\n\n')
+        last_paragraph = paragraphs[-1].strip() if paragraphs else ""
+
+        # 如果最后一段比较短，可能是答案总结
+        if last_paragraph and len(last_paragraph) < 100:
+            if any(word in last_paragraph for word in CONCLUSION_WORDS):
+                matches = PARAGRAPH_CONCLUSION.search(last_paragraph)
+                if matches:
+                    return 'paragraph_conclusion', matches.group(1).strip()
+
+            # 如果是非常短的段落（可能就是答案本身）
+            if len(last_paragraph) < 30 and not PARAGRAPH_EXCLUDE.search(last_paragraph):
+                return 'short_paragraph', last_paragraph
+
+        lines = text.strip().split('\n')
+        last_line = lines[-1].strip() if lines else ""
+
+        # 如果最后一行有明确的"所以"、"因此"等结论性词语
+        if any(word in last_line for word in CONCLUSION_WORDS):
+            matches = LINE_CONCLUSION.search(last_line)
+            if matches:
+                return 'line_conclusion', matches.group(1).strip()
+
+        # 如果最后一行是数字，可能是答案
+        last_line_numbers = LINE_NUMBERS.findall(last_line)
+        if last_line_numbers:
+            return 'line_number', last_line_numbers[-1]
+
+        # 如果文本非常短，直接返回整个文本
+        if len(text) < 50 and not SHORT_TEXT_EXCLUDE.search(text):
+            return 'short_text', text.strip()
+
+        # 实在找不到，返回最后一行
+        return 'last_line', last_line
+
+    def stats(self):
+        """
+        返回各规则的命中次数
+
+        Returns:
+            dict: 规则名称 -> 命中次数，按规则优先级排列
+        """
+        names = ['empty', 'custom'] + [rule.name for rule in self.rules] + list(FALLBACK_RULES)
+        return {name: self.hits[name] for name in names if self.hits[name]}
+
+    def reset(self):
+        """清空命中计数"""
+        self.hits.clear()
+
+
+# 默认规则的提取结果按 (文本摘要, 自定义模式) 记忆，生成文本较长，因此不以原文作为键
+_DEFAULT_EXTRACTOR = AnswerExtractor(memoize=False)
+EXTRACTION_MEMO = shared_memo('extract_answer', _DEFAULT_EXTRACTOR.match, maxsize=16384)
+
+
+# 归一化使用的预编译模式
+QUOTES_AND_BRACKETS = re.compile(r'[「」『』\(\)\[\]\{\}"\'""'']')
+UNITS = re.compile(r'(?:单位|个|米|千米|公里|厘米|毫米|平方米|立方米|千克|克|吨|升|毫升|小时|分钟|秒|度|弧度|美元|元|人民币|美金|欧元|英镑|日元)')
+WHITESPACE = re.compile(r'\s+')
+FRACTION = re.compile(r'(\d+)/(\d+)')
+NUMERIC = re.compile(r'^[-+]?[\d\.]+$')
+FILLER_WORDS = ('是', '约', '大约', '大概', '左右', '接近', '等于', '等于', '等于是')
+SYMBOLS = (('×', '*'), ('÷', '/'), ('（', '('), ('）', ')'), ('，', ','), ('。', '.'))
+
+
+def normalize_answer(answer):
+    """
+    归一化答案
+
+    对答案进行标准化处理，移除无关字符，统一格式
+    """
+    if not answer:
+        return ""
+
+    # 移除引号、括号和其他干扰字符
+    answer = QUOTES_AND_BRACKETS.sub('', answer)
+
+    # 移除常见的单位和修饰词
+    answer = UNITS.sub('', answer)
+
+    # 替换具有相同含义的中文词语
+    for word in FILLER_WORDS:
+        answer = answer.replace(word, '')
+
+    # 转换为小写，替换多个空格为单个空格
+    answer = WHITESPACE.sub(' ', answer.lower()).strip()
+
+    # 处理特殊数学表示
+    for symbol, replacement in SYMBOLS:
+        answer = answer.replace(symbol, replacement)
+
+    # 处理分数形式，能整除时使用整数形式，否则保留原始分数形式
+    fraction_match = FRACTION.search(answer)
+    if fraction_match:
+        try:
+            decimal = int(fraction_match.group(1)) / int(fraction_match.group(2))
+            if decimal.is_integer():
+                answer = str(int(decimal))
+        except (ValueError, ZeroDivisionError, OverflowError):
+            pass
+
+    # 如果完全是数值形式，尝试统一格式
+    if NUMERIC.match(answer):
+        try:
+            num = float(answer)
+            if num.is_integer():
+                # 如果是整数，移除小数点和零
+                answer = str(int(num))
+            else:
+                # 浮点数，保留5位小数
+                answer = str(round(num, 5)).rstrip('0').rstrip('.')
+        except (ValueError, OverflowError):
+            pass
+
+    return answer
+
+
+# 归一化结果按原答案记忆，参考答案在所有模型和运行间相同，预测中也有大量重复的短答案
+NORMALIZE_MEMO = shared_memo('normalize_answer', normalize_answer)
+# 预先归一化的参考答案缓存名称，修改 normalize_answer 的规则时需要更新版本
+NORMALIZE_VERSION = 'normalize_answer_v1'
+
+
+def normalize_answer_cached(answer):
+    """使用共享记忆表的 normalize_answer"""
+    return NORMALIZE_MEMO(answer) if answer else ""
@@ -0,0 +1,132 @@
+"""
+答案归一化与提取的记忆化实现
+"""
+import threading
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+# 已创建的共享记忆表，名称 -> LRUMemo
+_MEMOS = {}
+
+
+class LRUMemo:
+    """
+    有界的LRU记忆表
+
+    缓存单参数函数的结果，超过 maxsize 时淘汰最久未使用的条目。另有不参与淘汰的
+    固定条目（pin），用于数据集加载时预先计算好的参考答案。同一个表可以被多个指标
+    实例共享，读写加锁，可以在线程间共享。进程池中的子进程各自持有一份副本，
+    子进程中的命中不计入主进程的统计。
+    """
+    def __init__(self, func, maxsize=65536, name=None):
+        """
+        Args:
+            func: 被记忆化的函数，参数为键
+            maxsize: 最多缓存的条目数（不含固定条目）
+            name: 记忆表名称，用于统计
+        """
+        self.func = func
+        self.maxsize = maxsize
+        self.name = name
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pinned_hits = 0
+
+    def __call__(self, key, *args):
+        """
+        返回 func 对键的结果，未缓存时计算并缓存
+
+        Args:
+            key: 缓存键
+            *args: 非空时以 args 而不是键调用 func，用于以文本摘要作为键的情形
+        """
+        with self._lock:
+            value = self._pinned.get(key, _MISSING)
+            if value is not _MISSING:
+                self.pinned_hits += 1
+                return value
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        # 计算时不持有锁，并发计算同一个键的结果相同，重复写入无害
+        value = self.func(*args) if args else self.func(key)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def pin(self, mapping):
+        """
+        添加不参与淘汰的固定条目
+
+        Args:
+            mapping: 键 -> 已计算的结果，必须与 func(键) 一致
+        """
+        with self._lock:
+            self._pinned.update(mapping)
+
+    def stats(self):
+        """
+        返回命中统计
+
+        Returns:
+            dict: hits 为LRU条目命中次数，pinned_hits 为固定条目命中次数，
+                  hit_rate 为两者之和占全部查询的比例
+        """
+        with self._lock:
+            lookups = self.hits + self.pinned_hits + self.misses
+            return {
+                'hits': self.hits,
+                'pinned_hits': self.pinned_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.pinned_hits) / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'pinned': len(self._pinned),
+                'maxsize': self.maxsize
+            }
+
+    def clear(self):
+        """清空全部条目和统计"""
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+            self.hits = self.misses = self.pinned_hits = 0
+
+
+def shared_memo(name, func, maxsize=65536):
+    """
+    获取指定名称的共享记忆表，不存在时创建
+
+    同名的记忆表在所有指标实例间共享，func 只在创建时使用。
+    """
+    memo = _MEMOS.get(name)
+    if memo is None:
+        memo = _MEMOS.setdefault(name, LRUMemo(func, maxsize=maxsize, name=name))
+    return memo
+
+
+def memo_stats():
+    """
+    返回所有共享记忆表的命中统计
+
+    Returns:
+        dict: 记忆表名称 -> 统计
+    """
+    return {name: memo.stats() for name, memo in _MEMOS.items()}
+
+
+def clear_memos():
+    """清空所有共享记忆表"""
+    for memo in _MEMOS.values():
+        memo.clear()
@@ -0,0 +1,64 @@
+"""
+批量数值答案比较实现
+"""
+import numpy as np
+
+
+ABS_TOLERANCE = 1e-5
+REL_TOLERANCE = 0.001  # 允许0.1%的相对误差，只用于绝对值大于1的数
+
+
+def parse_number(value):
+    """
+    将归一化后的答案解析为浮点数
+
+    π 和 pi 替换为 3.14159，无法解析时返回NaN。
+    """
+    try:
+        return float(value.replace('π', 'pi').replace('pi', '3.14159'))
+    except (ValueError, TypeError, AttributeError):
+        return float('nan')
+
+
+def parse_numbers(values):
+    """
+    批量解析答案
+
+    同一批中重复的答案只解析一次。
+
+    Returns:
+        numpy.ndarray: float64数组，非数值答案为NaN
+    """
+    parsed = {}
+    numbers = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            number = parsed[value]
+        except KeyError:
+            number = parsed[value] = parse_number(value)
+        except TypeError:
+            # 不可哈希的值
+            number = parse_number(value)
+        numbers[i] = number
+    return numbers
+
+
+def numeric_matches(predictions, references):
+    """
+    按容差规则批量比较数值
+
+    绝对误差小于 ABS_TOLERANCE，或两者中较大的绝对值大于1且相对误差小于 REL_TOLERANCE
+    时视为相等。任一侧为NaN的行结果为False。
+
+    Args:
+        predictions: parse_numbers 返回的预测数组
+        references: parse_numbers 返回的参考答案数组
+
+    Returns:
+        numpy.ndarray: 布尔数组
+    """
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+        diff = np.abs(predictions - references)
+        scale = np.maximum(np.abs(predictions), np.abs(references))
+        relative = np.divide(diff, scale, out=np.full_like(diff, np.inf), where=scale > 1.0)
+        return (diff < ABS_TOLERANCE) | ((scale > 1.0) & (relative < REL_TOLERANCE))
@@ -29,6 +29,11 @@ def main():
     parser.add_argument('--output-dir', type=str, default='outputs', help='输出目录')
     parser.add_argument('--max-samples', type=int, help='最大样本数')
     parser.add_argument('--debug', action='store_true', help='开启调试模式')
+    parser.add_argument('--max-workers', type=int, default=1, help='并行执行任务的工作线程/进程数')
+    parser.add_argument('--executor', type=str, choices=['thread', 'process'], default='thread',
+                        help='并行执行方式，process为常驻模型的多进程模式')
+    parser.add_argument('--model-replicas', type=int, default=1,
+                        help='process模式下每个模型的副本数，大于1时同一模型的任务分散到多个工作进程')
     parser.add_argument('--list-models', action='store_true', help='列出所有已注册的模型')
     parser.add_argument('--list-datasets', action='store_true', help='列出所有已注册的数据集')
     parser.add_argument('--list-metrics', action='store_true', help='列出所有已注册的评估指标')
@@ -64,7 +69,10 @@ def main():
         runner = TaskRunner(
             config_path=args.config,
             output_dir=args.output_dir,
-            debug=args.debug
+            debug=args.debug,
+            max_workers=args.max_workers,
+            executor=args.executor,
+            model_replicas=args.model_replicas
         )
         runner.run_from_config()
         return 0
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+常驻评测服务
+
+以守护进程方式运行，启动时预先导入torch/transformers等重量级依赖，
+通过HTTP接口接收评测任务并放入本地任务队列，由后台工作线程依次执行。
+模型加载后常驻在模型池中，同一模型的后续评测无需重新启动解释器和加载权重。
+
+接口:
+    POST /jobs          提交评测任务，返回任务ID
+    GET  /jobs          列出所有任务
+    GET  /jobs/<id>     查询任务状态、逐批次进度和结果
+    GET  /health        服务健康检查
+
+用法:
+    python model_evaluate_demo/service.py --host 127.0.0.1 --port 8765
+"""
+
+import os
+import sys
+import json
+import uuid
+import queue
+import argparse
+import threading
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入评测流程，同时预热torch等依赖
+from model_evaluate_demo.comprehensive_evaluation import run_comprehensive_evaluation
+from model_evaluate_demo.tasks import ModelPool
+
+
+class EvaluationService:
+    """
+    评测服务
+
+    维护任务表和任务队列，单个工作线程按提交顺序执行任务，避免多个评测争用显存。
+    最多常驻 max_resident_models 个模型，切换到新模型时释放旧模型。
+    """
+    def __init__(self, output_dir="./outputs", max_resident_models=1, max_jobs=1000):
+        """
+        Args:
+            output_dir: 默认评测结果输出目录
+            max_resident_models: 常驻内存的最大模型数
+            max_jobs: 任务表中保留的最大任务数，超出时删除最早完成的任务
+        """
+        self.output_dir = output_dir
+        self.max_resident_models = max_resident_models
+        self.max_jobs = max_jobs
+        self.debug = False
+        self.model_pool = ModelPool()
+        self.jobs = {}
+        self._resident = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        """启动后台工作线程"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="eval-service-worker", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """停止工作线程并释放模型"""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        self.model_pool.release_all()
+        self._resident = []
+
+    def submit(self, params):
+        """
+        提交评测任务
+
+        Args:
+            params: 任务参数，包含 model_path、datasets，可选 max_samples、device、debug、output_dir、
+                model_type、batch_size、early_stop
+
+        Returns:
+            dict: 任务信息
+        """
+        if not params.get('model_path'):
+            raise ValueError("model_path不能为空")
+        datasets = params.get('datasets')
+        if isinstance(datasets, str):
+            datasets = datasets.split()
+
+        now = datetime.now().isoformat()
+        job = {
+            'id': str(uuid.uuid4()),
+            'status': 'pending',
+            'params': {
+                'model_path': params['model_path'],
+                'datasets': datasets,
+                'max_samples': params.get('max_samples'),
+                'device': params.get('device'),
+                'debug': bool(params.get('debug', False)),
+                'output_dir': params.get('output_dir') or self.output_dir,
+                'model_type': params.get('model_type') or 'huggingface',
+                'batch_size': int(params.get('batch_size') or 1),
+                'early_stop': bool(params.get('early_stop', False))
+            },
+            'created_at': now,
+            'updated_at': now
+        }
+        with self._lock:
+            self.jobs[job['id']] = job
+            self._trim_jobs()
+        self._queue.put(job['id'])
+        return self.get(job['id'])
+
+    def get(self, job_id):
+        """查询任务信息，任务不存在时返回None"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list(self):
+        """列出所有任务"""
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def health(self):
+        """返回服务状态"""
+        return {
+            'status': 'ok',
+            'queued': self._queue.qsize(),
+            'resident_models': list(self._resident)
+        }
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job['updated_at'] = datetime.now().isoformat()
+
+    def _trim_jobs(self):
+        """任务表超出上限时删除最早结束的任务"""
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job['status'] in ('completed', 'failed')]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        """工作线程主循环"""
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            job = self.get(job_id)
+            if job is None:
+                continue
+            self._update(job_id, status='running')
+            try:
+                result = self._execute(job_id, job['params'])
+                if result is None:
+                    self._update(job_id, status='failed', error='评测未执行，请检查模型路径和数据集')
+                else:
+                    self._update(job_id, status='completed', result=result)
+            except Exception as e:
+                self._update(job_id, status='failed', error=str(e), traceback=traceback.format_exc())
+
+    def _execute(self, job_id, params):
+        """执行一次综合评测，逐批次更新任务的progress字段"""
+        resident_key = (params['model_type'], params['model_path'], params['device'])
+        if resident_key not in self._resident:
+            if len(self._resident) >= self.max_resident_models:
+                # 切换模型前释放常驻模型，避免显存不足
+                self.model_pool.release_all()
+                self._resident = []
+            self._resident.append(resident_key)
+
+        eval_info = run_comprehensive_evaluation(
+            params['model_path'],
+            params['output_dir'],
+            params['datasets'],
+            params['max_samples'],
+            params['device'],
+            params['debug'],
+            model_pool=self.model_pool,
+            progress_callback=lambda progress: self._update(job_id, progress=progress),
+            model_type=params['model_type'],
+            batch_size=params['batch_size'],
+            early_stop=params.get('early_stop', False)
+        )
+        if eval_info is None:
+            return None
+        return self._summarize(eval_info)
+
+    @staticmethod
+    def _summarize(eval_info):
+        """提取任务结果摘要，样本详情保留在结果文件中"""
+        datasets = {}
+        for dataset, result in eval_info.get('results', {}).items():
+            if 'metrics' in result:
+                accuracy = result['metrics'].get('accuracy', {})
+                datasets[dataset] = {
+                    'accuracy': accuracy.get('score'),
+                    'correct': accuracy.get('correct'),
+                    'total': accuracy.get('total'),
+                    'elapsed_time': result.get('elapsed_time')
+                }
+            else:
+                datasets[dataset] = {'error': result.get('error')}
+        return {
+            'datasets': datasets,
+            'total_elapsed_time': eval_info.get('total_elapsed_time'),
+            'results_file': eval_info.get('results_file'),
+            'summary_file': eval_info.get('summary_file')
+        }
+
+
+class EvaluationRequestHandler(BaseHTTPRequestHandler):
+    """评测服务HTTP请求处理器"""
+    service = None
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            self._send_json(200, self.service.health())
+        elif path == '/jobs':
+            self._send_json(200, {'success': True, 'data': self.service.list()})
+        elif path.startswith('/jobs/'):
+            job = self.service.get(path[len('/jobs/'):])
+            if job is None:
+                self._send_json(404, {'success': False, 'message': '任务不存在'})
+            else:
+                self._send_json(200, {'success': True, 'data': job})
+        else:
+            self._send_json(404, {'success': False, 'message': '接口不存在'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {'success': False, 'message': '接口不存在'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+            job = self.service.submit(params)
+        except json.JSONDecodeError:
+            self._send_json(400, {'success': False, 'message': '无效的JSON格式'})
+            return
+        except ValueError as e:
+            self._send_json(400, {'success': False, 'message': str(e)})
+            return
+        self._send_json(202, {'success': True, 'data': job})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.service.debug:
+            super().log_message(format, *args)
+
+
+def create_server(service, host='127.0.0.1', port=8765, debug=False):
+    """
+    创建评测服务HTTP服务器
+
+    Returns:
+        ThreadingHTTPServer: 调用 serve_forever() 开始处理请求
+    """
+    service.debug = debug
+    handler = type('BoundEvaluationRequestHandler', (EvaluationRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻模型评测服务")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                      help="监听地址")
+    parser.add_argument("--port", type=int, default=8765,
+                      help="监听端口")
+    parser.add_argument("--output-dir", type=str, default="./outputs",
+                      help="默认评测结果输出目录")
+    parser.add_argument("--max-resident-models", type=int, default=1,
+                      help="常驻内存的最大模型数")
+    parser.add_argument("--debug", action="store_true",
+                      help="开启调试模式，打印请求日志")
+
+    args = parser.parse_args()
+    service = EvaluationService(args.output_dir, args.max_resident_models).start()
+    server = create_server(service, args.host, args.port, args.debug)
+    print(f"评测服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止评测服务...")
+    finally:
+        server.server_close()
+        service.stop()
+
+if __name__ == "__main__":
+    main()
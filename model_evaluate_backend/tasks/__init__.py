@@ -4,5 +4,6 @@
 
 from .evaluator import Evaluator
 from .runner import TaskRunner
+from .model_pool import ModelPool, ModelSession
 
-__all__ = ['Evaluator', 'TaskRunner'] 
\ No newline at end of file
+__all__ = ['Evaluator', 'TaskRunner', 'ModelPool', 'ModelSession'] 
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+批次调度实现
+"""
+import itertools
+
+
+class BatchScheduler:
+    """
+    批次调度器
+
+    按数据集顺序切分固定大小的批次，是评测器的默认调度方式。
+    """
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def batches(self, samples):
+        """
+        将样本迭代器切分为批次
+
+        Args:
+            samples: 样本信息迭代器，每项包含 idx、prompt、reference
+
+        Yields:
+            list: 样本信息列表
+        """
+        samples = iter(samples)
+        while True:
+            batch = list(itertools.islice(samples, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def stats(self):
+        """返回调度统计信息"""
+        return {'strategy': 'fixed', 'batch_size': self.batch_size}
+
+
+class LengthBucketScheduler(BatchScheduler):
+    """
+    按长度分桶的批次调度器
+
+    将提示按长度排序后组批，使同一批次内的提示长度相近，减少填充浪费。
+    设置 max_batch_tokens 时按填充后的token总量（批内最大长度 × 样本数）
+    控制批次大小，batch_size 仅作为样本数上限。
+    生成结果通过样本索引写回，不依赖调度顺序。
+    """
+    def __init__(self, batch_size, max_batch_tokens=None, length_fn=None,
+                 window=None, reserve_tokens=0):
+        """
+        Args:
+            batch_size: 每批最大样本数
+            max_batch_tokens: 每批填充后的token预算，None表示只按样本数组批
+            length_fn: 计算提示长度（token数）的函数
+            window: 排序窗口大小，None表示对全部样本排序；
+                    流式评测时使用有限窗口以保持内存占用有界
+            reserve_tokens: 每个样本预留的生成token数，计入预算
+        """
+        super().__init__(batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.length_fn = length_fn or len
+        self.window = window
+        self.reserve_tokens = reserve_tokens
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.num_batches = 0
+
+    def batches(self, samples):
+        for window in self._windows(samples):
+            window.sort(key=lambda pair: pair[0])
+
+            batch = []
+            batch_max = 0
+            for length, sample in window:
+                new_max = max(batch_max, length)
+                if batch and self._exceeds(new_max, len(batch) + 1):
+                    yield self._emit(batch, batch_max)
+                    batch = []
+                    new_max = length
+                batch.append((length, sample))
+                batch_max = new_max
+
+            if batch:
+                yield self._emit(batch, batch_max)
+
+    def _windows(self, samples):
+        """按窗口大小读取样本并计算长度"""
+        samples = iter(samples)
+        while True:
+            chunk = itertools.islice(samples, self.window) if self.window else samples
+            window = [(self.length_fn(sample['prompt']), sample) for sample in chunk]
+            if not window:
+                return
+            yield window
+            if not self.window:
+                return
+
+    def _exceeds(self, batch_max, count):
+        """判断批次是否超出样本数上限或token预算"""
+        if count > self.batch_size:
+            return True
+        if self.max_batch_tokens:
+            return (batch_max + self.reserve_tokens) * count > self.max_batch_tokens
+        return False
+
+    def _emit(self, batch, batch_max):
+        """记录填充统计并返回批次"""
+        self.num_batches += 1
+        self.real_tokens += sum(length for length, _ in batch)
+        self.padded_tokens += batch_max * len(batch)
+        return [sample for _, sample in batch]
+
+    def stats(self):
+        padding = self.padded_tokens - self.real_tokens
+        return {
+            'strategy': 'length_bucket',
+            'batch_size': self.batch_size,
+            'max_batch_tokens': self.max_batch_tokens,
+            'num_batches': self.num_batches,
+            'padding_ratio': padding / self.padded_tokens if self.padded_tokens else 0.0
+        }
+
+
+def make_length_fn(model=None, length_by='chars', chars_per_token=3.0):
+    """
+    构造提示长度函数
+
+    Args:
+        model: 模型实例，length_by为'tokens'时使用其tokenizer
+        length_by: 'tokens' 使用分词器计算真实token数，'chars' 使用字符数估算
+        chars_per_token: 字符数估算时每个token对应的平均字符数
+
+    Returns:
+        callable: 输入提示，返回token数
+    """
+    tokenizer = getattr(model, 'tokenizer', None) if length_by == 'tokens' else None
+    if tokenizer is not None and hasattr(tokenizer, 'encode'):
+        return lambda prompt: len(tokenizer.encode(prompt))
+
+    return lambda prompt: int(len(prompt) / chars_per_token) + 1
+
+
+class AdaptiveBatchController:
+    """
+    自适应批次大小控制器
+
+    吞吐量（样本数/秒）随批次增大而提升时逐步放大批次，吞吐量不再提升时
+    回退到最佳批次大小并停止增长；遇到显存/内存分配失败时将批次减半并停止增长。
+    控制器直接调整调度器的 batch_size。
+    """
+    def __init__(self, scheduler, max_batch_size=None, growth_factor=2,
+                 tolerance=0.05, probe_batches=2):
+        """
+        Args:
+            scheduler: 批次调度器
+            max_batch_size: 批次大小上限，None表示不限制
+            growth_factor: 每次增长的倍数
+            tolerance: 吞吐量相对提升超过该比例才继续增长
+            probe_batches: 每个批次大小测量的批次数
+        """
+        self.scheduler = scheduler
+        self.initial_batch_size = scheduler.batch_size
+        self.ceiling = max_batch_size
+        self.growth_factor = growth_factor
+        self.tolerance = tolerance
+        self.probe_batches = probe_batches
+        self.growing = True
+        self.best_size = None
+        self.best_throughput = None
+        self.max_tried = scheduler.batch_size
+        self.memory_errors = 0
+        self._probe_samples = 0
+        self._probe_time = 0.0
+        self._probe_count = 0
+
+    @property
+    def batch_size(self):
+        return self.scheduler.batch_size
+
+    def record(self, num_samples, elapsed):
+        """
+        记录一次成功生成的耗时并调整批次大小
+
+        只统计满批次，调度器因token预算或数据末尾产生的小批次不代表当前批次大小的吞吐量。
+        """
+        if not self.growing or num_samples < self.batch_size or elapsed <= 0:
+            return
+
+        self._probe_samples += num_samples
+        self._probe_time += elapsed
+        self._probe_count += 1
+        if self._probe_count < self.probe_batches:
+            return
+
+        throughput = self._probe_samples / self._probe_time
+        self._reset_probe()
+
+        if self.best_throughput is None or throughput > self.best_throughput * (1 + self.tolerance):
+            self.best_throughput = throughput
+            self.best_size = self.batch_size
+            next_size = self.batch_size * self.growth_factor
+            if self.ceiling is not None:
+                next_size = min(next_size, self.ceiling)
+            if next_size <= self.batch_size:
+                self.growing = False
+            else:
+                self._set_batch_size(next_size)
+        else:
+            # 吞吐量不再提升，回退到最佳批次大小
+            self._set_batch_size(self.best_size)
+            self.growing = False
+
+    def on_memory_error(self, failed_size):
+        """
+        记录内存分配失败并将批次大小减半
+
+        Returns:
+            int: 重试时使用的批次大小
+        """
+        self.memory_errors += 1
+        limit = max(1, failed_size - 1)
+        self.ceiling = limit if self.ceiling is None else min(self.ceiling, limit)
+        new_size = max(1, failed_size // 2)
+        self._set_batch_size(min(self.batch_size, new_size))
+        # 已触及内存上限，不再继续增长
+        self.growing = False
+        self._reset_probe()
+        return new_size
+
+    def _set_batch_size(self, batch_size):
+        self.scheduler.batch_size = batch_size
+        self.max_tried = max(self.max_tried, batch_size)
+
+    def _reset_probe(self):
+        self._probe_samples = 0
+        self._probe_time = 0.0
+        self._probe_count = 0
+
+    def stats(self):
+        """返回控制器统计信息"""
+        return {
+            'initial_batch_size': self.initial_batch_size,
+            'final_batch_size': self.batch_size,
+            'max_tried_batch_size': self.max_tried,
+            'memory_errors': self.memory_errors,
+            'best_throughput': self.best_throughput
+        }
+
+
+def is_memory_error(error):
+    """判断异常是否由显存或内存分配失败引起"""
+    if isinstance(error, MemoryError):
+        return True
+    if 'OutOfMemory' in type(error).__name__:
+        return True
+    message = str(error).lower()
+    return 'out of memory' in message or 'alloc_failed' in message or 'failed to allocate' in message
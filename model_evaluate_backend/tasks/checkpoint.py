@@ -0,0 +1,113 @@
+"""
+评测检查点实现
+"""
+import os
+import json
+import hashlib
+
+
+class CheckpointJournal:
+    """
+    评测检查点日志
+
+    以追加方式逐批记录已完成生成的样本索引和预测结果。
+    日志文件名由模型、数据集、提示模板和生成参数共同决定，
+    评测中断后以相同配置重新运行即可跳过已完成的样本。
+    """
+    def __init__(self, checkpoint_dir, model, dataset, prompt_template, generation_kwargs, resume=False):
+        """
+        Args:
+            resume: 是否在已有日志之后继续追加；为False时已有日志（如崩溃的运行遗留的）
+                在写入第一个批次时被替换
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume
+        self.meta = {
+            'model_name': getattr(model, 'model_name', str(model)),
+            'dataset': self._dataset_identity(dataset),
+            'prompt_template': prompt_template,
+            'generation_kwargs': generation_kwargs
+        }
+        self.key = self.make_key(self.meta)
+        self.path = os.path.join(checkpoint_dir, f"{self.key}.jsonl")
+        self._file = None
+
+    @staticmethod
+    def make_key(meta):
+        """根据评测配置生成检查点键"""
+        payload = json.dumps(meta, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _dataset_identity(dataset):
+        """提取决定样本选择和顺序的数据集配置"""
+        if hasattr(dataset, 'selection_identity'):
+            return dataset.selection_identity()
+        identity = {'name': getattr(dataset, 'name', str(dataset))}
+        for attr in ('split', 'data_path', 'subset', 'subject', 'difficulty', 'answer_type', 'seed', 'max_samples'):
+            value = getattr(dataset, attr, None)
+            if value is not None:
+                identity[attr] = value
+        return identity
+
+    def load(self):
+        """
+        读取已完成的样本
+
+        Returns:
+            dict: 样本索引到预测结果的映射
+        """
+        finished = {}
+        if not os.path.exists(self.path):
+            return finished
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时最后一行可能不完整，直接忽略
+                    continue
+                for idx, prediction in zip(record.get('indices', []), record.get('predictions', [])):
+                    finished[idx] = prediction
+        return finished
+
+    def append(self, indices, predictions):
+        """追加一个批次的结果并立即落盘"""
+        if self._file is None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            if self.resume and os.path.exists(self.path):
+                torn = self._ends_without_newline()
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if torn:
+                    # 进程中断时最后一行可能不完整，换行后再写入，避免新记录与其拼接成无效行
+                    self._file.write('\n')
+            else:
+                self._file = open(self.path, 'w', encoding='utf-8')
+                self._file.write(json.dumps({'meta': self.meta}, ensure_ascii=False, default=str) + '\n')
+
+        record = {'indices': list(indices), 'predictions': list(predictions)}
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _ends_without_newline(self):
+        """已有日志非空且最后一个字节不是换行符"""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+
+    def close(self):
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """评测成功完成后删除日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
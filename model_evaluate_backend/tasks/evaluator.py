@@ -2,11 +2,20 @@
 评测器实现
 """
 import os
+import sys
 import json
 import time
 import datetime
 from tqdm import tqdm
 from model_evaluate_demo.utils.registry import MODELS, DATASETS, METRICS
+from model_evaluate_demo.tasks.streaming import StreamingScorer
+from model_evaluate_demo.metrics.details import json_default
+from model_evaluate_demo.metrics.memo import memo_stats
+from model_evaluate_demo.tasks.checkpoint import CheckpointJournal
+from model_evaluate_demo.tasks.generation_cache import GenerationCache
+from model_evaluate_demo.tasks.batching import (
+    BatchScheduler, LengthBucketScheduler, AdaptiveBatchController, make_length_fn, is_memory_error
+)
 
 
 class Evaluator:
@@ -18,6 +27,16 @@ class Evaluator:
     def __init__(self, **kwargs):
         self.output_dir = kwargs.get('output_dir', 'outputs')
         self.debug = kwargs.get('debug', False)
+        # 是否写入检查点日志，以及是否从已有检查点恢复
+        self.checkpoint = kwargs.get('checkpoint', True)
+        self.resume = kwargs.get('resume', False)
+        # 生成结果缓存：None表示关闭，True使用默认目录，字符串为缓存目录
+        self.generation_cache = kwargs.get('generation_cache', None)
+        self.generation_cache_size_mb = kwargs.get('generation_cache_size_mb', 1024)
+        # 进度回调：每完成一个批次调用一次，参数为包含已完成样本数、总样本数、
+        # 吞吐量和当前准确率的字典
+        self.progress_callback = kwargs.get('progress_callback', None)
+        self._caches = {}
         
     def evaluate(self, model, dataset, metrics, **kwargs):
         """
@@ -32,6 +51,30 @@ class Evaluator:
                 - batch_size: 推理批次大小
                 - max_samples: 最大样本数
                 - generation_kwargs: 生成参数
+                - streaming: 是否使用流水线模式，生成与评分并行进行，
+                  样本记录逐条写入JSONL文件而不保存在结果中
+                - checkpoint: 是否逐批写入检查点日志，默认使用初始化参数
+                - resume: 是否从检查点日志恢复并跳过已完成的样本
+                - generation_cache: 生成结果缓存，True使用默认目录，字符串为缓存目录，
+                  仅对确定性生成参数生效
+                - rescore_only: 仅重新评分模式，只从生成缓存读取结果，不加载也不调用模型
+                - length_bucketing: 是否按提示长度排序分桶组批
+                - max_batch_tokens: 每批填充后的token预算，设置后自动启用长度分桶，
+                  batch_size 作为每批样本数上限
+                - length_by: 长度计算方式，'chars'按字符数估算，'tokens'使用模型分词器
+                - adaptive_batch_size: 是否自适应调整批次大小，吞吐量提升时增大批次，
+                  显存不足时减半并重试同一批提示
+                - max_batch_size: 自适应批次大小的上限
+                - metric_workers: 按名称创建的指标并行计算使用的进程数，0表示不并行，
+                  -1表示使用全部CPU，样本数较少时始终在当前进程计算
+                - early_stop: 是否在检测到完整的最终答案后提前结束生成，True使用数据集的
+                  answer_stop 配置，字典覆盖其中的项；配置作为生成参数 stop_on_answer 传给模型，
+                  目前由 huggingface_cpu 模型支持
+                - prenormalize_references: 是否在评测前预先归一化数据集的全部参考答案，
+                  结果缓存在数据集缓存目录中，默认为True
+                - continuous_batching: 是否使用连续批处理，要求模型提供 generate_stream，
+                  batch_size 为同时解码的序列数，序列结束后立即补入新的提示，
+                  不使用批次调度器和自适应批次大小
                 
         Returns:
             dict: 评测结果
@@ -52,8 +95,10 @@ class Evaluator:
             except KeyError:
                 raise ValueError(f"未知数据集: {dataset}。请确保已注册该数据集。")
         
-        # 加载模型和数据集
-        if not hasattr(model, '_model') or model._model is None:
+        rescore_only = kwargs.get('rescore_only', False)
+        
+        # 加载模型和数据集，仅重新评分时不需要加载模型
+        if not rescore_only and (not hasattr(model, '_model') or model._model is None):
             model.load()
         
         if dataset.data is None:
@@ -65,23 +110,52 @@ class Evaluator:
             if isinstance(metric, str):
                 try:
                     metric_cls = METRICS.get(metric)
-                    metric_instances.append(metric_cls())
+                    metric_instances.append(metric_cls(num_workers=kwargs.get('metric_workers', 0)))
                 except KeyError:
                     raise ValueError(f"未知评估指标: {metric}。请确保已注册该指标。")
             else:
                 metric_instances.append(metric)
         
+        # 预先归一化参考答案，结果固定在指标共享的记忆表中
+        if kwargs.get('prenormalize_references', True):
+            for metric in metric_instances:
+                try:
+                    metric.prepare_references(dataset)
+                except Exception as e:
+                    print(f"预归一化参考答案失败 ({metric.name}): {str(e)}")
+        
         # 准备参数
         prompt_template = kwargs.get('prompt_template', dataset.default_template if hasattr(dataset, 'default_template') else None)
         batch_size = kwargs.get('batch_size', 16)
         max_samples = kwargs.get('max_samples', None)
         generation_kwargs = kwargs.get('generation_kwargs', {})
+        early_stop = kwargs.get('early_stop', False)
+        if early_stop and not getattr(model, 'supports_answer_stop', False):
+            print(f"模型 {model.model_name} 不支持检测答案提前结束，忽略 early_stop")
+            early_stop = False
+        if early_stop:
+            # 答案检测配置作为生成参数，改变生成结果，因此也计入生成缓存和检查点的键
+            stop_on_answer = dict(getattr(dataset, 'answer_stop', None) or {})
+            if isinstance(early_stop, dict):
+                stop_on_answer.update(early_stop)
+            generation_kwargs = dict(generation_kwargs, stop_on_answer=stop_on_answer or True)
+        streaming = kwargs.get('streaming', False)
+        checkpoint = kwargs.get('checkpoint', self.checkpoint)
+        resume = kwargs.get('resume', self.resume)
+        
+        # 渲染前校验模板变量，避免在生成过程中才发现模板错误
+        if hasattr(dataset, 'validate_template'):
+            dataset.validate_template(prompt_template)
         
         # 限制样本数
         if max_samples and max_samples < len(dataset):
-            indices = list(range(max_samples))
+            indices = range(max_samples)
         else:
-            indices = list(range(len(dataset)))
+            indices = range(len(dataset))
+        
+        # 模型池中的模型在多次评测间共享，清空之前评测的生成统计，使结果只包含本次评测
+        if hasattr(model, 'generation_stats') and hasattr(model, 'reset_stats'):
+            model.reset_stats()
         
         # 记录开始时间
         start_time = time.time()
@@ -98,38 +172,98 @@ class Evaluator:
             'samples': []
         }
         
-        # 准备提示和参考答案
-        prompts = []
-        references = []
+        # 批次调度
+        scheduler = self._make_scheduler(model, batch_size, generation_kwargs, kwargs, streaming)
+        controller = None
+        if kwargs.get('adaptive_batch_size', False):
+            controller = AdaptiveBatchController(scheduler, max_batch_size=kwargs.get('max_batch_size', None))
+        
+        # 连续批处理：仅重新评分时不调用模型，不需要
+        continuous = kwargs.get('continuous_batching', False) and not rescore_only
+        if continuous and not hasattr(model, 'generate_stream'):
+            print(f"模型 {model.model_name} 不支持连续批处理，使用普通批处理")
+            continuous = False
         
-        for idx in indices:
-            prompt = dataset.get_prompt(idx, template=prompt_template)
-            prompts.append(prompt)
+        # 生成结果缓存
+        cache = None
+        cache_setting = kwargs.get('generation_cache', self.generation_cache)
+        if rescore_only and not cache_setting:
+            cache_setting = True
+        if cache_setting:
+            if GenerationCache.is_deterministic(generation_kwargs):
+                cache = self._get_generation_cache(cache_setting)
+                cache_stats_before = cache.stats()
+                cache_identity = cache.model_identity(model)
+            elif rescore_only:
+                raise ValueError("仅重新评分模式要求确定性生成参数(temperature=0或do_sample=False)")
+            else:
+                print("生成参数不是确定性的，跳过生成结果缓存")
+        cache_context = (cache, cache_identity) if cache is not None else None
+        
+        # 检查点日志：逐批记录已完成的样本，中断后可恢复
+        journal = None
+        finished = {}
+        if checkpoint:
+            journal = CheckpointJournal(
+                os.path.join(self.output_dir, 'checkpoints'),
+                model, dataset, prompt_template, generation_kwargs, resume=resume
+            )
+            if resume:
+                finished = journal.load()
+                if finished:
+                    print(f"从检查点恢复 {len(finished)} 个已完成样本: {journal.path}")
+        
+        if streaming:
+            try:
+                self._evaluate_streaming(model, dataset, metric_instances, indices, results,
+                                         prompt_template, scheduler, generation_kwargs,
+                                         journal, finished, cache_context, rescore_only, controller,
+                                         start_time, continuous)
+            finally:
+                if journal is not None:
+                    journal.close()
             
-            item = dataset[idx]
-            reference = item.get('answer', '')
-            references.append(reference)
+            results['batching'] = self._batching_stats(scheduler, controller)
+            results['normalization_memo'] = memo_stats()
+            if hasattr(model, 'request_stats'):
+                results['requests'] = model.request_stats()
+            if hasattr(model, 'generation_stats'):
+                results['generation'] = model.generation_stats()
+            if cache is not None:
+                results['generation_cache'] = self._cache_run_stats(cache, cache_stats_before)
+            
+            elapsed_time = time.time() - start_time
+            results['elapsed_time'] = elapsed_time
+            print(f"评测完成，耗时: {elapsed_time:.2f}秒")
+            
+            self._save_results(results)
+            if journal is not None:
+                journal.remove()
+            return results
+        
+        # 准备提示和参考答案
+        samples = list(self._iter_samples(dataset, indices, prompt_template))
+        prompts = [sample['prompt'] for sample in samples]
+        references = [sample['reference'] for sample in samples]
             
         # 分批处理
-        predictions = []
+        predictions_by_idx = {}
         
         print(f"生成回复中...")
-        for i in tqdm(range(0, len(prompts), batch_size)):
-            batch_prompts = prompts[i:i+batch_size]
-            
-            try:
-                batch_predictions = model.generate(batch_prompts, **generation_kwargs)
-                predictions.extend(batch_predictions)
-                
-                if self.debug:
-                    print(f"\n样本 {i}:")
-                    print(f"提示: {batch_prompts[0][:100]}...")
-                    print(f"生成: {batch_predictions[0][:100]}...")
-                    
-            except Exception as e:
-                print(f"批次 {i}-{i+batch_size-1} 生成失败: {str(e)}")
-                # 对失败的批次填充空字符串
-                predictions.extend([""] * len(batch_prompts))
+        try:
+            batches = self._generate_batches(model, samples, scheduler, generation_kwargs,
+                                             journal, finished, cache_context=cache_context,
+                                             rescore_only=rescore_only, controller=controller,
+                                             continuous=continuous)
+            for batch, batch_predictions in batches:
+                for sample, prediction in zip(batch, batch_predictions):
+                    predictions_by_idx[sample['idx']] = prediction
+                self._report_progress(results, len(predictions_by_idx), len(samples), start_time)
+        finally:
+            if journal is not None:
+                journal.close()
+        
+        predictions = [predictions_by_idx[sample['idx']] for sample in samples]
         
         # 记录样本详情
         for i, (prompt, prediction, reference) in enumerate(zip(prompts, predictions, references)):
@@ -144,13 +278,24 @@ class Evaluator:
         # 计算评估指标
         for metric in metric_instances:
             try:
-                metric_result = metric.compute(predictions, references)
+                metric_result = metric(predictions, references)
                 results['metrics'][metric.name] = metric_result
                 print(f"指标 {metric.name}: {metric_result['score']:.4f}")
             except Exception as e:
                 print(f"计算指标 {metric.name} 失败: {str(e)}")
                 results['metrics'][metric.name] = {'error': str(e)}
         
+        self._report_progress(results, len(samples), len(samples), start_time, results['metrics'])
+        
+        results['batching'] = self._batching_stats(scheduler, controller)
+        results['normalization_memo'] = memo_stats()
+        if hasattr(model, 'request_stats'):
+            results['requests'] = model.request_stats()
+        if hasattr(model, 'generation_stats'):
+            results['generation'] = model.generation_stats()
+        if cache is not None:
+            results['generation_cache'] = self._cache_run_stats(cache, cache_stats_before)
+        
         # 记录总耗时
         elapsed_time = time.time() - start_time
         results['elapsed_time'] = elapsed_time
@@ -158,9 +303,386 @@ class Evaluator:
         
         # 保存结果
         self._save_results(results)
+        if journal is not None:
+            journal.remove()
         
         return results
     
+    def _evaluate_streaming(self, model, dataset, metric_instances, indices, results,
+                            prompt_template, scheduler, generation_kwargs,
+                            journal=None, finished=None, cache_context=None, rescore_only=False,
+                            controller=None, start_time=None, continuous=False):
+        """
+        流水线模式评测
+        
+        提示由生成器按需渲染，每个完成的批次立即交给后台评分线程，
+        评分线程增量累加指标并逐条写出样本记录。
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        model_name = results['model_name'].split('/')[-1]
+        samples_file = os.path.join(
+            self.output_dir, f"{timestamp}_{model_name}_{results['dataset_name']}_samples.jsonl"
+        )
+        
+        start_time = start_time or time.time()
+        scorer = StreamingScorer(metric_instances, samples_file, debug=self.debug).start()
+        samples = self._iter_samples(dataset, indices, prompt_template)
+        
+        print(f"流水线模式生成回复中...")
+        try:
+            batches = self._generate_batches(model, samples, scheduler, generation_kwargs,
+                                             journal, finished, total=len(indices),
+                                             cache_context=cache_context, rescore_only=rescore_only,
+                                             controller=controller, continuous=continuous)
+            done = 0
+            for batch, batch_predictions in batches:
+                scorer.submit(batch, batch_predictions)
+                done += len(batch)
+                self._report_progress(results, done, len(indices), start_time,
+                                      scorer.finalize())
+        finally:
+            scorer.close()
+        
+        results['metrics'] = scorer.finalize()
+        results['samples_file'] = samples_file
+        self._report_progress(results, len(indices), len(indices), start_time, results['metrics'])
+        for name, metric_result in results['metrics'].items():
+            if 'score' in metric_result:
+                print(f"指标 {name}: {metric_result['score']:.4f}")
+    
+    def _report_progress(self, results, done, total, start_time, metrics=None):
+        """
+        调用进度回调
+        
+        metrics 为当前已累计的指标结果，流水线模式下随批次更新，
+        普通模式下只在全部样本评分后提供，生成阶段准确率为None。
+        """
+        if self.progress_callback is None:
+            return
+        
+        elapsed = time.time() - start_time
+        accuracy = None
+        if metrics:
+            metric_result = metrics.get('accuracy') or next(iter(metrics.values()))
+            # 流水线模式下评分线程尚未处理任何批次时不报告准确率
+            if metric_result.get('total') != 0:
+                accuracy = metric_result.get('score')
+        try:
+            self.progress_callback({
+                'model_name': results['model_name'],
+                'dataset_name': results['dataset_name'],
+                'done': done,
+                'total': total,
+                'elapsed_time': elapsed,
+                'throughput': done / elapsed if elapsed > 0 else 0.0,
+                'accuracy': accuracy
+            })
+        except Exception as e:
+            # 进度上报失败不影响评测
+            print(f"进度回调失败: {str(e)}")
+    
+    def _generate_batches(self, model, samples, scheduler, generation_kwargs,
+                          journal=None, finished=None, total=None,
+                          cache_context=None, rescore_only=False, controller=None,
+                          continuous=False):
+        """
+        分批生成回复
+        
+        检查点中已完成的样本直接复用记录的预测结果，其余样本由批次调度器组批后调用模型生成，
+        成功的批次追加写入检查点日志。cache_context 为 (生成缓存, 模型标识)，
+        提供时先查询缓存，只对未命中的提示调用模型。continuous 为True时由模型的
+        generate_stream 连续批处理生成，完成的样本按完成顺序每 batch_size 个组成一批。
+        
+        Yields:
+            tuple: (样本信息列表, 预测结果列表)，批次顺序由调度器决定
+        """
+        finished = finished or {}
+        if total is None and hasattr(samples, '__len__'):
+            total = len(samples)
+        progress = tqdm(total=total)
+        
+        recovered = []
+        
+        def pending_samples():
+            for sample in samples:
+                if sample['idx'] in finished:
+                    recovered.append(sample)
+                else:
+                    yield sample
+        
+        def flush_recovered(min_size):
+            while recovered and len(recovered) >= min_size:
+                batch = recovered[:scheduler.batch_size]
+                del recovered[:scheduler.batch_size]
+                progress.update(len(batch))
+                yield batch, [finished[s['idx']] for s in batch]
+        
+        if continuous:
+            batches = self._generate_continuous(model, pending_samples(), scheduler.batch_size,
+                                                generation_kwargs, journal, cache_context)
+            for batch, batch_predictions in batches:
+                yield from flush_recovered(scheduler.batch_size)
+                progress.update(len(batch))
+                yield batch, batch_predictions
+        else:
+            for batch in scheduler.batches(pending_samples()):
+                yield from flush_recovered(scheduler.batch_size)
+                batch_predictions = self._generate_batch(model, batch, generation_kwargs, journal,
+                                                         cache_context, rescore_only, controller)
+                progress.update(len(batch))
+                yield batch, batch_predictions
+        
+        yield from flush_recovered(1)
+        progress.close()
+    
+    def _generate_batch(self, model, batch, generation_kwargs, journal=None,
+                        cache_context=None, rescore_only=False, controller=None):
+        """
+        对单个批次调用模型生成，失败时填充空字符串
+        """
+        batch_prompts = [sample['prompt'] for sample in batch]
+        batch_predictions = [None] * len(batch_prompts)
+        
+        # 查询生成缓存
+        cache_keys = None
+        if cache_context is not None:
+            cache, identity = cache_context
+            cache_keys = [cache.make_key(identity, prompt, generation_kwargs) for prompt in batch_prompts]
+            cached = cache.get_many(cache_keys)
+            for i, key in enumerate(cache_keys):
+                if key in cached:
+                    batch_predictions[i] = cached[key]
+        
+        missing = [i for i, prediction in enumerate(batch_predictions) if prediction is None]
+        if missing and rescore_only:
+            print(f"批次 {batch[0]['idx']}-{batch[-1]['idx']} 有 {len(missing)} 个样本未命中生成缓存，填充空字符串")
+            return [p if p is not None else "" for p in batch_predictions]
+        
+        if missing:
+            missing_prompts = [batch_prompts[i] for i in missing]
+            try:
+                generated = self._generate_with_backoff(model, missing_prompts, generation_kwargs, controller)
+            except Exception as e:
+                print(f"批次 {batch[0]['idx']}-{batch[-1]['idx']} 生成失败: {str(e)}")
+                # 对失败的批次填充空字符串，不写入检查点以便恢复时重试
+                return [""] * len(batch_prompts)
+            
+            for i, prediction in zip(missing, generated):
+                batch_predictions[i] = prediction
+            
+            if cache_keys is not None:
+                cache.put_many([(cache_keys[i], batch_predictions[i]) for i in missing])
+            
+            if self.debug:
+                print(f"\n样本 {batch[missing[0]]['idx']}:")
+                print(f"提示: {missing_prompts[0][:100]}...")
+                print(f"生成: {generated[0][:100]}...")
+        
+        if journal is not None:
+            journal.append([sample['idx'] for sample in batch], batch_predictions)
+        
+        return batch_predictions
+    
+    def _generate_continuous(self, model, samples, batch_size, generation_kwargs, journal=None,
+                             cache_context=None):
+        """
+        连续批处理生成
+        
+        样本按需读取，命中生成缓存的直接完成，其余提示交给模型的 generate_stream，
+        最多 batch_size 个序列同时解码。完成的样本按完成顺序每 batch_size 个组成一批，
+        写入生成缓存和检查点日志后产出。生成失败时正在解码的样本填充空字符串，
+        不写入检查点以便恢复时重试，之后的样本重新开始生成。
+        
+        Yields:
+            tuple: (样本信息列表, 预测结果列表)
+        """
+        samples = iter(samples)
+        cache, identity = cache_context if cache_context is not None else (None, None)
+        # 已完成待产出的样本：(样本, 预测结果, 缓存键, 是否写入检查点)
+        ready = []
+        
+        def flush(min_size):
+            while ready and len(ready) >= min_size:
+                group = ready[:batch_size]
+                del ready[:batch_size]
+                if cache is not None:
+                    cache.put_many([(key, prediction) for _, prediction, key, _ in group if key is not None])
+                if journal is not None:
+                    journaled = [(sample, prediction) for sample, prediction, _, ok in group if ok]
+                    if journaled:
+                        journal.append([sample['idx'] for sample, _ in journaled],
+                                       [prediction for _, prediction in journaled])
+                yield [sample for sample, _, _, _ in group], [prediction for _, prediction, _, _ in group]
+        
+        while True:
+            # 本轮交给模型的样本及其缓存键，按 generate_stream 的序号排列
+            sent = []
+            
+            def stream_prompts():
+                for sample in samples:
+                    key = None
+                    if cache is not None:
+                        key = cache.make_key(identity, sample['prompt'], generation_kwargs)
+                        cached = cache.get_many([key])
+                        if key in cached:
+                            ready.append((sample, cached[key], None, True))
+                            continue
+                    sent.append((sample, key))
+                    yield sample['prompt']
+            
+            completed = set()
+            try:
+                stream = model.generate_stream(stream_prompts(), max_batch_size=batch_size, **generation_kwargs)
+                for index, prediction in stream:
+                    sample, key = sent[index]
+                    completed.add(index)
+                    ready.append((sample, prediction, key, True))
+                    if self.debug:
+                        print(f"\n样本 {sample['idx']}:")
+                        print(f"提示: {sample['prompt'][:100]}...")
+                        print(f"生成: {prediction[:100]}...")
+                    yield from flush(batch_size)
+            except Exception as e:
+                retry = bool(sent)
+                if not retry:
+                    # 模型在读取任何提示之前就失败，重试没有意义，其余样本全部填充
+                    for _ in stream_prompts():
+                        pass
+                failed = [sample for i, (sample, _) in enumerate(sent) if i not in completed]
+                print(f"连续批处理生成失败，{len(failed)} 个样本填充空字符串: {str(e)}")
+                ready.extend((sample, "", None, False) for sample in failed)
+                yield from flush(batch_size)
+                if retry:
+                    continue
+            break
+        
+        yield from flush(1)
+    
+    def _generate_with_backoff(self, model, prompts, generation_kwargs, controller=None):
+        """
+        调用模型生成
+        
+        启用自适应批次大小时记录吞吐量；显存不足时将批次减半，
+        拆分同一批提示重试，而不是把整批结果填充为空字符串。
+        """
+        start_time = time.time()
+        try:
+            predictions = model.generate(prompts, **generation_kwargs)
+        except Exception as e:
+            if controller is None or len(prompts) <= 1 or not is_memory_error(e):
+                raise
+            
+            new_size = controller.on_memory_error(len(prompts))
+            print(f"批次大小 {len(prompts)} 显存不足，减半为 {new_size} 后重试")
+            self._release_memory()
+            
+            predictions = []
+            for i in range(0, len(prompts), new_size):
+                predictions.extend(
+                    self._generate_with_backoff(model, prompts[i:i+new_size], generation_kwargs, controller)
+                )
+            return predictions
+        
+        if controller is not None:
+            controller.record(len(prompts), time.time() - start_time)
+        return predictions
+    
+    def _release_memory(self):
+        """
+        释放显存缓存，仅在已导入torch时生效
+        """
+        torch = sys.modules.get('torch')
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    
+    def _batching_stats(self, scheduler, controller=None):
+        """
+        汇总批次调度统计
+        """
+        stats = scheduler.stats()
+        if controller is not None:
+            stats['adaptive'] = controller.stats()
+            print(f"自适应批次大小: {controller.initial_batch_size} -> {controller.batch_size}")
+        return stats
+    
+    def _make_scheduler(self, model, batch_size, generation_kwargs, options, streaming):
+        """
+        根据评测参数构造批次调度器
+        """
+        max_batch_tokens = options.get('max_batch_tokens', None)
+        if not (options.get('length_bucketing', False) or max_batch_tokens):
+            return BatchScheduler(batch_size)
+        
+        length_fn = make_length_fn(
+            model,
+            length_by=options.get('length_by', 'chars'),
+            chars_per_token=options.get('chars_per_token', 3.0)
+        )
+        # 预留生成长度，使token预算近似反映KV缓存占用
+        reserve_tokens = 0
+        if max_batch_tokens:
+            reserve_tokens = generation_kwargs.get('max_new_tokens', generation_kwargs.get('max_tokens', 0))
+        # 流式评测只在有限窗口内排序，保持内存占用有界
+        window = options.get('bucket_window', batch_size * 64 if streaming else None)
+        
+        return LengthBucketScheduler(
+            batch_size,
+            max_batch_tokens=max_batch_tokens,
+            length_fn=length_fn,
+            window=window,
+            reserve_tokens=reserve_tokens
+        )
+    
+    def _get_generation_cache(self, cache_setting):
+        """
+        获取生成结果缓存实例，同一目录的缓存在评测器内复用
+        """
+        if isinstance(cache_setting, GenerationCache):
+            return cache_setting
+        
+        cache_dir = cache_setting if isinstance(cache_setting, str) else os.path.join(self.output_dir, 'generation_cache')
+        if cache_dir not in self._caches:
+            self._caches[cache_dir] = GenerationCache(cache_dir, max_size_mb=self.generation_cache_size_mb)
+        return self._caches[cache_dir]
+    
+    def _cache_run_stats(self, cache, stats_before):
+        """
+        计算本次评测期间的缓存命中统计
+        """
+        stats = cache.stats()
+        hits = stats['hits'] - stats_before['hits']
+        misses = stats['misses'] - stats_before['misses']
+        print(f"生成缓存命中: {hits}/{hits + misses}")
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'writes': stats['writes'] - stats_before['writes'],
+            'evictions': stats['evictions'] - stats_before['evictions'],
+            'path': stats['path']
+        }
+    
+    def _iter_samples(self, dataset, indices, prompt_template, chunk_size=256):
+        """
+        按需渲染提示，逐个产出样本信息
+        
+        样本按块读取，每块使用编译后的模板一次批量渲染。
+        """
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start:start + chunk_size]
+            items = [dataset[idx] for idx in chunk]
+            if hasattr(dataset, 'render_prompts'):
+                prompts = dataset.render_prompts(items, template=prompt_template)
+            else:
+                prompts = [dataset.get_prompt(idx, template=prompt_template) for idx in chunk]
+            for idx, item, prompt in zip(chunk, items, prompts):
+                yield {
+                    'idx': idx,
+                    'prompt': prompt,
+                    'reference': item.get('answer', '')
+                }
+    
     def _save_results(self, results):
         """
         保存评测结果
@@ -177,6 +699,6 @@ class Evaluator:
         
         # 保存为JSON文件
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+            json.dump(results, f, ensure_ascii=False, indent=2, default=json_default)
             
         print(f"结果已保存到: {filepath}") 
\ No newline at end of file
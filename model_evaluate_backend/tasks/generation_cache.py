@@ -0,0 +1,190 @@
+"""
+生成结果缓存实现
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+# 计算权重指纹时关注的文件
+WEIGHT_FILE_SUFFIXES = ('.safetensors', '.bin', '.pt', '.pth', '.gguf')
+WEIGHT_META_FILES = ('config.json', 'generation_config.json', 'tokenizer_config.json')
+
+
+class GenerationCache:
+    """
+    生成结果缓存
+
+    以 hash(模型标识 + 权重指纹, 提示, 生成参数) 为键，将确定性生成
+    （temperature为0或关闭采样）的结果持久化到磁盘上的SQLite文件中。
+    缓存总大小超过上限时按最近最少使用顺序淘汰。
+    """
+    def __init__(self, cache_dir, max_size_mb=1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'generations.sqlite')
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS generations ('
+            'key TEXT PRIMARY KEY, prediction TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_generations_last_access ON generations (last_access)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def is_deterministic(generation_kwargs):
+        """
+        判断生成参数是否为确定性生成
+
+        只有显式关闭采样或temperature为0时才认为结果可复现，
+        未指定时无法确定后端的默认行为，不做缓存。
+        """
+        generation_kwargs = generation_kwargs or {}
+        do_sample = generation_kwargs.get('do_sample')
+        if do_sample is not None:
+            return not do_sample
+        temperature = generation_kwargs.get('temperature')
+        return temperature is not None and float(temperature) == 0.0
+
+    def model_identity(self, model):
+        """
+        获取模型标识
+
+        由模型类名、模型名称和权重指纹组成。模型可以通过 weights_fingerprint
+        属性自行提供指纹，否则对本地模型目录中的权重文件名、大小和修改时间求哈希。
+        """
+        model_name = getattr(model, 'model_name', str(model))
+        fingerprint = getattr(model, 'weights_fingerprint', None)
+        if fingerprint is None:
+            if model_name not in self._fingerprints:
+                self._fingerprints[model_name] = self._weights_fingerprint(model_name)
+            fingerprint = self._fingerprints[model_name]
+        return f"{type(model).__name__}:{model_name}:{fingerprint}"
+
+    @staticmethod
+    def _weights_fingerprint(model_path):
+        """对本地模型目录计算权重指纹，远程模型返回空字符串"""
+        if not isinstance(model_path, str) or not os.path.isdir(model_path):
+            return ''
+
+        entries = []
+        for root, _, files in os.walk(model_path):
+            for filename in files:
+                if filename.endswith(WEIGHT_FILE_SUFFIXES) or filename in WEIGHT_META_FILES:
+                    file_path = os.path.join(root, filename)
+                    stat = os.stat(file_path)
+                    entries.append((os.path.relpath(file_path, model_path), stat.st_size, stat.st_mtime_ns))
+        entries.sort()
+        return hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(model_identity, prompt, generation_kwargs):
+        """生成缓存键"""
+        payload = json.dumps(
+            [model_identity, prompt, generation_kwargs or {}],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """
+        批量查询缓存
+
+        Returns:
+            dict: 命中的键到生成结果的映射
+        """
+        if not keys:
+            return {}
+
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # SQLite单条语句的参数个数有限，分段查询
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, prediction FROM generations WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE generations SET last_access = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """
+        批量写入缓存
+
+        Args:
+            items: (键, 生成结果) 列表
+        """
+        if not items:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO generations (key, prediction, size, last_access) VALUES (?, ?, ?, ?)',
+                [(key, prediction, len(key) + len(prediction.encode('utf-8')), now)
+                 for key, prediction in items]
+            )
+            self.writes += len(items)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """总大小超过上限时淘汰最近最少使用的条目"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM generations').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        rows = self._conn.execute('SELECT key, size FROM generations ORDER BY last_access')
+        victims = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._conn.executemany('DELETE FROM generations WHERE key = ?', victims)
+        self.evictions += len(victims)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'path': self.path
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
@@ -0,0 +1,176 @@
+"""
+模型池实现
+"""
+import gc
+import sys
+import json
+import threading
+from model_evaluate_demo.utils.registry import MODELS
+
+
+# 决定模型权重在内存中形态的配置项，相同取值的配置共享同一个模型实例
+DTYPE_KEYS = ('torch_dtype', 'dtype')
+QUANTIZATION_KEYS = ('load_8bit', 'load_4bit', 'load_in_8bit', 'load_in_4bit', 'quantization')
+
+
+def create_model(model_config):
+    """
+    根据模型配置创建模型实例
+
+    Args:
+        model_config: 模型名称字符串，或包含name(模型类型)与model_name(模型路径)的配置字典
+    """
+    if isinstance(model_config, str):
+        model_name = model_config
+        model_kwargs = {}
+        model_name_or_path = model_name
+    else:
+        model_name = model_config.get('name')
+        model_kwargs = {k: v for k, v in model_config.items() if k != 'name'}
+        
+        # 修复model_name_or_path参数，确保正确传递给模型
+        model_name_or_path = model_kwargs.pop('model_name', model_name)
+
+    try:
+        model_cls = MODELS.get(model_name)
+    except KeyError:
+        raise ValueError(f"未知模型: {model_name}。请确保已注册该模型。")
+    return model_cls(model_name_or_path, **model_kwargs)
+
+
+class ModelPool:
+    """
+    模型池
+
+    按 (模型类型, 模型路径, 数据类型, 设备, 量化方式) 缓存已加载的模型实例，
+    同一次评测中的多个数据集/任务共享同一个模型，避免重复从磁盘加载权重。
+    模型在显式调用 release(..., unload=True) 或 release_all() 之前一直常驻。
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_config):
+        """
+        生成模型池键
+
+        Args:
+            model_config: 模型名称字符串或模型配置字典
+        """
+        if isinstance(model_config, str):
+            return json.dumps([model_config, model_config, None, None, None])
+
+        model_type = model_config.get('name')
+        model_path = model_config.get('model_name', model_type)
+        dtype = next((model_config[k] for k in DTYPE_KEYS if model_config.get(k) is not None), None)
+        device = model_config.get('device')
+        quantization = {k: model_config[k] for k in QUANTIZATION_KEYS if model_config.get(k)}
+        return json.dumps([model_type, model_path, dtype, device, quantization],
+                          sort_keys=True, ensure_ascii=False, default=str)
+
+    def acquire(self, model_config):
+        """
+        获取模型实例，不存在时创建并加载
+
+        Returns:
+            模型实例
+        """
+        key = self.make_key(model_config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                model = create_model(model_config)
+                print(f"模型池加载模型: {getattr(model, 'model_name', key)}")
+                if not hasattr(model, '_model') or model._model is None:
+                    model.load()
+                entry = {'model': model, 'refcount': 0}
+                self._entries[key] = entry
+            entry['refcount'] += 1
+            return entry['model']
+
+    def release(self, model_config, unload=False):
+        """
+        归还模型实例
+
+        Args:
+            model_config: 获取模型时使用的配置
+            unload: 引用计数归零时是否卸载模型并释放内存
+        """
+        key = self.make_key(model_config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['refcount'] = max(0, entry['refcount'] - 1)
+            if unload and entry['refcount'] == 0:
+                del self._entries[key]
+                self._unload(entry['model'])
+
+    def release_all(self):
+        """卸载池中所有模型"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._unload(entry['model'])
+
+    def session(self, model_config):
+        """
+        创建模型会话
+
+        Returns:
+            ModelSession: 可用作上下文管理器，退出时卸载模型
+        """
+        return ModelSession(self, model_config)
+
+    def __contains__(self, model_config):
+        return self.make_key(model_config) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _unload(model):
+        """卸载模型并释放内存"""
+        if hasattr(model, 'unload'):
+            model.unload()
+        elif hasattr(model, '_model'):
+            model._model = None
+        gc.collect()
+        torch = sys.modules.get('torch')
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+class ModelSession:
+    """
+    模型会话
+
+    在一次评测运行中持有模型池中的一个模型，供多个数据集复用，
+    退出时显式卸载模型。
+    """
+    def __init__(self, pool, model_config):
+        self.pool = pool
+        self.model_config = model_config
+        self.model = None
+
+    def open(self):
+        """加载（或复用）模型"""
+        if self.model is None:
+            self.model = self.pool.acquire(self.model_config)
+        return self.model
+
+    def close(self):
+        """归还并卸载模型"""
+        if self.model is not None:
+            self.pool.release(self.model_config, unload=True)
+            self.model = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -8,7 +8,9 @@ import time
 import datetime
 from concurrent.futures import ThreadPoolExecutor
 from model_evaluate_demo.tasks.evaluator import Evaluator
-from model_evaluate_demo.utils.registry import MODELS, DATASETS, METRICS
+from model_evaluate_demo.tasks.worker_pool import ProcessTaskPool
+from model_evaluate_demo.tasks.model_pool import create_model
+from model_evaluate_demo.utils.registry import DATASETS, METRICS
 
 
 class TaskRunner:
@@ -22,14 +24,24 @@ class TaskRunner:
         self.output_dir = kwargs.get('output_dir', 'outputs')
         self.max_workers = kwargs.get('max_workers', 1)
         self.debug = kwargs.get('debug', False)
-        self.evaluator = Evaluator(output_dir=self.output_dir, debug=self.debug)
+        # 并行执行方式：'thread' 使用线程池，'process' 使用常驻模型的工作进程池
+        self.executor = kwargs.get('executor', 'thread')
+        # 多进程执行时每个模型配置的副本数，大于1时同一模型的任务分散到多个工作进程
+        self.model_replicas = kwargs.get('model_replicas', 1)
+        # 模型池：提供时相同配置的模型在任务之间共享，只加载一次
+        self.model_pool = kwargs.get('model_pool', None)
+        # 进度回调，传给评测器，每完成一个批次调用一次
+        self.progress_callback = kwargs.get('progress_callback', None)
+        self.evaluator = Evaluator(output_dir=self.output_dir, debug=self.debug,
+                                   progress_callback=self.progress_callback)
         
-    def run_from_config(self, config_path=None):
+    def run_from_config(self, config_path=None, resume=False):
         """
         从配置文件运行评测任务
         
         Args:
             config_path: 配置文件路径，如果为None则使用初始化时提供的路径
+            resume: 是否从检查点恢复，跳过已完成的样本
             
         Returns:
             dict: 所有任务的结果
@@ -50,14 +62,15 @@ class TaskRunner:
         os.makedirs(self.output_dir, exist_ok=True)
         
         # 执行任务
-        return self.run_from_dict(config)
+        return self.run_from_dict(config, resume=resume)
     
-    def run_from_dict(self, config):
+    def run_from_dict(self, config, resume=False):
         """
         从配置字典运行评测任务
         
         Args:
             config: 配置字典
+            resume: 是否从检查点恢复，跳过已完成的样本
             
         Returns:
             dict: 所有任务的结果
@@ -81,104 +94,22 @@ class TaskRunner:
             'tasks': []
         }
         
-        # 单个任务执行函数
-        def execute_task(task_config):
-            try:
-                # 提取任务参数
-                task_name = task_config.get('name', f"task_{int(time.time())}")
-                model_config = task_config.get('model')
-                dataset_config = task_config.get('dataset')
-                metrics_config = task_config.get('metrics', ['accuracy'])
-                eval_config = task_config.get('eval_config', {})
-                
-                if not model_config:
-                    raise ValueError(f"任务 '{task_name}' 缺少模型配置")
-                if not dataset_config:
-                    raise ValueError(f"任务 '{task_name}' 缺少数据集配置")
-                
-                # 准备模型参数
-                if isinstance(model_config, str):
-                    model_name = model_config
-                    model_kwargs = {}
-                    model_name_or_path = model_name
-                else:
-                    model_name = model_config.get('name')
-                    model_kwargs = {k: v for k, v in model_config.items() if k != 'name'}
-                    
-                    # 修复model_name_or_path参数，确保正确传递给模型
-                    if 'model_name' in model_kwargs:
-                        model_name_or_path = model_kwargs.pop('model_name')
-                    else:
-                        model_name_or_path = model_name
-                
-                # 准备数据集参数
-                if isinstance(dataset_config, str):
-                    dataset_name = dataset_config
-                    dataset_kwargs = {}
-                else:
-                    dataset_name = dataset_config.get('name')
-                    dataset_kwargs = {k: v for k, v in dataset_config.items() if k != 'name'}
-                
-                # 初始化模型
-                try:
-                    model_cls = MODELS.get(model_name)
-                    if model_name == 'openai':
-                        model = model_cls(model_name_or_path, **model_kwargs)
-                    else:
-                        model = model_cls(model_name_or_path, **model_kwargs)
-                except KeyError:
-                    raise ValueError(f"未知模型: {model_name}。请确保已注册该模型。")
-                
-                # 初始化数据集
-                try:
-                    dataset_cls = DATASETS.get(dataset_name)
-                    dataset = dataset_cls(**dataset_kwargs)
-                except KeyError:
-                    raise ValueError(f"未知数据集: {dataset_name}。请确保已注册该数据集。")
-                
-                # 初始化评估指标
-                metric_instances = []
-                for metric_config in metrics_config:
-                    if isinstance(metric_config, str):
-                        metric_name = metric_config
-                        metric_kwargs = {}
-                    else:
-                        metric_name = metric_config.get('name')
-                        metric_kwargs = {k: v for k, v in metric_config.items() if k != 'name'}
-                        
-                    try:
-                        metric_cls = METRICS.get(metric_name)
-                        metric_instances.append(metric_cls(**metric_kwargs))
-                    except KeyError:
-                        raise ValueError(f"未知评估指标: {metric_name}。请确保已注册该指标。")
-                
-                # 运行评测
-                print(f"\n执行任务: {task_name}")
-                print(f"模型: {model_name}, 数据集: {dataset_name}, 指标: {', '.join([m.name for m in metric_instances])}")
-                
-                result = self.evaluator.evaluate(model, dataset, metric_instances, **eval_config)
-                result['task_name'] = task_name
-                
-                return result
-                
-            except Exception as e:
-                print(f"任务执行失败: {str(e)}")
-                return {
-                    'task_name': task_config.get('name', 'unknown'),
-                    'error': str(e),
-                    'timestamp': datetime.datetime.now().isoformat()
-                }
-        
         # 执行所有任务
-        if self.max_workers > 1 and len(tasks) > 1:
+        if self.max_workers > 1 and len(tasks) > 1 and self.executor == 'process':
+            # 多进程执行，使用相同模型配置的任务路由到 model_replicas 个工作进程
+            print(f"使用 {self.max_workers} 个工作进程并行执行 {len(tasks)} 个任务")
+            pool = ProcessTaskPool(self.max_workers, model_replicas=self.model_replicas,
+                                   output_dir=self.output_dir, debug=self.debug)
+            task_results = pool.run(tasks, resume=resume)
+        elif self.max_workers > 1 and len(tasks) > 1:
             # 并行执行
             print(f"使用 {self.max_workers} 个工作线程并行执行 {len(tasks)} 个任务")
             with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                task_results = list(executor.map(execute_task, tasks))
+                task_results = list(executor.map(lambda task: self.execute_task(task, resume=resume), tasks))
         else:
             # 串行执行
             print(f"串行执行 {len(tasks)} 个任务")
-            task_results = [execute_task(task) for task in tasks]
+            task_results = [self.execute_task(task, resume=resume) for task in tasks]
             
         # 记录任务结果
         all_results['tasks'] = task_results
@@ -193,6 +124,93 @@ class TaskRunner:
         
         return all_results
     
+    def execute_task(self, task_config, resume=False):
+        """
+        执行单个评测任务
+        
+        Args:
+            task_config: 任务配置字典
+            resume: 是否从检查点恢复
+            
+        Returns:
+            dict: 任务结果，失败时包含error字段
+        """
+        try:
+            # 提取任务参数
+            task_name = task_config.get('name', f"task_{int(time.time())}")
+            model_config = task_config.get('model')
+            dataset_config = task_config.get('dataset')
+            metrics_config = task_config.get('metrics', ['accuracy'])
+            eval_config = task_config.get('eval_config', {})
+            
+            if not model_config:
+                raise ValueError(f"任务 '{task_name}' 缺少模型配置")
+            if not dataset_config:
+                raise ValueError(f"任务 '{task_name}' 缺少数据集配置")
+            
+            model_name = model_config if isinstance(model_config, str) else model_config.get('name')
+            
+            # 准备数据集参数
+            if isinstance(dataset_config, str):
+                dataset_name = dataset_config
+                dataset_kwargs = {}
+            else:
+                dataset_name = dataset_config.get('name')
+                dataset_kwargs = {k: v for k, v in dataset_config.items() if k != 'name'}
+            
+            # 初始化模型，使用模型池时复用已加载的实例
+            if self.model_pool is not None:
+                model = self.model_pool.acquire(model_config)
+            else:
+                model = create_model(model_config)
+            
+            # 初始化数据集
+            try:
+                dataset_cls = DATASETS.get(dataset_name)
+                dataset = dataset_cls(**dataset_kwargs)
+            except KeyError:
+                raise ValueError(f"未知数据集: {dataset_name}。请确保已注册该数据集。")
+            
+            # 初始化评估指标
+            metric_instances = []
+            for metric_config in metrics_config:
+                if isinstance(metric_config, str):
+                    metric_name = metric_config
+                    metric_kwargs = {}
+                else:
+                    metric_name = metric_config.get('name')
+                    metric_kwargs = {k: v for k, v in metric_config.items() if k != 'name'}
+                    
+                try:
+                    metric_cls = METRICS.get(metric_name)
+                    metric_instances.append(metric_cls(**metric_kwargs))
+                except KeyError:
+                    raise ValueError(f"未知评估指标: {metric_name}。请确保已注册该指标。")
+            
+            # 运行评测
+            print(f"\n执行任务: {task_name}")
+            print(f"模型: {model_name}, 数据集: {dataset_name}, 指标: {', '.join([m.name for m in metric_instances])}")
+            
+            if resume:
+                eval_config = dict(eval_config, resume=True)
+            
+            try:
+                result = self.evaluator.evaluate(model, dataset, metric_instances, **eval_config)
+            finally:
+                if self.model_pool is not None:
+                    self.model_pool.release(model_config)
+            result['task_name'] = task_name
+            
+            return result
+            
+        except Exception as e:
+            print(f"任务执行失败: {str(e)}")
+            return {
+                'task_name': task_config.get('name', 'unknown'),
+                'error': str(e),
+                'timestamp': datetime.datetime.now().isoformat()
+            }
+    
     def _load_config(self, config_path):
         """
         加载配置文件
@@ -0,0 +1,127 @@
+"""
+流式评分实现
+"""
+import json
+import queue
+import threading
+
+
+class StreamingScorer:
+    """
+    流式评分器
+
+    在后台线程中消费已完成生成的批次，通过指标的累加接口（update/finalize）增量计算各评估指标，
+    并将每个样本的记录逐行写入JSONL文件，避免在内存中保留全部预测结果。
+    """
+    def __init__(self, metrics, samples_file=None, max_pending=4, debug=False):
+        self.metrics = metrics
+        self.samples_file = samples_file
+        self.debug = debug
+        # 有界队列：评分落后时阻塞生成端，防止已完成的批次在内存中堆积
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._error = None
+        self._states = {metric.name: metric.init_state() for metric in metrics}
+        self._errors = {}
+
+    def start(self):
+        """启动后台评分线程"""
+        self._thread = threading.Thread(target=self._run, name='streaming-scorer', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, samples, predictions):
+        """
+        提交一个已完成生成的批次
+
+        Args:
+            samples: 样本信息列表，每项包含 idx、prompt、reference
+            predictions: 与样本一一对应的生成结果
+        """
+        if self._error is not None:
+            raise RuntimeError(f"评分线程已失败: {self._error}")
+        self._queue.put((samples, predictions))
+
+    def close(self):
+        """等待队列中剩余批次处理完成并结束评分线程"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def finalize(self):
+        """
+        汇总累加结果
+
+        Returns:
+            dict: 以指标名为键的结果字典
+        """
+        metrics_results = {}
+        for metric in self.metrics:
+            if metric.name in self._errors:
+                metrics_results[metric.name] = {'error': self._errors[metric.name]}
+            else:
+                metrics_results[metric.name] = metric.finalize(self._states[metric.name])
+        return metrics_results
+
+    def _run(self):
+        """评分线程主循环"""
+        f = open(self.samples_file, 'w', encoding='utf-8') if self.samples_file else None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                samples, predictions = item
+                try:
+                    records = self._score_batch(samples, predictions)
+                    if f is not None:
+                        for record in records:
+                            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                        f.flush()
+                except Exception as e:
+                    # 记录错误后继续消费队列，避免生成端因队列已满而阻塞
+                    self._error = str(e)
+                    print(f"流式评分失败: {str(e)}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def _score_batch(self, samples, predictions):
+        """对单个批次计算指标并生成样本记录"""
+        references = [sample['reference'] for sample in samples]
+        records = [
+            {
+                'idx': sample['idx'],
+                'prompt': sample['prompt'],
+                'prediction': prediction,
+                'reference': sample['reference'],
+                'metrics': {}
+            }
+            for sample, prediction in zip(samples, predictions)
+        ]
+
+        for metric in self.metrics:
+            if metric.name in self._errors:
+                continue
+            try:
+                details = metric.update(self._states[metric.name], predictions, references)
+            except Exception as e:
+                print(f"计算指标 {metric.name} 失败: {str(e)}")
+                self._errors[metric.name] = str(e)
+                continue
+
+            # 将逐样本详情合并进样本记录，去掉与记录重复的字段
+            for detail in details:
+                i = detail.get('index')
+                if i is None or i >= len(records):
+                    continue
+                records[i]['metrics'][metric.name] = {
+                    k: v for k, v in detail.items()
+                    if k not in ('index', 'prediction', 'reference')
+                }
+
+        if self.debug and records:
+            print(f"\n样本 {records[0]['idx']} 评分完成")
+        return records
@@ -0,0 +1,141 @@
+"""
+多进程任务池实现
+"""
+import queue
+import datetime
+import multiprocessing
+
+
+def _worker_main(worker_id, inbox, outbox, runner_kwargs):
+    """
+    工作进程主循环
+
+    每个工作进程持有一个TaskRunner和自己的模型池，从任务队列中依次取出任务执行，
+    相同模型配置的任务复用已加载的模型实例。
+    """
+    from model_evaluate_demo.tasks.runner import TaskRunner
+    from model_evaluate_demo.tasks.model_pool import ModelPool
+
+    runner = TaskRunner(model_pool=ModelPool(), **runner_kwargs)
+    while True:
+        message = inbox.get()
+        if message is None:
+            runner.model_pool.release_all()
+            break
+        task_index, task_config, resume = message
+        result = runner.execute_task(task_config, resume=resume)
+        result['worker_id'] = worker_id
+        outbox.put((task_index, result))
+
+
+class ProcessTaskPool:
+    """
+    多进程任务池
+
+    每个工作进程拥有独立的解释器和常驻模型，提示渲染、答案提取和结果序列化
+    等CPU密集型工作不再受GIL限制。使用相同模型配置的任务默认被路由到同一个工作进程，
+    模型在该进程中只加载一次；model_replicas 大于1时分散到多个工作进程，每个进程
+    各加载一份模型，适用于一个模型评测多个数据集的配置。
+    """
+    def __init__(self, num_workers, poll_interval=5.0, model_replicas=1, **runner_kwargs):
+        """
+        Args:
+            num_workers: 工作进程数
+            poll_interval: 等待结果时检查工作进程存活状态的间隔(秒)
+            model_replicas: 每个模型配置最多分配的工作进程数，即模型的副本数，
+                不超过 num_workers；副本越多内存占用越大
+            **runner_kwargs: 传给工作进程中TaskRunner的参数
+        """
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.model_replicas = max(1, min(model_replicas, num_workers))
+        self.runner_kwargs = runner_kwargs
+        # 使用spawn启动方式，避免fork后CUDA上下文不可用
+        self._context = multiprocessing.get_context('spawn')
+
+    def route(self, tasks):
+        """
+        按模型配置分配任务
+
+        不同的模型配置按首次出现的顺序轮流分配 model_replicas 个相邻的工作进程，
+        相同配置的任务在这些进程之间轮流分配。model_replicas 为1时相同配置的任务
+        分配到同一进程。
+
+        Returns:
+            list: 每个任务对应的工作进程编号
+        """
+        from model_evaluate_demo.tasks.model_pool import ModelPool
+
+        assignments = []
+        workers_by_key = {}
+        counts = {}
+        for task_config in tasks:
+            key = ModelPool.make_key(task_config.get('model'))
+            if key not in workers_by_key:
+                start = len(workers_by_key) * self.model_replicas
+                workers_by_key[key] = [(start + i) % self.num_workers for i in range(self.model_replicas)]
+                counts[key] = 0
+            workers = workers_by_key[key]
+            assignments.append(workers[counts[key] % len(workers)])
+            counts[key] += 1
+        return assignments
+
+    def run(self, tasks, resume=False):
+        """
+        执行任务列表
+
+        Returns:
+            list: 与任务顺序一致的结果列表
+        """
+        assignments = self.route(tasks)
+        num_workers = max(assignments) + 1 if assignments else 0
+
+        outbox = self._context.Queue()
+        inboxes = []
+        processes = []
+        for worker_id in range(num_workers):
+            inbox = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(worker_id, inbox, outbox, self.runner_kwargs),
+                name=f"eval-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            inboxes.append(inbox)
+            processes.append(process)
+
+        for task_index, (task_config, worker_id) in enumerate(zip(tasks, assignments)):
+            inboxes[worker_id].put((task_index, task_config, resume))
+        for inbox in inboxes:
+            inbox.put(None)
+
+        results = [None] * len(tasks)
+        remaining = len(tasks)
+        try:
+            while remaining:
+                try:
+                    task_index, result = outbox.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    # 工作进程异常退出时，为其未完成的任务生成错误结果
+                    dead = {i for i, process in enumerate(processes) if not process.is_alive()}
+                    lost = [i for i, worker_id in enumerate(assignments)
+                            if worker_id in dead and results[i] is None]
+                    for task_index in lost:
+                        results[task_index] = {
+                            'task_name': tasks[task_index].get('name', 'unknown'),
+                            'error': f"工作进程 {assignments[task_index]} 异常退出",
+                            'timestamp': datetime.datetime.now().isoformat()
+                        }
+                    remaining -= len(lost)
+                    continue
+                if results[task_index] is None:
+                    results[task_index] = result
+                    remaining -= 1
+        finally:
+            for process in processes:
+                process.join(timeout=self.poll_interval)
+                if process.is_alive():
+                    process.terminate()
+
+        return results
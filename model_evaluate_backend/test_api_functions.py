@@ -62,6 +62,187 @@ def test_default_kwargs():
         traceback.print_exc()
         return False
 
+def test_indexed_jsonl_malformed_line():
+    """测试JSONL索引跳过带花括号但无法解析的行"""
+    try:
+        import tempfile
+        from model_evaluate_demo.datasets.jsonl import IndexedJsonl
+        
+        print("测试JSONL索引跳过格式错误的行...")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "data.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"question": "a", "answer": "1"}\n')
+                f.write('{"question": "x", "answer": }\n')
+                f.write('{"question": "c", "answer": "3"}\n')
+            
+            # 第一次建立并保存索引，第二次使用保存的索引
+            for _ in range(2):
+                records = IndexedJsonl(path, required_keys=("question", "answer"))
+                questions = [record["question"] for record in records]
+                records.close()
+                assert len(questions) == 2 and questions == ["a", "c"], questions
+        
+        print("JSONL索引测试通过!")
+        return True
+        
+    except Exception as e:
+        print(f"测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_generation_cache_reuse():
+    """测试相同参数的第二次评测从生成缓存读取预测"""
+    try:
+        import tempfile
+        from model_evaluate_demo.api import evaluate_model
+        from model_evaluate_demo.utils.registry import MODELS
+        
+        if "cache_test" not in MODELS:
+            @MODELS.register("cache_test")
+            class CacheTestModel:
+                """记录调用次数的模型，用于检查生成缓存是否生效"""
+                calls = 0
+                
+                def __init__(self, model_name, **kwargs):
+                    self.model_name = model_name
+                    self._model = object()
+                
+                def load(self):
+                    pass
+                
+                def generate(self, prompts, **kwargs):
+                    CacheTestModel.calls += len(prompts)
+                    return ["答案是 1" for _ in prompts]
+        model_cls = MODELS.get("cache_test")
+        
+        print("测试生成缓存复用...")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "test.jsonl"), "w", encoding="utf-8") as f:
+                for i in range(3):
+                    f.write(f'{{"question": "{i} + 1 = ?", "answer": "#### {i + 1}"}}\n')
+            
+            model_cls.calls = 0
+            runs = []
+            for _ in range(2):
+                runs.append(evaluate_model(
+                    model_path="cache-test-model",
+                    model_type="cache_test",
+                    dataset_name="gsm8k",
+                    dataset_path=tmp_dir,
+                    dataset_cache_path=os.path.join(tmp_dir, ".cache"),
+                    output_dir=os.path.join(tmp_dir, "outputs"),
+                    generation_params={"temperature": 0, "max_tokens": 512},
+                    eval_generation_cache=True
+                ))
+            
+            first, second = (run["generation_cache"] for run in runs)
+            print(f"第一次: {first['hits']}/{first['hits'] + first['misses']}, "
+                  f"第二次: {second['hits']}/{second['hits'] + second['misses']}")
+            assert first["misses"] == 3 and second["hits"] == 3 and second["misses"] == 0
+            assert model_cls.calls == 3, model_cls.calls
+            assert runs[1]["generation_kwargs"]["max_tokens"] == 512
+        
+        print("生成缓存测试通过!")
+        return True
+        
+    except Exception as e:
+        print(f"测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_openai_async_stub_server():
+    """测试openai_async模型对本地桩服务的并发请求、重试和统计"""
+    try:
+        import asyncio
+        import threading
+        try:
+            from aiohttp import web
+        except ImportError:
+            print("未安装aiohttp，跳过openai_async测试")
+            return True
+        from model_evaluate_demo.backends.openai_async import OpenAIAsyncModel, APIRequestError
+        
+        print("测试openai_async模型...")
+        state = {"attempts": {}, "in_flight": 0, "peak": 0, "peers": set()}
+        
+        async def chat(request):
+            body = await request.json()
+            prompt = body["messages"][-1]["content"]
+            state["peers"].add(request.transport.get_extra_info("peername"))
+            state["attempts"][prompt] = state["attempts"].get(prompt, 0) + 1
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            try:
+                await asyncio.sleep(0.02)
+                if prompt.startswith("bad"):
+                    return web.json_response({"error": "bad request"}, status=400)
+                # flaky 提示第一次返回429，重试后成功
+                if prompt.startswith("flaky") and state["attempts"][prompt] == 1:
+                    return web.json_response({"error": "busy"}, status=429, headers={"Retry-After": "0"})
+                return web.json_response({"choices": [{"message": {"content": f"echo:{prompt}"}}]})
+            finally:
+                state["in_flight"] -= 1
+        
+        # 桩服务运行在独立线程的事件循环中，监听127.0.0.1的随机端口
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", chat)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+        port = runner.addresses[0][1]
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        
+        model = OpenAIAsyncModel("stub-model", base_url=f"http://127.0.0.1:{port}/v1", api_key="test",
+                                 max_concurrency=64, retry_count=2, retry_base_delay=0.01)
+        try:
+            prompts = [f"flaky-{i}" if i % 50 == 0 else f"q-{i}" for i in range(600)]
+            predictions = model.generate(prompts, temperature=0)
+            assert predictions == [f"echo:{prompt}" for prompt in prompts], "回复顺序与提示顺序不一致"
+            
+            flaky_count = sum(1 for prompt in prompts if prompt.startswith("flaky"))
+            stats = model.request_stats()
+            print(f"请求: {stats['requests']}, 重试: {stats['retries']}, 限流: {stats['rate_limited']}, "
+                  f"峰值并发: {stats['peak_in_flight']}, 连接数: {len(state['peers'])}")
+            assert stats["requests"] == len(prompts) + flaky_count, stats
+            assert stats["retries"] == flaky_count and stats["rate_limited"] == flaky_count, stats
+            assert stats["failures"] == 0, stats
+            assert stats["latency"]["count"] == stats["requests"], stats
+            assert 0 < stats["peak_in_flight"] <= 64 and state["peak"] <= 64, (stats, state["peak"])
+            # keep-alive连接在请求之间复用
+            assert len(state["peers"]) <= 64, len(state["peers"])
+            
+            # 400 不可重试，直接失败
+            model.reset_stats()
+            try:
+                model.generate(["bad-0"], temperature=0)
+                raise AssertionError("400应当抛出异常")
+            except APIRequestError as e:
+                assert e.status == 400, e.status
+            stats = model.request_stats()
+            assert state["attempts"]["bad-0"] == 1, state["attempts"]["bad-0"]
+            assert stats["requests"] == 1 and stats["retries"] == 0 and stats["failures"] == 1, stats
+        finally:
+            model.unload()
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        
+        print("openai_async测试通过!")
+        return True
+        
+    except Exception as e:
+        print(f"测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """主函数"""
     print("开始测试API功能...\n")
@@ -72,8 +253,18 @@ def main():
     # 测试默认参数功能
     kwargs_test_passed = test_default_kwargs()
     
+    # 测试JSONL索引
+    jsonl_test_passed = test_indexed_jsonl_malformed_line()
+    
+    # 测试生成缓存复用
+    cache_test_passed = test_generation_cache_reuse()
+    
+    # 测试openai_async模型
+    async_test_passed = test_openai_async_stub_server()
+    
     # 总结测试结果
-    if list_test_passed and kwargs_test_passed:
+    if list_test_passed and kwargs_test_passed and jsonl_test_passed and cache_test_passed \
+            and async_test_passed:
         print("\n所有测试通过! API功能正常。")
         return 0
     else:
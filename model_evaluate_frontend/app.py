@@ -12,7 +12,10 @@ import json
 import time
 import uuid
 import threading
+import socket
 import subprocess
+import urllib.request
+import urllib.error
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, jsonify
 
@@ -39,6 +42,10 @@ evaluation_tasks = {}
 # 定义模型目录，可以通过环境变量配置
 MODELS_DIR = os.environ.get('MODELS_DIR', '/home/bugsmith/model_evaluate_demo/models')
 
+# 常驻评测服务地址，服务不可用时回退到子进程方式
+EVAL_SERVICE_URL = os.environ.get('EVAL_SERVICE_URL', 'http://127.0.0.1:8765')
+EVAL_SERVICE_POLL_INTERVAL = 2
+
 # 获取可用模型列表
 def get_available_models():
     """获取可用的模型列表"""
@@ -69,8 +76,97 @@ def update_task_status(task_id, status, result=None):
             evaluation_tasks[task_id]['result'] = result
         evaluation_tasks[task_id]['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
+# 请求常驻评测服务
+def eval_service_request(method, path, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(
+        EVAL_SERVICE_URL.rstrip('/') + path,
+        data=data,
+        method=method,
+        headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(req, timeout=10) as response:
+        return json.loads(response.read().decode('utf-8'))['data']
+
+# 判断是否为无法连接评测服务的错误，只有这类错误说明任务未提交
+def is_service_unreachable(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return False
+    if isinstance(error, urllib.error.URLError):
+        error = error.reason
+    return isinstance(error, (ConnectionError, socket.gaierror))
+
+# 评测服务请求失败的错误信息，HTTP错误使用服务返回的message
+def service_error_message(error):
+    if isinstance(error, urllib.error.HTTPError):
+        try:
+            message = json.loads(error.read().decode('utf-8')).get('message')
+        except (ValueError, AttributeError, OSError):
+            message = None
+        return f"评测服务返回错误 {error.code}: {message or error.reason}"
+    if isinstance(error, (socket.timeout, TimeoutError)) or \
+            isinstance(getattr(error, 'reason', None), (socket.timeout, TimeoutError)):
+        return f"评测服务请求超时: {error}"
+    return str(error)
+
 # 运行评测任务
 def run_evaluation_task(task_id, model_path, datasets, max_samples, device=None, debug=False):
+    if not os.path.exists(model_path):
+        update_task_status(task_id, 'failed', {
+            'error': f'模型路径不存在: {model_path}'
+        })
+        return
+    
+    # 优先提交到常驻评测服务，复用已加载的依赖和模型
+    outputs_dir = os.path.abspath('./outputs')
+    try:
+        job = eval_service_request('POST', '/jobs', {
+            'model_path': model_path,
+            'datasets': datasets,
+            'max_samples': max_samples,
+            'device': device,
+            'debug': debug,
+            'output_dir': outputs_dir
+        })
+    except (urllib.error.URLError, OSError) as e:
+        if is_service_unreachable(e):
+            # 评测服务不可用，回退到子进程方式
+            run_evaluation_subprocess(task_id, model_path, datasets, max_samples, device, debug)
+            return
+        # 服务返回错误或请求超时：超时时任务可能已经提交，不再回退，避免重复评测
+        update_task_status(task_id, 'failed', {'error': service_error_message(e)})
+        return
+    
+    try:
+        evaluation_tasks[task_id]['service_job_id'] = job['id']
+        update_task_status(task_id, 'running')
+        while job['status'] in ('pending', 'running'):
+            time.sleep(EVAL_SERVICE_POLL_INTERVAL)
+            job = eval_service_request('GET', f"/jobs/{job['id']}")
+        
+        if job['status'] == 'completed':
+            result = job['result']
+            result_files = [os.path.basename(path) for path in
+                            (result.get('results_file'), result.get('summary_file')) if path]
+            update_task_status(task_id, 'completed', {
+                'datasets': result.get('datasets', {}),
+                'result_files': result_files
+            })
+        else:
+            update_task_status(task_id, 'failed', {
+                'error': job.get('error', '评测失败'),
+                'traceback': job.get('traceback')
+            })
+    
+    except Exception as e:
+        import traceback
+        update_task_status(task_id, 'failed', {
+            'error': service_error_message(e),
+            'traceback': traceback.format_exc()
+        })
+
+# 以子进程方式运行评测任务
+def run_evaluation_subprocess(task_id, model_path, datasets, max_samples, device=None, debug=False):
     try:
         # 检查模型路径是否存在
         if not os.path.exists(model_path):